@@ -1,4 +1,6 @@
 # Checkout JWT token from request header
+from typing import Optional
+
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -14,19 +16,18 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-            if not self.verify_jwt(credentials.credentials):
+            payload = self.verify_jwt(credentials.credentials)
+            if not payload:
                 raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+            # decoded once here, auth context of request is built from it
+            request.state.jwt_payload = payload
             return credentials.credentials
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    def verify_jwt(self, jwtoken: str) -> bool:
-        isTokenValid: bool = False
-
+    def verify_jwt(self, jwtoken: str) -> Optional[dict]:
+        """ Payload of valid token or None """
         try:
-            payload = decode_jwt(jwtoken)
+            return decode_jwt(jwtoken)
         except:
-            payload = None
-        if payload:
-            isTokenValid = True
-        return isTokenValid
+            return None
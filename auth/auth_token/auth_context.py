@@ -0,0 +1,33 @@
+# Request scoped auth context built from token decoded once by JWTBearer
+from fastapi import Depends, HTTPException, Request, status
+
+from auth.auth_token.auth_bearer import JWTBearer
+
+
+class AuthContext:
+    """ Current user of request, permissions are frozenset so permission check is a hash lookup """
+    __slots__ = ("user_id", "email", "permissions")
+
+    def __init__(self, payload: dict):
+        self.user_id = payload.get("id")
+        self.email = payload.get("email")
+        self.permissions = frozenset(payload.get("permissions") or ())
+
+    def has_permission(self, permission: str) -> bool:
+        return permission in self.permissions
+
+
+async def get_auth_context(request: Request, token: str = Depends(JWTBearer())) -> AuthContext:
+    """ FastAPI resolves it once per request, so all dependencies of request share one context """
+    return AuthContext(request.state.jwt_payload)
+
+
+def require_permission(permission: str):
+    """ Dependency which returns auth context of request or raises 403 if user has not permission """
+
+    async def check_permission(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
+        if not auth.has_permission(permission):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+        return auth
+
+    return check_permission
@@ -0,0 +1,48 @@
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+load_dotenv()
+
+# benchmarks seed and drop data, never point bench_db_uri to production database
+bench_db_uri = os.getenv('bench_db_uri')
+
+
+def get_bench_url():
+    if not bench_db_uri:
+        raise SystemExit("set bench_db_uri to database migrated with `alembic upgrade head`")
+    return make_url(bench_db_uri)
+
+
+def get_bench_engine():
+    return create_engine(get_bench_url())
+
+
+def get_async_bench_engine(**options):
+    """ Engine of bench database for async views """
+    return create_async_engine(get_bench_url().set(drivername='postgresql+asyncpg'), **options)
+
+
+def timed(func, repeat: int = 5) -> float:
+    """ Median wall time of func in milliseconds """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def timed_async(func, repeat: int = 5) -> float:
+    """ Median wall time of awaited func in milliseconds """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
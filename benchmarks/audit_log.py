@@ -0,0 +1,76 @@
+# Latency of write endpoint (flight update) with user history written in own transaction and through audit log.
+# Checks that every update stored its history row after audit log is flushed
+# usage: python -m benchmarks.audit_log [updates] (after python -m benchmarks.seed), exits with 1 on lost event
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from benchmarks import get_async_bench_engine, get_bench_engine
+from crud_models.schemas import flights as schemas
+from crud_models.views.flights import Flight
+from db import models
+from users.views.audit_log import audit_log
+
+
+def update_flights(db: Session, db_flight: models.Flight, user_id: int, updates: int) -> list:
+    latencies = []
+    for i in range(updates):
+        start = time.perf_counter()
+        Flight.update(db, db_flight, schemas.FlightUpdate(price=db_flight.price + (1 if i % 2 == 0 else -1)), user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def history_rows(db: Session, user_id: int, since: datetime) -> int:
+    return db.execute(select(func.count(models.UserHistory.id)).filter(
+        models.UserHistory.user_id == user_id, models.UserHistory.action == "update flight",
+        models.UserHistory.created_at >= since)).scalar()
+
+
+async def scenario(db: Session, name: str, db_flight: models.Flight, user_id: int, updates: int) -> bool:
+    since = datetime.utcnow()
+    if name == "write behind":
+        audit_log.start()
+    start = time.perf_counter()
+    latencies = update_flights(db, db_flight, user_id, updates)
+    elapsed = time.perf_counter() - start
+    if name == "write behind":
+        await audit_log.stop()
+    rows = history_rows(db, user_id, since)
+
+    latencies.sort()
+    ok = rows == updates
+    print(f"{name:<13}{updates:>6} updates{elapsed:>8.2f} s  p50 {statistics.median(latencies):.2f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms  history rows {rows}  "
+          f"{'OK' if ok else f'FAILED: expected {updates}'}")
+    return ok
+
+
+async def main(updates: int):
+    async_engine = get_async_bench_engine()
+    audit_log.session_factory = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    engine = get_bench_engine()
+
+    with Session(engine) as db:
+        db_flight = db.execute(select(models.Flight).filter(models.Flight.deleted_at.is_(None)).
+                               order_by(models.Flight.id.desc()).limit(1)).scalar()
+        user_id = db.execute(select(models.User.id).limit(1)).scalar()
+
+        ok = True
+        for name in ("own commit", "write behind"):
+            ok = await scenario(db, name, db_flight, user_id, updates) and ok
+    print(f"audit log {audit_log.stats()}")
+    await async_engine.dispose()
+    engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,39 @@
+# Compare auth work per request: token decoded by every check_permissions/get_user_id vs auth context
+# usage: python -m benchmarks.auth [requests]
+import sys
+import time
+import timeit
+
+from auth.auth_token.auth_bearer import JWTBearer
+from auth.auth_token.auth_context import AuthContext
+from auth.auth_token.auth_handler import check_permissions, get_user_id, permission, sign_jwt
+
+bearer = JWTBearer()
+
+
+def decode_per_check(token: str):
+    """ Route with JWTBearer, check_permissions and get_user_id """
+    bearer.verify_jwt(token)
+    if check_permissions("create_ticket", token):
+        return get_user_id(token)
+
+
+def auth_context(token: str):
+    """ Route with require_permission, token is decoded by JWTBearer only """
+    auth = AuthContext(bearer.verify_jwt(token))
+    if auth.has_permission("create_ticket"):
+        return auth.user_id
+
+
+def main(requests: int):
+    # last permission of list is the worst case of list scan
+    token = sign_jwt(1, "bench@example.com", permission + ["create_ticket"])["access_token"]
+    # float iat is rejected by decode within the same second
+    time.sleep(1)
+    for func in [decode_per_check, auth_context]:
+        spent = min(timeit.repeat(lambda: func(token), number=requests, repeat=5)) / requests * 1_000_000
+        print(f"{func.__name__:<20}{spent:>8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
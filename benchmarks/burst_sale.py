@@ -0,0 +1,112 @@
+# Sale start burst: buyers try to buy one flight at the same moment, directly and through sale queue of flight.
+# Checks that both ways sell exactly flight seats and store one ticket and debt per sale
+# usage: python -m benchmarks.burst_sale [buyers] (after python -m benchmarks.seed), exits with 1 on mismatch
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import get_async_bench_engine
+from benchmarks.sale_stress import new_ticket
+from crud_models.views.sale_queue import SaleQueues
+from crud_models.views.ticket_sale import TicketSale
+from db import models
+
+SEATS = 300
+
+
+async def buy_direct(session_factory, queues, flight_id: int, agent_id: int, run: str, i: int) -> bool:
+    async with session_factory() as db:
+        db_flight = await db.get(models.Flight, flight_id)
+        try:
+            await TicketSale.sell(db, new_ticket(flight_id, agent_id, run, i), db_flight, user_id=1)
+            return True
+        except ValueError:
+            return False
+
+
+async def buy_queued(session_factory, queues, flight_id: int, agent_id: int, run: str, i: int) -> bool:
+    if await queues.is_sold_out(flight_id):
+        return False
+    async with session_factory() as db:
+        queue = await queues.burst_queue(db, flight_id)
+    try:
+        await queue.sell(new_ticket(flight_id, agent_id, run, i), user_id=1)
+        return True
+    except ValueError:
+        return False
+
+
+async def timed_buy(buy, latencies: list, *args) -> bool:
+    start = time.perf_counter()
+    try:
+        return await buy(*args)
+    finally:
+        latencies.append(time.perf_counter() - start)
+
+
+async def scenario(session_factory, name: str, buy, flight_id: int, agent_id: int, buyers: int):
+    run = f"burst {name} {time.time()}"
+    async with session_factory() as db:
+        await db.execute(update(models.Flight).where(models.Flight.id == flight_id).
+                         values(left_seats=SEATS, on_sale=datetime.now() - timedelta(seconds=1)))
+        await db.commit()
+
+    queues = SaleQueues(session_factory=session_factory)
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[timed_buy(buy, latencies, session_factory, queues, flight_id, agent_id, run, i)
+                                     for i in range(buyers)])
+    elapsed = time.perf_counter() - start
+
+    async with session_factory() as db:
+        tickets = (await db.execute(select(func.count(models.Ticket.id)).
+                                    filter(models.Ticket.comment == run))).scalar()
+        debts = (await db.execute(
+            select(func.count(models.AgentDebt.id)).join(models.Ticket, models.Ticket.id == models.AgentDebt.ticket_id).
+            filter(models.Ticket.comment == run))).scalar()
+        left_seats = (await db.execute(select(models.Flight.left_seats).filter(models.Flight.id == flight_id))).scalar()
+
+    sold = sum(results)
+    expected = min(SEATS, buyers)
+    errors = []
+    if sold != expected:
+        errors.append(f"{sold} sold, expected {expected}")
+    if tickets != sold or debts != sold:
+        errors.append(f"{sold} sales reported, {tickets} tickets and {debts} debts stored")
+    if left_seats != SEATS - tickets:
+        errors.append(f"left seats {left_seats}, expected {SEATS - tickets}")
+
+    latencies.sort()
+    print(f"{name:7} {buyers} buyers in {elapsed:.2f} s, sale p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, sold {sold}, left seats {left_seats}  "
+          f"{'OK' if not errors else 'FAILED: ' + '; '.join(errors)}")
+    return not errors
+
+
+async def main(buyers: int):
+    engine = get_async_bench_engine(pool_size=50, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        flight_id = (await db.execute(select(models.Flight.id).filter(
+            models.Flight.deleted_at.is_(None), models.Flight.departure_date > datetime.now() + timedelta(days=1)).
+            order_by(models.Flight.id.desc()).limit(1))).scalar()
+        agent_id = (await db.execute(select(models.Agent.id).filter(models.Agent.is_on_credit.is_(True)).
+                                     limit(1))).scalar()
+
+    ok = True
+    for name, buy in (("direct", buy_direct), ("queued", buy_queued)):
+        ok = await scenario(session_factory, name, buy, flight_id, agent_id, buyers) and ok
+    await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
+    sys.exit(0 if ok else 1)
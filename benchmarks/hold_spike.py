@@ -0,0 +1,102 @@
+# Sale start spike: buyers hold seats of one flight at once, part of them buy, the rest let holds expire.
+# Checks that held seats never exceed flight seats and sweeper gives all unsold seats back
+# usage: python -m benchmarks.hold_spike [buyers] (after python -m benchmarks.seed), exits with 1 on mismatch
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import get_async_bench_engine
+from benchmarks.sale_stress import new_ticket
+from crud_models.views.seat_holds import SeatHold
+from crud_models.views.ticket_sale import TicketSale
+from db import models
+
+SEATS = 100
+HOLD_TTL = 3
+BUY_SHARE = 0.5
+
+
+async def hold_and_maybe_buy(session_factory, flight_id: int, agent_id: int, run: str, i: int, latencies: list):
+    """ Returns held seats and sold seats of one buyer """
+    seats = random.choice([1, 1, 1, 2])
+    async with session_factory() as db:
+        start = time.perf_counter()
+        try:
+            hold = await SeatHold.hold(db, flight_id, agent_id, seats, ttl=HOLD_TTL)
+        except ValueError:
+            return 0, 0
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+        if random.random() >= BUY_SHARE:
+            return seats, 0
+        db_flight = await db.get(models.Flight, flight_id)
+        sold = 0
+        for passenger in range(seats):
+            await TicketSale.sell(db, new_ticket(flight_id, agent_id, run, i * 10 + passenger), db_flight, user_id=1,
+                                  hold_id=hold["id"])
+            sold += 1
+        return seats, sold
+
+
+async def main(buyers: int):
+    engine = get_async_bench_engine(pool_size=50, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    run = f"hold spike {time.time()}"
+
+    async with session_factory() as db:
+        flight_id = (await db.execute(select(models.Flight.id).filter(
+            models.Flight.deleted_at.is_(None), models.Flight.departure_date > datetime.now() + timedelta(days=1)).
+            order_by(models.Flight.id.desc()).limit(1))).scalar()
+        agent_id = (await db.execute(select(models.Agent.id).filter(models.Agent.is_on_credit.is_(True)).
+                                     limit(1))).scalar()
+        await db.execute(update(models.Flight).where(models.Flight.id == flight_id).
+                         values(left_seats=SEATS, on_sale=datetime.now() - timedelta(seconds=1)))
+        await db.commit()
+
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[hold_and_maybe_buy(session_factory, flight_id, agent_id, run, i, latencies)
+                                     for i in range(buyers)])
+    elapsed = time.perf_counter() - start
+    held = sum(seats for seats, _ in results)
+    sold = sum(sold for _, sold in results)
+
+    await asyncio.sleep(HOLD_TTL + 1)
+    async with session_factory() as db:
+        released = await SeatHold.release_expired(db)
+        left_seats = (await db.execute(select(models.Flight.left_seats).filter(models.Flight.id == flight_id))).scalar()
+        holds_left = (await db.execute(select(func.count(models.SeatHold.id)).
+                                       filter(models.SeatHold.flight_id == flight_id))).scalar()
+        tickets = (await db.execute(select(func.count(models.Ticket.id)).
+                                    filter(models.Ticket.comment == run))).scalar()
+    await engine.dispose()
+
+    errors = []
+    if held > SEATS:
+        errors.append(f"{held} seats held of {SEATS}")
+    if tickets != sold:
+        errors.append(f"{sold} sales reported, {tickets} tickets stored")
+    if left_seats != SEATS - sold:
+        errors.append(f"left seats {left_seats}, expected {SEATS - sold}")
+    if holds_left:
+        errors.append(f"{holds_left} holds are not released")
+
+    latencies.sort()
+    print(f"{buyers} buyers in {elapsed:.2f} s, hold p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"held {held}, sold {sold}, released {released} expired holds, left seats {left_seats}  "
+          f"{'OK' if not errors else 'FAILED: ' + '; '.join(errors)}")
+    return not errors
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
+    sys.exit(0 if ok else 1)
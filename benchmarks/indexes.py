@@ -0,0 +1,109 @@
+# EXPLAIN ANALYZE of page view queries with and without foreign key and filter indexes
+# usage: python -m benchmarks.indexes [--seed tickets] [--force]
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks import get_async_bench_engine
+from benchmarks.seed import seed
+from db import models
+from pages.views.agents import get_agents_discounts
+from pages.views.flights import get_flights_by_range_date, get_flight_quotes
+from pages.views.main import get_flights_and_search, get_grouped_flight
+from pages.views.payments import get_agents_balance, get_refill_by_agent_id
+from pages.views.tickets import get_tickets_by_flight
+from pages.views.users import get_all_history, get_all_users_with_role
+
+# indexes of migration 23658d98fcfa
+INDEXES = [
+    "ix_tickets_flight_id", "ix_tickets_agent_id", "ix_bookings_flight_id", "ix_bookings_agent_id_flight_id",
+    "ix_agent_debts_ticket_id", "ix_agent_debts_agent_id", "ix_flights_departure_date", "ix_flights_on_sale",
+    "ix_flights_flight_guide_id", "ix_user_history_user_id", "ix_user_history_created_at", "ix_refills_agent_id",
+    "ix_refills_created_at", "ix_agents_user_id",
+]
+
+
+def views(flight_id: int):
+    from_date, to_date = date.today(), date.today() + timedelta(days=30)
+    return {
+        "main flights": lambda db: get_flights_and_search(db, None, from_date, to_date, 1, 20),
+        "main grouped": lambda db: get_grouped_flight(db, from_date, to_date, 1, 20),
+        "flights main": lambda db: get_flights_by_range_date(db, page=1, limit=20),
+        "flights queue": lambda db: get_flights_by_range_date(db, page=1, limit=20, is_on_sale=True),
+        "flight quotas": lambda db: get_flight_quotes(db, None, from_date, to_date, 1, 20),
+        "tickets": lambda db: get_tickets_by_flight(db, page=1, limit=20),
+        "month tickets": lambda db: get_tickets_by_flight(db, from_date, to_date, page=1, limit=20),
+        "flight tickets": lambda db: get_tickets_by_flight(db, page=1, limit=20, flight_id=flight_id),
+        "agent tickets": lambda db: get_tickets_by_flight(db, page=1, limit=20, agent_id=7),
+        "users": lambda db: get_all_users_with_role(db, 1, 20),
+        "user history": lambda db: get_all_history(db, 1, 20, user_id=3),
+        "agent refills": lambda db: get_refill_by_agent_id(db, from_date - timedelta(days=365), to_date, agent_id=7,
+                                                           page=1, limit=20),
+        "balances": lambda db: get_agents_balance(db, None, 1, 20),
+        "agents": lambda db: get_agents_discounts(db, None, 1, 20),
+    }
+
+
+async def explain(db: AsyncSession, statements: list, repeat: int = 3) -> float:
+    """ Best execution time in milliseconds of statements of one view call """
+    connection = await db.connection()
+    best = None
+    for _ in range(repeat):
+        spent = 0.0
+        for statement, parameters in statements:
+            result = await connection.exec_driver_sql(
+                "EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters)
+            plan = result.scalar()
+            spent += (json.loads(plan) if isinstance(plan, str) else plan)[0]["Execution Time"]
+        best = spent if best is None else min(best, spent)
+    return best
+
+
+async def run(db: AsyncSession, captured: list, flight_id: int) -> dict:
+    timings = {}
+    for name, view in views(flight_id).items():
+        captured.clear()
+        await view(db)
+        statements = list(captured)
+        captured.clear()
+        timings[name] = await explain(db, statements)
+    return timings
+
+
+async def main():
+    args = sys.argv[1:]
+    if "--seed" in args:
+        seed(int(args[args.index("--seed") + 1]), force="--force" in args)
+
+    engine = get_async_bench_engine()
+    captured = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("EXPLAIN"):
+            captured.append((statement, parameters))
+
+    async with AsyncSession(bind=engine) as db:
+        flight_id = (await db.execute(
+            select(models.Ticket.flight_id).order_by(models.Ticket.id.desc()).limit(1))).scalar()
+
+        indexed = await run(db, captured, flight_id)
+
+        # DDL is transactional in PostgreSQL, indexes come back on rollback
+        for index in INDEXES:
+            await db.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        scanned = await run(db, captured, flight_id)
+        await db.rollback()
+    await engine.dispose()
+
+    print(f"{'view':<16}{'before, ms':>12}{'after, ms':>12}")
+    for name in indexed:
+        print(f"{name:<16}{scanned[name]:>12.1f}{indexed[name]:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+# Count statements and compiled cache entries produced by page views
+# usage: python -m benchmarks.plan_cache [iterations]
+import asyncio
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks import get_async_bench_engine
+from pages.views.agents import get_agents_discounts
+from pages.views.flights import get_flights_by_range_date, get_flight_quotes
+from pages.views.main import get_flights_and_search, get_grouped_flight
+from pages.views.payments import get_refill_by_agent_id
+from pages.views.tickets import get_tickets_by_flight
+from pages.views.users import get_all_history, get_all_users_with_role
+
+SEARCH_TEXTS = ["tas", "mos", "hy", "12", "ab", "ru", "uz", "sam", "dme", "svo"]
+
+
+def calls(i: int):
+    """ Same views with different values on each iteration like real traffic """
+    search = SEARCH_TEXTS[i % len(SEARCH_TEXTS)]
+    from_date = date.today() + timedelta(days=i % 30)
+    to_date = from_date + timedelta(days=30)
+    page = i % 5 + 1
+    return [
+        lambda db: get_flights_and_search(db, search, from_date, to_date, page, 20),
+        lambda db: get_grouped_flight(db, from_date, to_date, page, 20),
+        lambda db: get_flights_by_range_date(db, from_date, to_date, page, 20, search),
+        lambda db: get_flight_quotes(db, None, from_date, to_date, page, 20, search),
+        lambda db: get_tickets_by_flight(db, from_date, to_date, page, 20, search_text=search),
+        lambda db: get_all_users_with_role(db, page, 20, search),
+        lambda db: get_all_history(db, page, 20, search),
+        lambda db: get_refill_by_agent_id(db, from_date, to_date, page=page, limit=20, search_text=search),
+        lambda db: get_agents_discounts(db, None, page, 20, search),
+    ]
+
+
+async def main(iterations: int):
+    engine = get_async_bench_engine()
+    statements = Counter()
+    compiled_cache = {}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[statement] += 1
+
+    async with engine.connect() as connection:
+        has_pg_stat = (await connection.execute(
+            text("SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_stat_statements'"))).scalar()
+        if has_pg_stat:
+            await connection.execute(text("SELECT pg_stat_statements_reset()"))
+
+    cached_engine = engine.execution_options(compiled_cache=compiled_cache)
+    async with AsyncSession(bind=cached_engine) as db:
+        for i in range(iterations):
+            for call in calls(i):
+                await call(db)
+
+    executed = sum(statements.values())
+    print(f"executed statements:        {executed}")
+    print(f"distinct statement texts:   {len(statements)}")
+    print(f"compiled cache entries:     {len(compiled_cache)}")
+    print(f"compiled cache hit ratio:   {1 - len(compiled_cache) / executed:.2%}")
+
+    if has_pg_stat:
+        async with engine.connect() as connection:
+            rows = (await connection.execute(text(
+                "SELECT calls, LEFT(regexp_replace(query, '\\s+', ' ', 'g'), 80) AS query "
+                "FROM pg_stat_statements WHERE query ILIKE '%json_build_object%' ORDER BY calls DESC"))).fetchall()
+        print("\npg_stat_statements (calls per normalized statement):")
+        for row in rows:
+            print(f"{row.calls:>8}  {row.query}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,103 @@
+# Concurrent ticket sales against bench database, checks that flight is not oversold and agent is not overdrawn
+# usage: python -m benchmarks.sale_stress [buyers] (after python -m benchmarks.seed), exits with 1 on lost update
+import asyncio
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import get_async_bench_engine
+from crud_models.schemas import tickets as schemas
+from crud_models.views.ticket_sale import TicketSale
+from db import models
+from users.views.ledger import Ledger
+
+SEATS = 50
+AFFORDABLE_TICKETS = 30
+
+
+def new_ticket(flight_id: int, agent_id: int, run: str, i: int) -> schemas.TicketCreate:
+    return schemas.TicketCreate(flight_id=flight_id, agent_id=agent_id, first_name="Stress", surname="Buyer",
+                                dob=date(1990, 1, 1), gender_id=1, passport=f"SB{i:07d}",
+                                passport_expires=date(2035, 1, 1), citizenship=1, class_id=1, luggage=False,
+                                comment=run)
+
+
+async def buy(session_factory, flight_id: int, agent_id: int, run: str, i: int) -> bool:
+    async with session_factory() as db:
+        db_flight = await db.get(models.Flight, flight_id)
+        try:
+            await TicketSale.sell(db, new_ticket(flight_id, agent_id, run, i), db_flight, user_id=1)
+            return True
+        except ValueError:
+            return False
+
+
+async def scenario(session_factory, name: str, flight_id: int, agent_id: int, buyers: int, seats: int,
+                   balance: int = None):
+    """ Run buyers concurrently and compare sold tickets and counters left in database """
+    run = f"stress {name} {time.time()}"
+    async with session_factory() as db:
+        await db.execute(update(models.Flight).where(models.Flight.id == flight_id).values(left_seats=seats))
+        if balance is not None:
+            current = (await db.execute(select(models.Agent.balance).filter(models.Agent.id == agent_id))).scalar()
+            await db.execute(Ledger.post(agent_id, balance - current, "adjustment", "adjustment"))
+        await db.commit()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[buy(session_factory, flight_id, agent_id, run, i) for i in range(buyers)])
+    elapsed = time.perf_counter() - start
+
+    async with session_factory() as db:
+        tickets, paid = (await db.execute(
+            select(func.count(models.Ticket.id), func.coalesce(func.sum(models.Ticket.price), 0)).
+            filter(models.Ticket.comment == run))).one()
+        debts = (await db.execute(
+            select(func.count(models.AgentDebt.id)).join(models.Ticket, models.Ticket.id == models.AgentDebt.ticket_id).
+            filter(models.Ticket.comment == run))).scalar()
+        left_seats = (await db.execute(select(models.Flight.left_seats).filter(models.Flight.id == flight_id))).scalar()
+        agent_balance = (await db.execute(select(models.Agent.balance).filter(models.Agent.id == agent_id))).scalar()
+
+    sold = sum(results)
+    errors = []
+    if sold != tickets or debts != tickets:
+        errors.append(f"{sold} sales reported, {tickets} tickets and {debts} debts stored")
+    if left_seats != seats - tickets or left_seats < 0:
+        errors.append(f"left seats {left_seats}, expected {seats - tickets}")
+    if balance is not None and (agent_balance != balance - paid or agent_balance < 0):
+        errors.append(f"agent balance {agent_balance}, expected {balance - paid}")
+
+    print(f"{name:<10}{buyers:>6} buyers{sold:>6} sold{buyers - sold:>6} rejected{elapsed:>8.2f} s"
+          f"  left seats {left_seats}  {'OK' if not errors else 'FAILED: ' + '; '.join(errors)}")
+    return not errors
+
+
+async def main(buyers: int):
+    engine = get_async_bench_engine(pool_size=20, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        flight_id = (await db.execute(select(models.Flight.id).filter(models.Flight.deleted_at.is_(None)).
+                                      order_by(models.Flight.id.desc()).limit(1))).scalar()
+        credit_agent = (await db.execute(select(models.Agent.id).filter(models.Agent.is_on_credit.is_(True)).
+                                         limit(1))).scalar()
+        cash_agent = (await db.execute(select(models.Agent.id).filter(models.Agent.is_on_credit.isnot(True)).
+                                       limit(1))).scalar()
+        db_flight = await db.get(models.Flight, flight_id)
+        price, _ = await TicketSale.get_price(db, new_ticket(flight_id, cash_agent, "", 0), db_flight)
+
+    # more buyers than seats, agent on credit is never short of money
+    seats_ok = await scenario(session_factory, "seats", flight_id, credit_agent, buyers, SEATS)
+    # plenty of seats, agent can pay for AFFORDABLE_TICKETS only
+    balance_ok = await scenario(session_factory, "balance", flight_id, cash_agent, buyers, buyers,
+                                balance=price * AFFORDABLE_TICKETS)
+    await engine.dispose()
+    return seats_ok and balance_ok
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,47 @@
+# Compare search_text filters of page views with and without trigram indexes
+# usage: python -m benchmarks.search (after python -m benchmarks.seed)
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks import get_async_bench_engine, timed_async
+from pages.views.flights import get_flights_by_range_date
+from pages.views.tickets import get_tickets_by_flight
+
+SEARCH_INDEXES = ["ix_tickets_search", "ix_flight_guides_search", "ix_airports_search", "ix_users_search"]
+SEARCH_TEXTS = ["karimov", "aa00123", "wz 1001", "hy 15", "tashkent", "agent_17"]
+
+
+async def run(db: AsyncSession):
+    from_date, to_date = date.today() - timedelta(days=90), date.today() + timedelta(days=90)
+    results = {}
+    for search_text in SEARCH_TEXTS:
+        results[("tickets", search_text)] = await timed_async(lambda: get_tickets_by_flight(
+            db, from_date, to_date, page=1, limit=50, search_text=search_text))
+        results[("flights", search_text)] = await timed_async(lambda: get_flights_by_range_date(
+            db, from_date, to_date, page=1, limit=50, search_text=search_text))
+    return results
+
+
+async def main():
+    engine = get_async_bench_engine()
+    async with AsyncSession(bind=engine) as db:
+        indexed = await run(db)
+        await db.rollback()
+
+        # DDL is transactional in PostgreSQL, indexes come back on rollback
+        for index in SEARCH_INDEXES:
+            await db.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        scanned = await run(db)
+        await db.rollback()
+    await engine.dispose()
+
+    print(f"{'view':<10}{'search_text':<14}{'no index, ms':>14}{'trigram, ms':>14}")
+    for key in indexed:
+        print(f"{key[0]:<10}{key[1]:<14}{scanned[key]:>14.1f}{indexed[key]:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
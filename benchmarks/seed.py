@@ -0,0 +1,125 @@
+# Fill benchmark database with generated data
+# usage: python -m benchmarks.seed [tickets] [--force]
+import sys
+
+from sqlalchemy import text
+
+from benchmarks import get_bench_engine
+from crud_models.views.occupancy import REBUILD
+from db.partitions import ensure_partitions_sql
+
+TABLES = [
+    "ledger_entries", "agent_debts", "tickets", "bookings", "refills", "user_history", "user_notifications", "flights",
+    "flight_guides", "airports", "cities", "countries", "companies", "agents", "discounts", "users", "roles",
+    "genders", "ticket_classes", "ticket_statuses", "payment_types",
+]
+
+FIRST_NAMES = "ARRAY['Aziz','Ivan','Olga','Dilshod','Nodira','Sergey','Timur','Anna','Rustam','Maria','Bobur','Elena']"
+SURNAMES = "ARRAY['Karimov','Ivanov','Petrova','Tashkentov','Rahimova','Smirnov','Yusupov','Sokolova','Aliev']"
+CITIES = "ARRAY['Tashkent','Moscow','Samarkand','Bukhara','Kazan','Namangan','Novosibirsk','Fergana','Sochi','Urgench']"
+
+
+def statements(tickets: int):
+    flights = max(tickets // 40, 10)
+    agents = 200
+    return [
+        "INSERT INTO roles (id, name, title_ru, description) VALUES \
+            (1, 'superuser', 'Суперпользователь', ''), (2, 'admin', 'Админ', ''), (3, 'agent', 'Агент', '')",
+        "INSERT INTO discounts (id, amount, name) VALUES (1, 0, 'none'), (2, 500, 'partner')",
+        f"INSERT INTO users (id, email, password, username, role_id, date_joined, last_login) \
+            SELECT i, 'user' || i || '@asialine.uz', 'cGFzc3dvcmQ=', 'agent_' || i, \
+                CASE WHEN i <= 5 THEN 2 ELSE 3 END, now(), now() \
+            FROM generate_series(1, {agents + 5}) AS i",
+        f"INSERT INTO agents (id, user_id, company_name, balance, is_on_credit, discount_id, registered_date) \
+            SELECT i, i + 5, 'Agency ' || i, 10000000, i % 3 = 0, 1 + i % 2, now() \
+            FROM generate_series(1, {agents}) AS i",
+        "INSERT INTO countries (id, country_ru, country_en, country_uz, code) \
+            SELECT i, 'Страна ' || i, 'Country ' || i, 'Davlat ' || i, 'C' || i FROM generate_series(1, 5) AS i",
+        f"INSERT INTO cities (id, city_ru, city_en, city_uz, code, country_id) \
+            SELECT i, 'Город ' || i, ({CITIES})[1 + i % 10] || ' ' || i, 'Shahar ' || i, 'T' || i, 1 + i % 5 \
+            FROM generate_series(1, 20) AS i",
+        f"INSERT INTO airports (id, airport_ru, airport_en, airport_uz, code, city_id) \
+            SELECT i, 'Аэропорт ' || i, ({CITIES})[1 + i % 10] || ' International ' || i, 'Aeroport ' || i, \
+                'A' || i, 1 + i % 20 \
+            FROM generate_series(1, 40) AS i",
+        "INSERT INTO companies (id, name, code) \
+            SELECT i, 'Airline ' || i, 'L' || i FROM generate_series(1, 5) AS i",
+        "INSERT INTO flight_guides (id, company_id, flight_number, from_airport_id, to_airport_id, luggage) \
+            SELECT i, 1 + i % 5, 'HY ' || (100 + i), 1 + i % 40, 1 + (i + 7) % 40, 300 \
+            FROM generate_series(1, 200) AS i",
+        f"INSERT INTO flights (id, flight_guide_id, departure_date, arrival_date, purchase_price, price, currency, \
+                total_seats, left_seats, online_seats, on_sale, created_at, updated_at) \
+            SELECT i, 1 + i % 200, d, d + interval '3 hours', 2000000, 2500000 + (i % 50) * 10000, 'UZS', \
+                180, 180 - 40, 0, d - interval '60 days', d - interval '90 days', d - interval '90 days' \
+            FROM generate_series(1, {flights}) AS i, \
+                LATERAL (SELECT now() - interval '180 days' + (i * interval '360 days') / {flights} AS d) AS dd",
+        "INSERT INTO genders (id, gender_ru, gender_en) VALUES (1, 'Мужской', 'Male'), (2, 'Женский', 'Female')",
+        "INSERT INTO ticket_classes (id, name_ru, code) VALUES (1, 'Эконом', 'Y')",
+        "INSERT INTO ticket_statuses (id, name_ru, name_en, name_uz) \
+            SELECT i, 'Статус ' || i, (ARRAY['sold','booked','canceled','refunded','new'])[i], 'Holat ' || i \
+            FROM generate_series(1, 5) AS i",
+        "INSERT INTO payment_types (id, name_ru, name_en) VALUES (1, 'Наличные', 'Cash'), (2, 'Перевод', 'Transfer')",
+        f"INSERT INTO tickets (id, ticket_number, flight_id, agent_id, first_name, surname, dob, gender_id, passport, \
+                passport_expires, citizenship, class_id, price, currency, luggage, is_booked, platform, status_id, \
+                created_at, updated_at, deleted_at) \
+            SELECT i, 'WZ ' || (10000000 + i), 1 + i % {flights}, 1 + i % {agents}, \
+                ({FIRST_NAMES})[1 + i % 12], ({SURNAMES})[1 + i % 9], date '1980-01-01' + i % 9000, 1 + i % 2, \
+                'AA' || lpad((i * 7919 % 10000000)::text, 7, '0'), date '2030-01-01', 1 + i % 5, 1, \
+                2500000, 'UZS', i % 4 = 0, false, 'web', CASE WHEN i % 50 = 0 THEN 3 ELSE 5 END, \
+                f.created_at + (i % 1000) * interval '1 minute', now(), \
+                CASE WHEN i % 50 = 0 THEN now() END \
+            FROM generate_series(1, {tickets}) AS i JOIN flights AS f ON f.id = 1 + i % {flights}",
+        "INSERT INTO agent_debts (agent_id, flight_id, ticket_id, type, amount, created_at, updated_at) \
+            SELECT agent_id, flight_id, id, 'purchase', price, created_at, created_at FROM tickets",
+        "INSERT INTO agent_debts (agent_id, flight_id, ticket_id, type, amount, comment, created_at, updated_at) \
+            SELECT agent_id, flight_id, id, 'fine', 100000, 'cancel', updated_at, updated_at \
+            FROM tickets WHERE deleted_at IS NOT NULL",
+        f"INSERT INTO bookings (flight_id, agent_id, hard_block, soft_block, price, currency, created_at, updated_at) \
+            SELECT f.id, 1 + (f.id * 3 + k) % {agents}, 5, 5, f.price, 'UZS', f.created_at, f.created_at \
+            FROM flights AS f, generate_series(1, 2) AS k",
+        f"INSERT INTO refills (agent_id, receiver_id, amount, payment_type_id, comment, created_at, updated_at) \
+            SELECT 1 + i % {agents}, 1 + i % 5, 1000000 + i % 100 * 1000, 1 + i % 2, 'refill ' || i, \
+                now() - (i % 360) * interval '1 day', now() \
+            FROM generate_series(1, {tickets // 20}) AS i",
+        # sales and refills of each agent after opening entry which makes final balance the seeded one
+        "INSERT INTO ledger_entries (agent_id, account, kind, amount, balance, reference_id, created_at) \
+            SELECT agent_id, account::\"LedgerAccount\", kind::\"LedgerKind\", amount, \
+                SUM(amount) OVER (PARTITION BY agent_id ORDER BY created_at, reference_id NULLS FIRST), \
+                reference_id, created_at \
+            FROM (SELECT agent_id, 'sales' AS account, 'ticket_sale' AS kind, -price AS amount, id AS reference_id, \
+                    created_at FROM tickets \
+                UNION ALL SELECT agent_id, 'cash', 'refill', amount, id, created_at FROM refills \
+                UNION ALL SELECT a.id, 'adjustment', 'opening', a.balance + COALESCE((SELECT SUM(price) \
+                        FROM tickets WHERE agent_id = a.id), 0) - COALESCE((SELECT SUM(amount) \
+                        FROM refills WHERE agent_id = a.id), 0), NULL, now() - interval '2 years' \
+                    FROM agents AS a) AS movements",
+        f"INSERT INTO user_history (user_id, action, extra_info, created_at) \
+            SELECT 1 + i % 5, 'create ticket', 'Ticket ' || i || ' created', \
+                now() - ({tickets} - i) * interval '1 minute' \
+            FROM generate_series(1, {tickets}) AS i",
+    ]
+
+
+def seed(tickets: int, force: bool = False):
+    engine = get_bench_engine()
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT EXISTS (SELECT 1 FROM tickets)")).scalar() and not force:
+            raise SystemExit("benchmark database is not empty, pass --force to replace data")
+        connection.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+        # generated history and debts go up to 10 months back
+        for statement in ensure_partitions_sql(months_back=12):
+            connection.execute(text(statement))
+        for statement in statements(tickets):
+            connection.execute(text(statement))
+        connection.execute(text(REBUILD.format(where="")))
+        for table in TABLES:
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE"))
+    print(f"seeded {tickets} tickets")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    seed(int(args[0]) if args else 200000, force="--force" in sys.argv)
@@ -3,8 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from crud_models.views.cities import City
 from db.database import get_db
 from crud_models.schemas import airports as schemas
@@ -47,12 +46,9 @@ async def get_airport(airport_id: int,
 
 @routers.post("/airport", tags=["airports"])
 async def create_airport(airport: schemas.AirportCreate,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("create_airport")),
                          db: Session = Depends(get_db)):
     """ Create new airport """
-    if not check_permissions('create_airport', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         if City.get_by_id(db, airport.city_id) is None:
             raise ValueError("City not found")
@@ -67,16 +63,13 @@ async def create_airport(airport: schemas.AirportCreate,
 @routers.patch("/airport/{airport_id}", tags=["airports"])
 async def update_airport(airport_id: int,
                          airport: schemas.AirportUpdate,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("update_airport")),
                          db: Session = Depends(get_db)):
     """
     Update airport by id\n
     **Optional fields**:\n
     *all fields*
     """
-    if not check_permissions('update_airport', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_airport = Airport.get_by_id(db, airport_id)
         if db_airport is None:
@@ -93,12 +86,9 @@ async def update_airport(airport_id: int,
 
 @routers.delete("/airport/{airport_id}", tags=["airports"])
 async def delete_airport(airport_id: int,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("delete_airport")),
                          db: Session = Depends(get_db)):
     """ Delete airport by id """
-    if not check_permissions('delete_airport', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_airport = Airport.get_by_id(db, airport_id)
         if db_airport is None:
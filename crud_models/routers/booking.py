@@ -4,8 +4,7 @@ from typing import Optional
 import logging
 from datetime import datetime
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions, get_user_id
+from auth.auth_token.auth_context import AuthContext, require_permission
 from crud_models.views.flights import Flight
 from db.database import get_db
 from crud_models.schemas import booking as schemas
@@ -51,7 +50,7 @@ async def get_booking(booking_id: int,
 
 @routers.post("/booking", tags=["bookings"])
 async def create_booking(booking: schemas.BookingCreate,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("create_booking")),
                          db: Session = Depends(get_db)):
     """
     Create booking
@@ -61,8 +60,6 @@ async def create_booking(booking: schemas.BookingCreate,
     * if flight departure date is less than current date, booking will not be created
     * if flight left seats is less or equal to 0, booking will not be created
     """
-    if not check_permissions("create_booking", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
         if booking.flight_id is None:
             raise ValueError("Flight id is required")
@@ -76,7 +73,7 @@ async def create_booking(booking: schemas.BookingCreate,
         if Booking.get_by_flight_id_and_agent_id(db, booking.flight_id, booking.agent_id):
             raise ValueError("Booking already exists")
 
-        return Booking.create(db, booking, db_flight, get_user_id(jwt))
+        return Booking.create(db, booking, db_flight, auth.user_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     # except Exception as e:
@@ -87,7 +84,7 @@ async def create_booking(booking: schemas.BookingCreate,
 @routers.patch("/booking/{booking_id}", tags=["bookings"])
 async def update_booking(booking_id: int,
                          booking: schemas.BookingUpdate,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("update_booking")),
                          db: Session = Depends(get_db)):
     """
     Update booking by id\n
@@ -97,9 +94,6 @@ async def update_booking(booking_id: int,
     * booking cannot be updated if flight departure date is less than current date
     * booking cannot be updated if booking is deleted
     """
-    if not check_permissions("update_booking", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_booking = Booking.get_by_id(db, booking_id)
         if db_booking is None or db_booking.deleted_at is not None:
@@ -112,24 +106,21 @@ async def update_booking(booking_id: int,
         # if Booking.get_by_flight_id_and_agent_id(db, booking.flight_id, booking.agent_id):
         #     raise ValueError("Booking already exists")
 
-        return Booking.update(db, booking, db_booking, db_flight, get_user_id(jwt))
+        return Booking.update(db, booking, db_booking, db_flight, auth.user_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 
 @routers.delete("/booking/{booking_id}", tags=["bookings"])
 async def delete_booking(booking_id: int,
-                         jwt: dict = Depends(JWTBearer()),
+                         auth: AuthContext = Depends(require_permission("delete_booking")),
                          db: Session = Depends(get_db)):
     """ Delete booking by id """
-    if not check_permissions("delete_booking", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_booking = Booking.get_by_id(db, booking_id)
         if db_booking is None or db_booking.deleted_at is not None:
             raise ValueError("Booking not found")
-        return Booking.delete(db, booking_id, get_user_id(jwt))
+        return Booking.delete(db, booking_id, auth.user_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
@@ -6,8 +6,7 @@ import logging
 from db.database import get_db
 from crud_models.schemas import flight_guide as schemas
 from crud_models.views.flight_guide import FlightGuide
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions, get_user_id
+from auth.auth_token.auth_context import AuthContext, require_permission
 
 routers = APIRouter()
 
@@ -40,11 +39,8 @@ async def get_flight_guide(flight_guide_id: int,
 
 @routers.post("/flight_guide", tags=["flight_guide"])
 async def create_flight_guide(flight_guide: schemas.FlightGuideCreate,
-                              jwt: dict = Depends(JWTBearer()),
+                              auth: AuthContext = Depends(require_permission("create_flight_guide")),
                               db: Session = Depends(get_db)):
-    if not check_permissions("create_flight_guide", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         if flight_guide.from_airport_id == flight_guide.to_airport_id:
             raise ValueError("Departure airport must be different from arrival airport")
@@ -62,11 +58,8 @@ async def create_flight_guide(flight_guide: schemas.FlightGuideCreate,
 @routers.patch("/flight_guide/{flight_guide_id}", tags=["flight_guide"])
 async def update_flight_guide(flight_guide_id: int,
                               flight_guide: schemas.FlightGuideCreate,
-                              jwt: dict = Depends(JWTBearer()),
+                              auth: AuthContext = Depends(require_permission("update_flight_guide")),
                               db: Session = Depends(get_db)):
-    if not check_permissions("update_flight_guide", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         if flight_guide.from_airport_id == flight_guide.to_airport_id:
             raise ValueError("Departure airport must be different from arrival airport")
@@ -84,11 +77,8 @@ async def update_flight_guide(flight_guide_id: int,
 
 @routers.delete("/flight_guide/{flight_guide_id}", tags=["flight_guide"])
 async def delete_flight_guide(flight_guide_id: int,
-                              jwt: dict = Depends(JWTBearer()),
+                              auth: AuthContext = Depends(require_permission("delete_flight_guide")),
                               db: Session = Depends(get_db)):
-    if not check_permissions("delete_flight_guide", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_flight_guide = FlightGuide.get_by_id(db, flight_guide_id)
         if db_flight_guide is None:
@@ -8,8 +8,7 @@ from crud_models.views.flights import Flight, FlightPriceHistory
 from db import models
 from db.database import get_db
 from crud_models.schemas import flights as schemas
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions, get_user_id
+from auth.auth_token.auth_context import AuthContext, require_permission
 
 routers = APIRouter()
 
@@ -49,7 +48,7 @@ async def get_flight(flight_id: int,
 
 @routers.post("/flight", tags=["flights"])
 async def create_flight(flight: schemas.FlightCreate,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("create_flight")),
                         db: Session = Depends(get_db)):
     """
     Create new flight\n
@@ -59,13 +58,11 @@ async def create_flight(flight: schemas.FlightCreate,
     * departure airport must be different from arrival airport\n
     * on sale date must be greater than current date\n
     """
-    if not check_permissions("create_flight", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
         # check flight.flight_guide_id and departure_date is same return error
         if Flight.is_flight_exist_today(db, flight.flight_guide_id, flight.departure_date):
             raise ValueError("This flight is already exists today")
-        create = Flight.create(db, flight, get_user_id(jwt))
+        create = Flight.create(db, flight, auth.user_id)
         if flight.price > 0:
             FlightPriceHistory.create(db, flight.price, create.id)
         return schemas.Flight.from_orm(create)
@@ -79,7 +76,7 @@ async def create_flight(flight: schemas.FlightCreate,
 @routers.patch("/flight/{flight_id}", tags=["flights"])
 async def update_flight(flight_id: int,
                         flight: schemas.FlightUpdate,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("update_flight")),
                         db: Session = Depends(get_db)):
     """
     Update flight by id\n
@@ -95,9 +92,6 @@ async def update_flight(flight_id: int,
     * total seats must be greater than left seats\n
     * price must be greater than 0\n
     """
-    if not check_permissions("update_flight", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_flight = Flight.get_by_id(db, flight_id)
         if db_flight is None:
@@ -118,7 +112,7 @@ async def update_flight(flight_id: int,
             flight.left_seats = db_flight.left_seats
 
         current_price, db_price = flight.price, db_flight.price
-        update = Flight.update(db, db_flight, flight, get_user_id(jwt))
+        update = Flight.update(db, db_flight, flight, auth.user_id)
         if current_price != db_price:
             FlightPriceHistory.create(db, flight.price, update.id)
         return schemas.Flight.from_orm(update)
@@ -132,15 +126,12 @@ async def update_flight(flight_id: int,
 
 @routers.delete("/flight/{flight_id}", tags=["flights"])
 async def delete_flight(flight_id: int,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("delete_flight")),
                         db: Session = Depends(get_db)):
     """
      **Attention:**\n
      Get all quotas and tickets of this flight and delete them.
      """
-    if not check_permissions("delete_flight", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_flight = Flight.get_by_id(db, flight_id)
         if db_flight is None or db_flight.deleted_at is not None:
@@ -151,7 +142,7 @@ async def delete_flight(flight_id: int,
         if db_booking := db.query(models.Booking).filter(models.Booking.flight_id == db_flight.id,
                                                          models.Booking.deleted_at.is_(None)).all():
             raise ValueError(f"Flight has {len(db_booking)} bookings")
-        return Flight.delete(db, db_flight, get_user_id(jwt))
+        return Flight.delete(db, db_flight, auth.user_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -177,12 +168,9 @@ async def get_flight_tickets(flight_id: int,
 
 @routers.patch("/flight-set-on-sale/{flight_id}", tags=["flights"])
 async def set_flight_for_sale(flight_id: int,
-                              jwt: dict = Depends(JWTBearer()),
+                              auth: AuthContext = Depends(require_permission("set_flight_for_sale")),
                               db: Session = Depends(get_db)):
     """ Set flight for sale from now """
-    if not check_permissions("set_flight_for_sale", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         db_flight = Flight.get_by_id(db, flight_id)
         if db_flight is None or db_flight.deleted_at is not None or db_flight.departure_date < datetime.now():
@@ -3,8 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from db.database import get_db
 from crud_models.schemas import refills as schemas
 from crud_models.views.refills import Refill
@@ -40,11 +39,8 @@ async def get_refill(refill_id: int,
 
 @routers.post("/refill", tags=['refills'])
 async def create_refill(refill: schemas.RefillCreate,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("create_refill")),
                         db: Session = Depends(get_db)):
-    if not check_permissions('create_refill', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         return schemas.Refill.from_orm(Refill.create(db, refill))
     except ValueError as e:
@@ -57,11 +53,8 @@ async def create_refill(refill: schemas.RefillCreate,
 @routers.patch("/refill/{refill_id}", tags=["refills"])
 async def update_refill(refill_id: int,
                         refill: schemas.RefillUpdate,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("update_refill")),
                         db: Session = Depends(get_db)):
-    if not check_permissions('update_refill', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_refill = Refill.get_by_id(db, refill_id)
         if db_refill is None:
@@ -76,11 +69,8 @@ async def update_refill(refill_id: int,
 
 @routers.delete("/refill/{refill_id}", tags=["refills"])
 async def delete_refill(refill_id: int,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("delete_refill")),
                         db: Session = Depends(get_db)):
-    if not check_permissions('delete_refill', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_refill = Refill.get_by_id(db, refill_id)
         if db_refill is None or db_refill.is_deleted:
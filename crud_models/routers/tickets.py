@@ -1,17 +1,19 @@
 from datetime import datetime
 
 from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import logging
 
 from crud_models.views.booking import Booking
 from crud_models.views.flights import Flight
-from db.database import get_db
+from crud_models.views.sale_queue import sale_queues
+from crud_models.views.seat_holds import SeatHold
+from crud_models.views.ticket_sale import MAX_GROUP_SIZE
+from db.database import get_async_db
 from crud_models.schemas import tickets as schemas
 from crud_models.views.tickets import Ticket
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions, get_user_id
+from auth.auth_token.auth_context import AuthContext, require_permission
 
 routers = APIRouter()
 
@@ -19,12 +21,12 @@ routers = APIRouter()
 @routers.get("/tickets", response_model=list[schemas.Ticket], tags=["tickets"])
 async def get_tickets(page: Optional[int] = None,
                       limit: Optional[int] = None,
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_async_db)):
     """
     Get all tickets where ticket and flight are not deleted and flight departure date is greater than current date
     """
     try:
-        return Ticket.get_list(db, page, limit)
+        return await Ticket.get_list(db, page, limit)
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad Request")
@@ -32,11 +34,11 @@ async def get_tickets(page: Optional[int] = None,
 
 @routers.get("/ticket/{ticket_id}", response_model=schemas.Ticket, tags=["tickets"])
 async def get_ticket(ticket_id: int,
-                     db: Session = Depends(get_db)):
+                     db: AsyncSession = Depends(get_async_db)):
     """ Get ticket by id where ticket and flight are not deleted and flight departure date is greater
     than current date """
     try:
-        db_ticket = Ticket.get_by_id(db, ticket_id)
+        db_ticket = await Ticket.get_by_id(db, ticket_id)
         if db_ticket is None:
             raise ValueError("Ticket not found")
         return db_ticket
@@ -46,11 +48,11 @@ async def get_ticket(ticket_id: int,
 
 @routers.get("/ticket/details/{ticket_id}", tags=["tickets"])
 async def get_ticket_details(ticket_id: int,
-                                db: Session = Depends(get_db)):
+                                db: AsyncSession = Depends(get_async_db)):
         """ Get ticket details by id where ticket and flight are not deleted and flight departure date is greater
         than current date """
         try:
-            db_ticket = Ticket.get_details_by_id(db, ticket_id)
+            db_ticket = await Ticket.get_details_by_id(db, ticket_id)
             if db_ticket is None:
                 raise ValueError("Ticket not found")
             return db_ticket
@@ -62,8 +64,9 @@ async def get_ticket_details(ticket_id: int,
 async def create_ticket(ticket: schemas.TicketCreate,
                         hard: bool = False,
                         soft: bool = False,
-                        jwt: dict = Depends(JWTBearer()),
-                        db: Session = Depends(get_db)):
+                        hold_id: Optional[int] = None,
+                        auth: AuthContext = Depends(require_permission("create_ticket")),
+                        db: AsyncSession = Depends(get_async_db)):
     """
     Create ticket for flight\n
     **Rules:**\n
@@ -75,33 +78,120 @@ async def create_ticket(ticket: schemas.TicketCreate,
     * if flight is deleted, ticket will not be created
     * if flight departure date is less than current date, ticket will not be created
     * if flight left seats is less or equal to 0, ticket will not be created
+    * if hold_id is given, seat is taken from agent seat hold instead of flight left seats
+    * within first minutes of sale tickets of flight are sold through its sale queue,
+     sold out flight is rejected without database
     """
-    if not check_permissions("create_ticket", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
         if hard and soft:
             raise ValueError("hard and soft cannot be true at the same time")
         if ticket.flight_id is None:
             raise ValueError("flight_id is required")
-        db_flight = Flight.get_by_id(db, ticket.flight_id)
+        if not (hard or soft) and hold_id is None:
+            if await sale_queues.is_sold_out(ticket.flight_id):
+                raise ValueError("Flight left seats is less or equal to 0")
+            queue = await sale_queues.burst_queue(db, ticket.flight_id)
+            if queue is not None:
+                return await Ticket.create_queued(queue, ticket, auth.user_id)
+        db_flight = await db.run_sync(Flight.get_by_id, ticket.flight_id)
         if db_flight is None or db_flight.deleted_at is not None or db_flight.on_sale > datetime.now() or \
                 db_flight.departure_date < datetime.now():
             raise ValueError("Flight not found")
-        if db_flight.left_seats <= 0:
+        if hold_id is None and db_flight.left_seats <= 0:
             raise ValueError("Flight left seats is less or equal to 0")
-        return Ticket.create(db, ticket, db_flight, get_user_id(jwt), hard, soft)
+        return await Ticket.create(db, ticket, db_flight, auth.user_id, hard, soft, hold_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@routers.post("/tickets/bulk", response_model=list[schemas.TicketBulkResult], tags=["tickets"])
+async def create_tickets_bulk(tickets: list[schemas.TicketCreate],
+                              hard: bool = False,
+                              soft: bool = False,
+                              hold_id: Optional[int] = None,
+                              auth: AuthContext = Depends(require_permission("create_ticket")),
+                              db: AsyncSession = Depends(get_async_db)):
+    """
+    Create tickets for group of passengers of one flight and one agent\n
+    **Rules:**\n
+    * same rules as for one ticket
+    * all tickets must have same flight_id and agent_id, up to 50 tickets in group
+    * seats or quota and agent balance are checked for whole group,
+     either all tickets are created or none of them\n
+    * result is returned for each passenger in order of request
+    * if hold_id is given, seats are taken from agent seat hold
+    """
+    try:
+        if hard and soft:
+            raise ValueError("hard and soft cannot be true at the same time")
+        if not tickets:
+            raise ValueError("tickets are required")
+        if len(tickets) > MAX_GROUP_SIZE:
+            raise ValueError(f"group can not have more than {MAX_GROUP_SIZE} tickets")
+        if len({ticket.flight_id for ticket in tickets}) > 1 or len({ticket.agent_id for ticket in tickets}) > 1:
+            raise ValueError("all tickets must have same flight_id and agent_id")
+        db_flight = await db.run_sync(Flight.get_by_id, tickets[0].flight_id)
+        if db_flight is None or db_flight.deleted_at is not None or db_flight.on_sale > datetime.now() or \
+                db_flight.departure_date < datetime.now():
+            raise ValueError("Flight not found")
+        if not (hard or soft) and hold_id is None and db_flight.left_seats < len(tickets):
+            raise ValueError("Flight left seats is less than number of tickets")
+        return await Ticket.create_bulk(db, tickets, db_flight, auth.user_id, hard, soft, hold_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@routers.post("/tickets/holds", response_model=schemas.SeatHold, tags=["tickets"])
+async def create_seat_hold(seat_hold: schemas.SeatHoldCreate,
+                           auth: AuthContext = Depends(require_permission("create_ticket")),
+                           db: AsyncSession = Depends(get_async_db)):
+    """
+    Hold seats of flight for agent for 5 minutes\n
+    **Rules:**\n
+    * flight must be on sale, not deleted and not departed
+    * all seats are held or none of them
+    * held seats are sold by POST /ticket or /tickets/bulk with hold_id,
+     seats which are not sold until expires_at are given back to flight\n
+    """
+    try:
+        return await SeatHold.hold(db, seat_hold.flight_id, seat_hold.agent_id, seat_hold.seats)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        print(logging.error(e))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seats have trouble holding")
+
+
+@routers.delete("/tickets/holds/{hold_id}", tags=["tickets"])
+async def release_seat_hold(hold_id: int,
+                            auth: AuthContext = Depends(require_permission("create_ticket")),
+                            db: AsyncSession = Depends(get_async_db)):
+    """
+    Give seats of hold back to flight before it expires\n
+    * agent releases only own holds, users who manage agents release any hold
+    """
+    try:
+        agent_id = None
+        if not auth.has_permission("get_agents"):
+            agent_id = await SeatHold.agent_id_of(db, auth.user_id)
+            if agent_id is None:
+                raise ValueError("Seat hold not found")
+        released = await SeatHold.release(db, hold_id, agent_id)
+        if released is None:
+            raise ValueError("Seat hold not found")
+        sale_queues.reopen(released.flight_id)
+        return {"message": "Seat hold released successfully"}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
 @routers.patch("/ticket/{ticket_id}", tags=["tickets"])
 async def update_ticket(ticket_id: int,
                         ticket: schemas.TicketUpdate,
                         hard: bool = False,
                         soft: bool = False,
-                        jwt: dict = Depends(JWTBearer()),
-                        db: Session = Depends(get_db)):
+                        auth: AuthContext = Depends(require_permission("update_ticket")),
+                        db: AsyncSession = Depends(get_async_db)):
     """
     Update ticket by id\n
     **Rules:**\n
@@ -110,20 +200,17 @@ async def update_ticket(ticket_id: int,
     * ticket cannot be updated if flight departure date is less than current date
     * ticket cannot be updated if ticket is deleted
     """
-    if not check_permissions("update_ticket", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_ticket = Ticket.get_by_id(db, ticket_id)
+        db_ticket = await Ticket.get_by_id(db, ticket_id)
         if db_ticket.is_booked:
             raise ValueError("Ticket is booked you cannot change this ticket")
-        db_flight = Flight.get_by_id(db, ticket.flight_id)
+        db_flight = await db.run_sync(Flight.get_by_id, ticket.flight_id)
         if db_flight is None or db_flight.deleted_at is not None or db_flight.on_sale > datetime.now() or \
                 db_flight.departure_date < datetime.now():
             raise ValueError("Flight not found")
         if db_ticket is None or db_ticket.deleted_at is not None or db_flight.departure_date < datetime.now():
             raise ValueError("Ticket not found")
-        db_booking = Booking.is_agent_has_booking(db, ticket.agent_id, ticket.flight_id)
+        db_booking = await db.run_sync(Booking.is_agent_has_booking, ticket.agent_id, ticket.flight_id)
         print(db_booking)
         if db_booking is not None and (hard and db_booking.hard_block <= 0):
             raise ValueError("Hard block is not enough")
@@ -131,26 +218,23 @@ async def update_ticket(ticket_id: int,
             raise ValueError("Soft block is not enough")
         if (hard or soft) and db_booking is None:
             raise ValueError("Agent does not have any quotas")
-        return Ticket.update(db, db_ticket, ticket, db_flight, get_user_id(jwt), db_booking, hard, soft)
+        return await Ticket.update(db, db_ticket, ticket, db_flight, auth.user_id, db_booking, hard, soft)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @routers.post("/ticket/cancellation", tags=["tickets"])
 async def cancel_ticket_add_to_agent_fine(ticket_cancel: schemas.TicketCancel,
-                                          jwt: dict = Depends(JWTBearer()),
-                                          db: Session = Depends(get_db)):
+                                          auth: AuthContext = Depends(require_permission("cancel_ticket")),
+                                          db: AsyncSession = Depends(get_async_db)):
     """
     Cancel ticket and add fine to agent will bу added to flight left seats\n
     """
-    if not check_permissions("cancel_ticket", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_ticket = Ticket.get_by_id(db, ticket_cancel.ticket_id)
+        db_ticket = await Ticket.get_by_id(db, ticket_cancel.ticket_id)
         if db_ticket.deleted_at or db_ticket is None:
             raise ValueError("Ticket not found")
-        return Ticket.cancel(db, ticket_cancel, get_user_id(jwt))
+        return await Ticket.cancel(db, ticket_cancel, auth.user_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
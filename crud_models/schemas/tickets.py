@@ -159,6 +159,35 @@ class Ticket(TicketUpdate):
         }
 
 
+class TicketBulkResult(BaseModel):
+    first_name: str
+    surname: str
+    passport: str
+    ticket_id: int
+    ticket_number: str
+    price: int
+
+
+class SeatHoldCreate(BaseModel):
+    flight_id: int
+    agent_id: int
+    seats: int = 1
+
+    @validator('seats')
+    def seats_gt_than_0(cls, v):
+        if v < 1:
+            raise ValueError('seats must be greater than 0')
+        return v
+
+
+class SeatHold(BaseModel):
+    id: int
+    flight_id: int
+    agent_id: int
+    seats: int
+    expires_at: datetime
+
+
 class TicketCancel(BaseModel):
     ticket_id: int
     fine: int
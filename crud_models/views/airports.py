@@ -1,8 +1,10 @@
 from typing import Optional
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from db import models
+from pages.views.reference import CITY_FIELDS, fragment, page_rows, reference_cache, search_rows
 from crud_models.schemas import airports as schemas
 
 
@@ -24,6 +26,7 @@ class Airport:
         db.add(db_airport)
         db.commit()
         db.refresh(db_airport)
+        reference_cache.invalidate("airports")
         return db_airport
 
     @staticmethod
@@ -32,41 +35,25 @@ class Airport:
             if value is not None:
                 setattr(db_airport, key, value)
         db.commit()
+        reference_cache.invalidate("airports")
         return db_airport
 
     @staticmethod
     def delete(db: Session, db_airport: models.Airport):
         db.delete(db_airport)
         db.commit()
+        reference_cache.invalidate("airports")
         return db_airport
 
     @staticmethod
-    def get_with_cities(db: Session, page: Optional[int], limit: Optional[int], search: Optional[str]):
-        query = f"SELECT a.id, a.airport_ru, a.airport_en, a.airport_uz, a.code, \
-                json_build_object( \
-                'id', c.id, \
-                'city_ru', c.city_ru, \
-                'city_en', c.city_en, \
-                'city_uz', c.city_uz, \
-                'code', c.code \
-                ) as city \
-                FROM airports AS a \
-                LEFT JOIN cities AS c ON a.city_id = c.id "
-
-        if search:
-            search = search.lower()
-            query += f"WHERE (LOWER(a.airport_ru) LIKE '%{search}%' \
-                    OR LOWER(a.airport_en) LIKE '%{search}%' \
-                    OR LOWER(a.airport_uz) LIKE '%{search}%' \
-                    OR LOWER(a.code) LIKE '%{search}%' \
-                    OR LOWER(c.city_ru) LIKE '%{search}%' \
-                    OR LOWER(c.city_en) LIKE '%{search}%' \
-                    OR LOWER(c.city_uz) LIKE '%{search}%' \
-                    OR LOWER(c.code) LIKE '%{search}%') "
-
-        counter = db.execute(query).fetchall()
-
-        if page and limit:
-            query += f"OFFSET {limit * (page - 1)} LIMIT {limit} "
-
-        return db.execute(query).fetchall(), len(counter)
+    async def get_with_cities(db: AsyncSession, page: Optional[int], limit: Optional[int], search: Optional[str]):
+        """ Airports with their cities from reference data cache """
+        cities = await reference_cache.get(db, "cities")
+        rows = [{"id": airport["id"], "airport_ru": airport["airport_ru"], "airport_en": airport["airport_en"],
+                 "airport_uz": airport["airport_uz"], "code": airport["code"],
+                 "city": fragment(cities.get(airport["city_id"]), CITY_FIELDS)}
+                for airport in await reference_cache.rows(db, "airports")]
+        rows = search_rows(rows, search, lambda row: (
+            row["airport_ru"], row["airport_en"], row["airport_uz"], row["code"],
+            row["city"]["city_ru"], row["city"]["city_en"], row["city"]["city_uz"], row["city"]["code"]))
+        return page_rows(rows, page, limit)
@@ -2,10 +2,15 @@ from typing import Optional
 
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
 
 from db import models
 from crud_models.schemas import booking as schemas
+from crud_models.views.occupancy import FlightOccupancy
+from crud_models.views.sale_queue import sale_queues
+from pages.views.response_cache import response_cache
+from users.views.ledger import Ledger
 from users.views.user_history import History
 
 
@@ -62,14 +67,18 @@ class Booking:
                user_id: int):
         """ if booking created successfully, -1 from models Flight left_seats """
         try:
-            if flight.left_seats - booking.hard_block - booking.soft_block < 0:
+            taken = db.execute(FlightOccupancy.change_left_seats(
+                flight.id, -(booking.hard_block + booking.soft_block))).first()
+            if taken is None:
                 raise ValueError('Flight has not enough seats')
+            set_committed_value(flight, 'left_seats', taken.left_seats)
 
-            flight.left_seats -= booking.hard_block + booking.soft_block
             db_booking = models.Booking(**booking.dict())
             db_booking.price = flight.price
             db.add(db_booking)
+            db.execute(FlightOccupancy.change(flight.id, booked_seats=booking.hard_block + booking.soft_block))
             db.commit()
+            response_cache.invalidate("bookings")
             db.refresh(db_booking)
 
             # add history
@@ -91,23 +100,22 @@ class Booking:
         """ find difference between old and new booking and update models Flight left_seats """
 
         diff = db_booking.hard_block + db_booking.soft_block - booking.hard_block - booking.soft_block
-        flight.left_seats += diff
-        if flight.left_seats < 0:
-            raise ValueError('Flight has not enough seats')
-
-        extra_info = ''
-        for key, value in booking.dict().items():
-            if value is not None:
-                # add to extra_info data which is changed
-                if value != getattr(db_booking, key):
-                    extra_info += f"{key}: {getattr(db_booking, key)} -> {value}\n"
-                setattr(db_booking, key, value)
+        if diff:
+            changed = db.execute(FlightOccupancy.change_left_seats(flight.id, diff)).first()
+            if changed is None:
+                raise ValueError('Flight has not enough seats')
+            set_committed_value(flight, 'left_seats', changed.left_seats)
+
+        changes = History.diff("booking", db_booking, booking.dict())
+        db.execute(FlightOccupancy.change(flight.id, booked_seats=-diff))
         db.commit()
+        response_cache.invalidate("bookings")
+        if diff > 0:
+            sale_queues.reopen(flight.id)
 
         # add history
-        print(extra_info)
         History.create(db, user_id=user_id, action='update booking',
-                       extra_info=f'Booking {db_booking.id} updated\n{extra_info}')
+                       extra_info=f'Booking {db_booking.id} updated\n{History.describe(changes)}', changes=changes)
         return db_booking
 
     @staticmethod
@@ -121,12 +129,16 @@ class Booking:
         agent = db_booking['Agent']
         flight = db_booking['Flight']
 
-        agent.balance += booking.price * booking.hard_block
-
-        flight.left_seats += booking.hard_block + booking.soft_block
+        if booking.hard_block:
+            db.execute(Ledger.post(agent.id, booking.price * booking.hard_block, 'bookings', 'booking_refund',
+                                   booking.id))
 
+        db.execute(FlightOccupancy.change_left_seats(flight.id, booking.hard_block + booking.soft_block))
         booking.deleted_at = datetime.now()
+        db.execute(FlightOccupancy.change(flight.id, booked_seats=-(booking.hard_block + booking.soft_block)))
         db.commit()
+        response_cache.invalidate("bookings")
+        sale_queues.reopen(flight.id)
 
         # add history
         History.create(db, user_id=user_id, action='delete booking',
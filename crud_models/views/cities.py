@@ -1,9 +1,11 @@
 from typing import Optional
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from crud_models.views.airports import Airport
 from db import models
+from pages.views.reference import COUNTRY_FIELDS, fragment, page_rows, reference_cache, search_rows
 from crud_models.schemas import cities as schemas
 
 
@@ -25,6 +27,7 @@ class City:
         db.add(db_city)
         db.commit()
         db.refresh(db_city)
+        reference_cache.invalidate("cities")
         return db_city
 
     @staticmethod
@@ -33,6 +36,7 @@ class City:
             if value is not None:
                 setattr(db_city, key, value)
         db.commit()
+        reference_cache.invalidate("cities")
         return db_city
 
     @staticmethod
@@ -41,34 +45,18 @@ class City:
             Airport.delete(db, db_airport)
         db.delete(db_city)
         db.commit()
+        reference_cache.invalidate("cities")
         return db_city
 
     @staticmethod
-    def get_with_countries(db: Session, page: Optional[int] = None, limit: Optional[int] = None,
-                           searching_text: Optional[str] = None):
-        query = f"SELECT c.id, c.city_ru, c.city_en, c.city_uz, c.code as  city_code, \
-                json_build_object( \
-                'id', co.id, \
-                'country_ru', co.country_ru, \
-                'country_en', co.country_en, \
-                'country_uz', co.country_uz, \
-                'code', co.code \
-                ) as country \
-                FROM cities AS c \
-                LEFT JOIN countries AS co ON c.country_id = co.id "\
-
-        if searching_text:
-            searching_text = searching_text.lower()
-            query += f"WHERE (LOWER(c.city_ru) LIKE '%{searching_text}%' \
-                    OR LOWER(c.city_en) LIKE '%{searching_text}%' \
-                    OR LOWER(c.city_uz) LIKE '%{searching_text}%' \
-                    OR LOWER(co.country_ru) LIKE '%{searching_text}%' \
-                    OR LOWER(co.country_en) LIKE '%{searching_text}%' \
-                    OR LOWER(co.country_uz) LIKE '%{searching_text}%')"
-
-        counter = db.execute(query).fetchall()
-
-        if page and limit:
-            query += f" OFFSET {limit * (page - 1)} LIMIT {limit}"
-
-        return db.execute(query).fetchall(), len(counter)
+    async def get_with_countries(db: AsyncSession, page: Optional[int] = None, limit: Optional[int] = None,
+                                 searching_text: Optional[str] = None):
+        """ Cities with their countries from reference data cache """
+        countries = await reference_cache.get(db, "countries")
+        rows = [{"id": city["id"], "city_ru": city["city_ru"], "city_en": city["city_en"], "city_uz": city["city_uz"],
+                 "city_code": city["code"], "country": fragment(countries.get(city["country_id"]), COUNTRY_FIELDS)}
+                for city in await reference_cache.rows(db, "cities")]
+        rows = search_rows(rows, searching_text, lambda row: (
+            row["city_ru"], row["city_en"], row["city_uz"],
+            row["country"]["country_ru"], row["country"]["country_en"], row["country"]["country_uz"]))
+        return page_rows(rows, page, limit)
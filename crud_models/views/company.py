@@ -1,8 +1,10 @@
 from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from db import models
 from crud_models.schemas import company as schemas
+from pages.views.reference import page_rows, reference_cache, search_rows
 
 
 class Company:
@@ -21,6 +23,14 @@ class Company:
             return country.offset(limit * (page - 1)).limit(limit).all(), country.count()
         return country.all(), country.count()
 
+    @staticmethod
+    async def get_companies(db: AsyncSession, page: Optional[int] = None, limit: Optional[int] = None,
+                            search: Optional[str] = None):
+        """ Companies from reference data cache """
+        rows = await reference_cache.rows(db, "companies")
+        rows = search_rows(rows, search, lambda row: (row["name"], row["code"], row["description"]))
+        return page_rows(rows, page, limit)
+
     @staticmethod
     def get_by_id(db: Session, company_id: int):
         return db.query(models.Company).filter(models.Company.id == company_id).first()
@@ -31,4 +41,5 @@ class Company:
         db.add(db_company)
         db.commit()
         db.refresh(db_company)
+        reference_cache.invalidate("companies")
         return db_company
@@ -1,8 +1,10 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from crud_models.views.cities import City
 from db import models
+from pages.views.reference import page_rows, reference_cache, search_rows
 from crud_models.schemas import countries as schemas
 
 
@@ -24,6 +26,7 @@ class Country:
         db.add(db_country)
         db.commit()
         db.refresh(db_country)
+        reference_cache.invalidate("countries")
         return db_country
 
     @staticmethod
@@ -32,6 +35,7 @@ class Country:
             if value is not None:
                 setattr(db_country, key, value)
         db.commit()
+        reference_cache.invalidate("countries")
         return db_country
 
     @staticmethod
@@ -40,21 +44,13 @@ class Country:
             City.delete(db, db_city)
         db.delete(db_country)
         db.commit()
+        reference_cache.invalidate("countries")
         return db_country
 
     @staticmethod
-    def get_countries(db: Session, page: Optional[int] = None, limit: Optional[int] = None,
-                      search: Optional[str] = None):
-        query = f"SELECT * FROM countries AS c "
-        if search:
-            search = search.lower()
-            query += f"WHERE (LOWER(c.country_ru) LIKE '%{search}%' \
-                OR LOWER(c.country_en) LIKE '%{search}%' \
-                OR LOWER(c.country_uz) LIKE '%{search}%') "
-
-        country = db.execute(query).fetchall()
-
-        if page and limit:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
-
-        return db.execute(query).fetchall(), len(country)
\ No newline at end of file
+    async def get_countries(db: AsyncSession, page: Optional[int] = None, limit: Optional[int] = None,
+                            search: Optional[str] = None):
+        """ Countries from reference data cache """
+        rows = await reference_cache.rows(db, "countries")
+        rows = search_rows(rows, search, lambda row: (row["country_ru"], row["country_en"], row["country_uz"]))
+        return page_rows(rows, page, limit)
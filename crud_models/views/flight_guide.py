@@ -1,6 +1,7 @@
 from typing import Optional
 from fastapi import HTTPException, status
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 import logging
@@ -9,6 +10,9 @@ from crud_models.schemas.tickets import TicketCancel
 from crud_models.views.booking import Booking
 from crud_models.views.tickets import Ticket
 from db import models
+from pages.views.pagination import paginate
+from pages.views.query import QueryBuilder
+from pages.views.response_cache import response_cache
 from crud_models.schemas import flight_guide as schemas
 
 
@@ -36,6 +40,7 @@ class FlightGuide:
         db.add(db_flight_guide)
         db.commit()
         db.refresh(db_flight_guide)
+        response_cache.invalidate("flights")
         return db_flight_guide
 
     @staticmethod
@@ -43,6 +48,7 @@ class FlightGuide:
         for key, value in flight_guide.dict(exclude_unset=True).items():
             setattr(db_flight_guide, key, value)
         db.commit()
+        response_cache.invalidate("flights")
         db.refresh(db_flight_guide)
         return db_flight_guide
 
@@ -50,33 +56,24 @@ class FlightGuide:
     def delete(db: Session, db_flight_guide: models.FlightGuide):
         db.delete(db_flight_guide)
         db.commit()
+        response_cache.invalidate("flights")
         return {"message": "Flight guide deleted"}
 
     @staticmethod
-    def get_detail_flight_guide(db: Session, page: Optional[int], limit: Optional[int], search: Optional[str] = None):
-        query = f"SELECT fg.id, fg.flight_number, \
+    async def get_detail_flight_guide(db: AsyncSession, page: Optional[int], limit: Optional[int], search: Optional[str] = None):
+        query = QueryBuilder(
+            select="fg.id, fg.flight_number, \
             json_build_object('id', c.id, 'name', c.name, 'code', c.code, 'description', c.description) as company, \
             json_build_object('id', a1.id, 'name_ru', a1.airport_ru, 'name_en', a1.airport_en, 'name_uz', a1.airport_uz,\
             'code', a1.code) as airport_from, \
             json_build_object('id', a2.id, 'name_ru', a2.airport_ru, 'name_en', a2.airport_en,'name_en', a1.airport_en, \
             'code', a2.code) as airport_to, \
-            fg.luggage, fg.baggage_weight \
-            FROM flight_guides AS fg \
+            fg.luggage, fg.baggage_weight",
+            from_="flight_guides AS fg \
             JOIN companies AS c ON fg.company_id = c.id \
             JOIN airports AS a1 ON fg.from_airport_id = a1.id \
-            JOIN airports AS a2 ON fg.to_airport_id = a2.id "
+            JOIN airports AS a2 ON fg.to_airport_id = a2.id")
 
-        if search:
-            search = search.lower()
-            query += f"WHERE LOWER(fg.flight_number) LIKE '%{search}%' \
-                OR LOWER(c.name) LIKE '%{search}%' \
-                OR LOWER(a1.code) LIKE '%{search}%' \
-                OR LOWER(a2.code) LIKE '%{search}%' "
-
-        counter = db.execute(query).fetchall()
-
-        if page and limit:
-            query += f" OFFSET {limit * (page - 1)} LIMIT {limit}"
-
-        return db.execute(query).fetchall(), len(counter)
+        query.search(["LOWER(fg.flight_number)", "LOWER(c.name)", "LOWER(a1.code)", "LOWER(a2.code)"], search)
 
+        return await paginate(db, query.sql(), page, limit, query.params)
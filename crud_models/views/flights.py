@@ -8,6 +8,9 @@ import logging
 
 from db import models
 from crud_models.schemas import flights as schemas
+from crud_models.views.sale_queue import sale_queues
+from pages.views.calendar import flight_calendar_cache
+from pages.views.response_cache import response_cache
 from users.views.user_history import History
 
 
@@ -75,6 +78,8 @@ class Flight:
         db.add(db_flight)
         db.commit()
         db.refresh(db_flight)
+        flight_calendar_cache.invalidate(db_flight.departure_date)
+        response_cache.invalidate("flights")
 
         # add to user history
         History.create(db,
@@ -86,19 +91,18 @@ class Flight:
 
     @staticmethod
     def update(db: Session, db_flight: models.Flight, flight: schemas.FlightUpdate, user_id: int):
-        extra_info = ""
-        for key, value in flight.dict().items():
-            if value is not None:
-                # add to extra_info data which is changed
-                if value != getattr(db_flight, key):
-                    extra_info += f"{key}: {getattr(db_flight, key)} -> {value}\n"
-                setattr(db_flight, key, value)
+        departure_date = db_flight.departure_date
+        changes = History.diff("flight", db_flight, flight.dict())
         db.commit()
+        flight_calendar_cache.invalidate(departure_date, db_flight.departure_date)
+        response_cache.invalidate("flights")
+        sale_queues.reopen(db_flight.id)
 
         History.create(db,
                        user_id=user_id,
                        action="update flight",
-                       extra_info=f"Flight {db_flight.id} updated:\n{extra_info}")
+                       extra_info=f"Flight {db_flight.id} updated:\n{History.describe(changes)}",
+                       changes=changes)
 
         return db_flight
 
@@ -108,6 +112,9 @@ class Flight:
         try:
             flight.deleted_at = datetime.now()
             db.commit()
+            flight_calendar_cache.invalidate(flight.departure_date)
+            response_cache.invalidate("flights")
+            sale_queues.reopen(flight.id)
 
             # add to user history
             History.create(db, user_id=userid, action="delete flight", extra_info=f"Flight {flight.id} deleted")
@@ -132,6 +139,9 @@ class Flight:
         try:
             db_flight.on_sale = datetime.now()
             db.commit()
+            flight_calendar_cache.invalidate(db_flight.departure_date)
+            response_cache.invalidate("flights")
+            sale_queues.reopen(db_flight.id)
             return {"message": "Flight on sale now"}
         except Exception as e:
             print(logging.error(e))
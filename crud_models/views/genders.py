@@ -4,6 +4,7 @@ from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from db import models
+from pages.views.reference import reference_cache
 from crud_models.schemas import genders as schemas
 
 
@@ -24,6 +25,7 @@ class Gender:
         db.add(db_gender)
         db.commit()
         db.refresh(db_gender)
+        reference_cache.invalidate("genders")
         return db_gender
 
     @staticmethod
@@ -32,6 +34,7 @@ class Gender:
             if value is not None:
                 setattr(db_gender, key, value)
         db.commit()
+        reference_cache.invalidate("genders")
         return db_gender
 
     @staticmethod
@@ -42,6 +45,7 @@ class Gender:
                 raise ValueError('Gender not found')
             db.delete(db_gender)
             db.commit()
+            reference_cache.invalidate("genders")
             return {"message": "Gender deleted successfully"}
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
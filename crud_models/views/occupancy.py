@@ -0,0 +1,80 @@
+# Per flight occupancy summary: booked seats of active bookings, sold tickets and their revenue
+# rebuild from bookings and tickets: python -m crud_models.views.occupancy [flight_id]
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db import models
+
+REBUILD = """
+    INSERT INTO flight_occupancy (flight_id, booked_seats, tickets_count, revenue, updated_at)
+    SELECT f.id, COALESCE(b.booked_seats, 0), COALESCE(t.tickets_count, 0), COALESCE(t.revenue, 0), now()
+    FROM flights AS f
+    LEFT JOIN (
+        SELECT flight_id, SUM(hard_block + soft_block) AS booked_seats
+        FROM bookings WHERE deleted_at IS NULL GROUP BY flight_id
+    ) AS b ON b.flight_id = f.id
+    LEFT JOIN (
+        SELECT flight_id, COUNT(*) AS tickets_count, SUM(price) AS revenue
+        FROM tickets WHERE deleted_at IS NULL GROUP BY flight_id
+    ) AS t ON t.flight_id = f.id
+    {where}
+    ON CONFLICT (flight_id) DO UPDATE SET
+        booked_seats = excluded.booked_seats,
+        tickets_count = excluded.tickets_count,
+        revenue = excluded.revenue,
+        updated_at = excluded.updated_at
+"""
+
+
+class FlightOccupancy:
+    @staticmethod
+    def change(flight_id: int, booked_seats: int = 0, tickets_count: int = 0, revenue: int = 0):
+        """
+        Statement adding deltas to occupancy of flight, execute it in transaction of the change itself.
+        Row of flight is created by first change
+        """
+        table = models.FlightOccupancy.__table__
+        statement = insert(table).values(flight_id=flight_id, booked_seats=booked_seats, tickets_count=tickets_count,
+                                         revenue=revenue, updated_at=datetime.now())
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.flight_id],
+            set_={
+                "booked_seats": table.c.booked_seats + statement.excluded.booked_seats,
+                "tickets_count": table.c.tickets_count + statement.excluded.tickets_count,
+                "revenue": table.c.revenue + statement.excluded.revenue,
+                "updated_at": statement.excluded.updated_at,
+            })
+
+    @staticmethod
+    def change_left_seats(flight_id: int, seats: int):
+        """
+        Statement adding seats to left seats of flight in database, not to value loaded in Python, so concurrent
+        sales are not overwritten. Seats are taken only if flight has them, nothing is returned otherwise
+        """
+        query = update(models.Flight).where(models.Flight.id == flight_id)
+        if seats < 0:
+            query = query.where(models.Flight.left_seats >= -seats)
+        return query.values(left_seats=models.Flight.left_seats + seats).returning(models.Flight.left_seats). \
+            execution_options(synchronize_session=False)
+
+    @staticmethod
+    def rebuild(db: Session, flight_id: Optional[int] = None):
+        """ Recount occupancy of all flights or of one flight from bookings and tickets """
+        if flight_id is None:
+            db.execute(text(REBUILD.format(where="")))
+        else:
+            db.execute(text(REBUILD.format(where="WHERE f.id = :flight_id")), {"flight_id": flight_id})
+        db.commit()
+
+
+if __name__ == "__main__":
+    from db.database import SessionLocal
+
+    with SessionLocal() as session:
+        FlightOccupancy.rebuild(session, int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print("flight occupancy rebuilt")
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 
 from db import models
 from crud_models.schemas import refills as schemas
+from users.views.ledger import Ledger
 
 
 class Refill:
@@ -24,11 +25,9 @@ class Refill:
     @staticmethod
     def create(db: Session, refill: schemas.RefillCreate):
         db_refill = models.Refill(**refill.dict())
-
-        agent = db.query(models.Agent).filter(models.Agent.id == refill.agent_id).first()
-        agent.balance += refill.amount
-
         db.add(db_refill)
+        db.flush()
+        db.execute(Ledger.post(refill.agent_id, refill.amount, 'cash', 'refill', db_refill.id))
         db.commit()
         db.refresh(db_refill)
         return db_refill
@@ -42,7 +41,8 @@ class Refill:
         refill_db = db_refill['Refill']
         agent = db_refill['Agent']
 
-        agent.balance += refill.amount - refill_db.amount
+        if refill.amount is not None and refill.amount != refill_db.amount:
+            db.execute(Ledger.post(agent.id, refill.amount - refill_db.amount, 'cash', 'refill_update', refill_db.id))
 
         for key, value in refill.dict().items():
             if value is not None:
@@ -60,7 +60,7 @@ class Refill:
         db_refill = refill_db['Refill']
         agent = refill_db['Agent']
 
-        agent.balance -= db_refill.amount
+        db.execute(Ledger.post(agent.id, -db_refill.amount, 'cash', 'refill_delete', db_refill.id))
 
         db_refill.deleted_at = datetime.now()
         db.commit()
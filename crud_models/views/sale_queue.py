@@ -0,0 +1,198 @@
+# Burst mode of sale start: sales of a flight which has just opened go through one queue per flight and process.
+# Queue sells waiting tickets in batches with one commit, flight and fares are read once per batch,
+# and sold out flight is rejected from memory or shared cache without database
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from crud_models.schemas import tickets as schemas
+from crud_models.views.ticket_sale import TicketSale
+from db import models
+from db.cache import cache, run_in_background
+from db.database import AsyncSessionLocal
+from pages.views.response_cache import response_cache
+
+BURST_WINDOW = timedelta(seconds=int(os.getenv('sale_burst_window', 900)))
+SOLD_OUT_KEY = "sold_out:{}"
+SOLD_OUT_TTL = 5
+
+
+class SaleRequest:
+    __slots__ = ("ticket", "user_id", "future")
+
+    def __init__(self, ticket: schemas.TicketCreate, user_id: int):
+        self.ticket = ticket
+        self.user_id = user_id
+        self.future = asyncio.get_running_loop().create_future()
+
+    # future of client which went away is cancelled, it must not be resolved again
+    def resolve(self, db_ticket: models.Ticket):
+        if not self.future.done():
+            self.future.set_result(db_ticket)
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class FlightSaleQueue:
+    """ Serializes sales of one flight in this process, waiting sales are sold together with savepoint per ticket """
+
+    def __init__(self, flight_id: int, queues: "SaleQueues", batch_size: int = 50, window: float = 0.005,
+                 idle_timeout: float = 30.0):
+        self.flight_id = flight_id
+        self.queues = queues
+        self.batch_size = batch_size
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self.pending: "asyncio.Queue[SaleRequest]" = asyncio.Queue()
+        self.task = asyncio.create_task(self.run())
+
+    async def sell(self, ticket: schemas.TicketCreate, user_id: int) -> models.Ticket:
+        request = SaleRequest(ticket, user_id)
+        await self.pending.put(request)
+        return await request.future
+
+    async def next_batch(self) -> List[SaleRequest]:
+        batch = [await asyncio.wait_for(self.pending.get(), self.idle_timeout)]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    batch = await self.next_batch()
+                except asyncio.TimeoutError:
+                    break
+                try:
+                    await self.sell_batch(batch)
+                except Exception as e:
+                    # one bad request must not stop queue, requests of batch without result get error
+                    print(logging.error(e))
+                    for request in batch:
+                        request.fail(e)
+        finally:
+            self.queues.remove(self)
+            # sales which came after last batch was taken
+            while not self.pending.empty():
+                self.pending.get_nowait().fail(ValueError('Sale queue is closed, try again'))
+
+    async def sell_batch(self, batch: List[SaleRequest]):
+        sold = []
+        try:
+            async with self.queues.session_factory() as db:
+                db_flight = await db.get(models.Flight, self.flight_id)
+                fares = {}
+                for request in batch:
+                    if request.future.done():
+                        # client went away before its turn, nothing is sold to it
+                        continue
+                    if self.queues.is_sold_out_locally(self.flight_id):
+                        request.fail(ValueError('Flight has not enough seats'))
+                        continue
+                    try:
+                        async with db.begin_nested():
+                            agent_id = request.ticket.agent_id
+                            if agent_id not in fares:
+                                fares[agent_id] = await TicketSale.get_fare(db, agent_id, db_flight)
+                            sold.append((request, await TicketSale.place(db, request.ticket, db_flight,
+                                                                         request.user_id, fare=fares[agent_id])))
+                    except ValueError as e:
+                        request.fail(e)
+                    if db_flight.left_seats <= 0:
+                        # the rest of batch and next sales are rejected without charging agents
+                        self.queues.mark_sold_out(self.flight_id)
+                await db.commit()
+        except Exception as e:
+            print(logging.error(e))
+            for request in batch:
+                request.fail(e)
+            return
+
+        if sold:
+            response_cache.invalidate("tickets")
+        for request, db_ticket in sold:
+            request.resolve(db_ticket)
+
+
+class SaleQueues:
+    """ Queues of flights in burst mode and sold out flags, flags are shared with other workers through cache """
+
+    def __init__(self, burst_window: timedelta = BURST_WINDOW, flight_ttl: float = 30.0,
+                 session_factory=AsyncSessionLocal):
+        self.burst_window = burst_window
+        self.flight_ttl = flight_ttl
+        self.session_factory = session_factory
+        self.queues: Dict[int, FlightSaleQueue] = {}
+        self.flights: Dict[int, tuple] = {}
+        self.sold_out: Dict[int, float] = {}
+
+    def remove(self, queue: FlightSaleQueue):
+        if self.queues.get(queue.flight_id) is queue:
+            del self.queues[queue.flight_id]
+
+    def is_sold_out_locally(self, flight_id: int) -> bool:
+        expires_at = self.sold_out.get(flight_id)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    async def is_sold_out(self, flight_id: int) -> bool:
+        """ True if this or other worker found flight without seats within last SOLD_OUT_TTL seconds """
+        if self.is_sold_out_locally(flight_id):
+            return True
+        try:
+            return await cache.get(SOLD_OUT_KEY.format(flight_id)) is not None
+        except Exception as e:
+            print(logging.error(e))
+            return False
+
+    def mark_sold_out(self, flight_id: int):
+        self.sold_out[flight_id] = time.monotonic() + SOLD_OUT_TTL
+        run_in_background(cache.set(SOLD_OUT_KEY.format(flight_id), 1, ex=SOLD_OUT_TTL))
+
+    def reopen(self, flight_id: int):
+        """ Seats or sale of flight changed (cancel, released hold or booking, flight update), swept holds wait TTL """
+        self.sold_out.pop(flight_id, None)
+        self.flights.pop(flight_id, None)
+        run_in_background(cache.delete(SOLD_OUT_KEY.format(flight_id)))
+
+    async def flight_sale(self, db, flight_id: int) -> Optional[tuple]:
+        """ on_sale and departure_date of flight which is not deleted, read once per flight_ttl """
+        cached = self.flights.get(flight_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        row = (await db.execute(select(models.Flight.on_sale, models.Flight.departure_date).filter(
+            models.Flight.id == flight_id, models.Flight.deleted_at.is_(None)))).first()
+        sale = tuple(row) if row is not None else None
+        self.flights[flight_id] = (time.monotonic() + self.flight_ttl, sale)
+        return sale
+
+    async def burst_queue(self, db, flight_id: int) -> Optional[FlightSaleQueue]:
+        """ Queue of flight if its sale opened within burst window, None if ticket goes usual way """
+        sale = await self.flight_sale(db, flight_id)
+        if sale is None or sale[0] is None:
+            return None
+        on_sale, departure_date = sale
+        now = datetime.now()
+        if not (on_sale <= now < on_sale + self.burst_window) or departure_date < now:
+            return None
+        queue = self.queues.get(flight_id)
+        if queue is None:
+            queue = self.queues[flight_id] = FlightSaleQueue(flight_id, self)
+        return queue
+
+
+sale_queues = SaleQueues()
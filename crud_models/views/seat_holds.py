@@ -0,0 +1,166 @@
+# Seat holds: seats are taken from flight left_seats for a short time and either sold as tickets or given back.
+# Every change is a conditional UPDATE/DELETE in database, so holds are safe with any number of workers
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+from db.database import AsyncSessionLocal
+from pages.views.response_cache import response_cache
+
+HOLD_TTL = 300
+
+# expired holds are deleted in batches, rows locked by sale which converts them are skipped
+RELEASE_EXPIRED = """
+    WITH expired AS (
+        DELETE FROM seat_holds WHERE id IN (
+            SELECT id FROM seat_holds WHERE expires_at <= :now ORDER BY expires_at LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING flight_id, seats
+    ), released AS (
+        SELECT flight_id, SUM(seats) AS seats, COUNT(*) AS holds FROM expired GROUP BY flight_id
+    ), returned AS (
+        UPDATE flights AS f SET left_seats = f.left_seats + r.seats FROM released AS r WHERE f.id = r.flight_id
+        RETURNING r.holds
+    )
+    SELECT COALESCE(SUM(holds), 0)::int FROM returned
+"""
+
+
+class SeatHold:
+    @staticmethod
+    async def hold(db: AsyncSession, flight_id: int, agent_id: int, seats: int = 1, ttl: int = HOLD_TTL):
+        """ Take seats from flight on sale and keep them for agent for ttl seconds, all or none of them """
+        now = datetime.now()
+        try:
+            taken = (await db.execute(
+                update(models.Flight).
+                where(models.Flight.id == flight_id,
+                      models.Flight.deleted_at.is_(None),
+                      models.Flight.on_sale <= now,
+                      models.Flight.departure_date > now,
+                      models.Flight.left_seats >= seats).
+                values(left_seats=models.Flight.left_seats - seats).
+                returning(models.Flight.left_seats).
+                execution_options(synchronize_session=False))).first()
+            if taken is None:
+                raise ValueError('Flight has not enough seats')
+
+            db_hold = (await db.execute(
+                insert(models.SeatHold).
+                values(flight_id=flight_id, agent_id=agent_id, seats=seats, expires_at=now + timedelta(seconds=ttl),
+                       created_at=now).
+                returning(models.SeatHold.id, models.SeatHold.flight_id, models.SeatHold.agent_id,
+                          models.SeatHold.seats, models.SeatHold.expires_at))).first()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        response_cache.invalidate("tickets")
+        return dict(db_hold._mapping)
+
+    @staticmethod
+    async def take(db: AsyncSession, hold_id: int, flight_id: int, agent_id: int, seats: int = 1):
+        """
+        Take seats from agent hold in transaction of sale, fails if hold is expired, swept or has less seats.
+        Hold row stays locked until sale commits, so sweeper skips it
+        """
+        taken = (await db.execute(
+            update(models.SeatHold).
+            where(models.SeatHold.id == hold_id,
+                  models.SeatHold.flight_id == flight_id,
+                  models.SeatHold.agent_id == agent_id,
+                  models.SeatHold.expires_at > datetime.now(),
+                  models.SeatHold.seats >= seats).
+            values(seats=models.SeatHold.seats - seats).
+            returning(models.SeatHold.seats).
+            execution_options(synchronize_session=False))).first()
+        if taken is None:
+            raise ValueError('Seat hold is expired or has not enough seats')
+        if taken.seats == 0:
+            await db.execute(delete(models.SeatHold).where(models.SeatHold.id == hold_id).
+                             execution_options(synchronize_session=False))
+
+    @staticmethod
+    async def agent_id_of(db: AsyncSession, user_id: int) -> Optional[int]:
+        """ Agent of user, None if user is not agent """
+        return (await db.execute(
+            select(models.Agent.id).
+            where(models.Agent.user_id == user_id, models.Agent.deleted_at.is_(None)))).scalar()
+
+    @staticmethod
+    async def release(db: AsyncSession, hold_id: int, agent_id: Optional[int] = None):
+        """
+        Give seats of hold back to flight, only hold of agent_id if it is given.
+        Returns flight id and released seats, None if hold does not exist or belongs to other agent
+        """
+        query = delete(models.SeatHold).where(models.SeatHold.id == hold_id)
+        if agent_id is not None:
+            query = query.where(models.SeatHold.agent_id == agent_id)
+        try:
+            released = (await db.execute(
+                query.returning(models.SeatHold.flight_id, models.SeatHold.seats).
+                execution_options(synchronize_session=False))).first()
+            if released is None:
+                return None
+            await db.execute(
+                update(models.Flight).
+                where(models.Flight.id == released.flight_id).
+                values(left_seats=models.Flight.left_seats + released.seats).
+                execution_options(synchronize_session=False))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        response_cache.invalidate("tickets")
+        return released
+
+    @staticmethod
+    async def release_expired(db: AsyncSession, batch: int = 500) -> int:
+        """ Delete expired holds and give their seats back to flights, returns number of released holds """
+        released = 0
+        while True:
+            holds = (await db.execute(text(RELEASE_EXPIRED), {"now": datetime.now(), "batch": batch})).scalar()
+            await db.commit()
+            released += holds
+            if holds < batch:
+                break
+        if released:
+            response_cache.invalidate("tickets")
+        return released
+
+
+class SeatHoldSweeper:
+    """ Background task which releases expired holds, each worker runs one, SKIP LOCKED keeps them apart """
+
+    def __init__(self, interval: int = 5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await SeatHold.release_expired(db)
+            except Exception as e:
+                print(logging.error(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+seat_hold_sweeper = SeatHoldSweeper()
@@ -3,6 +3,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from db import models
+from pages.views.reference import reference_cache
 from crud_models.schemas import ticket_classes as schemas
 
 
@@ -25,6 +26,7 @@ class TicketClass:
         db.add(db_ticket_class)
         db.commit()
         db.refresh(db_ticket_class)
+        reference_cache.invalidate("ticket_classes")
         return db_ticket_class
 
     @staticmethod
@@ -35,10 +37,12 @@ class TicketClass:
             if value is not None:
                 setattr(db_ticket_class, key, value)
         db.commit()
+        reference_cache.invalidate("ticket_classes")
         return db_ticket_class
 
     @staticmethod
     def delete(db: Session, db_ticket_class: models.TicketClass):
         db.delete(db_ticket_class)
         db.commit()
+        reference_cache.invalidate("ticket_classes")
         return {"message": "Ticket class deleted successfully"}
@@ -0,0 +1,202 @@
+# Sell ticket in one transaction, counters are decremented by conditional UPDATE in database so concurrent
+# sales can not oversell flight or quotas and can not overdraw agent balance
+import random
+from typing import List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from crud_models.schemas import tickets as schemas
+from crud_models.views.occupancy import FlightOccupancy
+from crud_models.views.seat_holds import SeatHold
+from db import models
+from pages.views.response_cache import response_cache
+from users.views.ledger import Ledger
+from users.views.user_history import History
+
+# largest group sold by sell_many, rows of agent, flight or booking stay locked for whole group
+MAX_GROUP_SIZE = 50
+
+
+class TicketSale:
+    @staticmethod
+    async def get_fare(db: AsyncSession, agent_id: int, db_flight: models.Flight, hard: bool = False,
+                       soft: bool = False):
+        """ Price for agent with him discount and booking price if hard. Returns price, luggage price and booking id """
+        query = select(models.Discount.amount, models.FlightGuide.luggage). \
+            select_from(models.Agent). \
+            join(models.Discount, models.Agent.discount_id == models.Discount.id). \
+            join(models.FlightGuide, models.FlightGuide.id == db_flight.flight_guide_id). \
+            filter(models.Agent.id == agent_id)
+        if hard or soft:
+            query = query.add_columns(models.Booking.id, models.Booking.price). \
+                join(models.Booking, models.Agent.id == models.Booking.agent_id). \
+                filter(models.Booking.flight_id == db_flight.id)
+
+        row = (await db.execute(query)).first()
+        if row is None:
+            raise ValueError('Agent not found' if not (hard or soft) else 'Agent does not have any quotas')
+
+        discount, luggage = row[0], row[1]
+        booking_id, booking_price = (row[2], row[3]) if hard or soft else (None, None)
+
+        price = db_flight.price - discount if discount is not None else db_flight.price
+        if hard:
+            price -= db_flight.price - booking_price
+        return price, luggage, booking_id
+
+    @staticmethod
+    async def get_price(db: AsyncSession, ticket: schemas.TicketCreate, db_flight: models.Flight, hard: bool = False,
+                        soft: bool = False):
+        """ Ticket price for agent with him discount, booking price if hard, luggage. Returns price and booking id """
+        price, luggage, booking_id = await TicketSale.get_fare(db, ticket.agent_id, db_flight, hard, soft)
+        if ticket.luggage:
+            price += luggage
+        return price, booking_id
+
+    @staticmethod
+    async def take_balance(db: AsyncSession, agent_id: int, price: int) -> int:
+        """ Charge agent, agent which is not on credit can not go below zero. Returns balance after charge """
+        charged = (await db.execute(Ledger.move(agent_id, -price, require_funds=True))).first()
+        if charged is None:
+            raise ValueError('Agent has not enough balance')
+        return charged.balance
+
+    @staticmethod
+    async def take_seat(db: AsyncSession, db_flight: models.Flight, booking_id: Optional[int], hard: bool = False,
+                        soft: bool = False, seats: int = 1, hold_id: Optional[int] = None,
+                        agent_id: Optional[int] = None):
+        """
+        Take seats from agent quota if hard or soft, from agent seat hold if hold_id is given,
+        otherwise from flight left seats, all or none of them
+        """
+        if hold_id is not None:
+            if hard or soft:
+                raise ValueError('Seat hold can not be used with hard or soft block')
+            await SeatHold.take(db, hold_id, db_flight.id, agent_id, seats)
+            return
+
+        if hard or soft:
+            column = models.Booking.hard_block if hard else models.Booking.soft_block
+            taken = await db.execute(
+                update(models.Booking).
+                where(models.Booking.id == booking_id, column >= seats).
+                values({column.key: column - seats}).
+                returning(column).
+                execution_options(synchronize_session=False))
+            if taken.first() is None:
+                raise ValueError(f'Agent has not enough {"hard" if hard else "soft"} block')
+            return
+
+        taken = (await db.execute(
+            update(models.Flight).
+            where(models.Flight.id == db_flight.id, models.Flight.left_seats >= seats).
+            values(left_seats=models.Flight.left_seats - seats).
+            returning(models.Flight.left_seats).
+            execution_options(synchronize_session=False))).first()
+        if taken is None:
+            raise ValueError('Flight has not enough seats')
+        # keep loaded flight in line with database without marking it dirty
+        set_committed_value(db_flight, 'left_seats', taken.left_seats)
+
+    @staticmethod
+    async def place(db: AsyncSession, ticket: schemas.TicketCreate, db_flight: models.Flight, user_id: int,
+                    hard: bool = False, soft: bool = False, hold_id: Optional[int] = None,
+                    fare: Optional[tuple] = None) -> models.Ticket:
+        """
+        Charge agent, take seat, add ticket, agent debt, ledger entry and history to transaction of db without commit.
+        fare is result of get_fare if caller already has it
+        """
+        if fare is None:
+            fare = await TicketSale.get_fare(db, ticket.agent_id, db_flight, hard, soft)
+        price, luggage, booking_id = fare
+        if ticket.luggage:
+            price += luggage
+        balance = await TicketSale.take_balance(db, ticket.agent_id, price)
+        await TicketSale.take_seat(db, db_flight, booking_id, hard, soft, hold_id=hold_id, agent_id=ticket.agent_id)
+
+        db_ticket = models.Ticket(**ticket.dict())
+        db_ticket.is_booked = hard or soft
+        db_ticket.price = price
+        db_ticket.ticket_number = "WZ " + str(random.randint(10000000, 99999999))
+        db.add(db_ticket)
+        await db.flush()
+
+        db.add(models.AgentDebt(agent_id=db_ticket.agent_id, flight_id=db_flight.id, ticket_id=db_ticket.id,
+                                amount=db_ticket.price, type='purchase'))
+        await db.execute(Ledger.insert(), [Ledger.entry(db_ticket.agent_id, -price, balance, 'sales', 'ticket_sale',
+                                                        db_ticket.id)])
+        History.add(db, user_id=user_id, action="create ticket", extra_info=f'Ticket {db_ticket.id} created')
+        await db.execute(FlightOccupancy.change(db_flight.id, booked_seats=-1 if hard or soft else 0,
+                                                tickets_count=1, revenue=price))
+        return db_ticket
+
+    @staticmethod
+    async def sell(db: AsyncSession, ticket: schemas.TicketCreate, db_flight: models.Flight, user_id: int,
+                   hard: bool = False, soft: bool = False, hold_id: Optional[int] = None) -> models.Ticket:
+        """
+        Charge agent, take seat, create ticket, agent debt and history with one commit.
+        Rows of agent and then flight or booking stay locked by UPDATE until commit, any error rolls back all of it
+        """
+        try:
+            db_ticket = await TicketSale.place(db, ticket, db_flight, user_id, hard, soft, hold_id)
+            await db.commit()
+            response_cache.invalidate("tickets")
+        except Exception:
+            await db.rollback()
+            raise
+        return db_ticket
+
+    @staticmethod
+    def new_ticket_number(taken: set) -> str:
+        while True:
+            ticket_number = "WZ " + str(random.randint(10000000, 99999999))
+            if ticket_number not in taken:
+                taken.add(ticket_number)
+                return ticket_number
+
+    @staticmethod
+    async def sell_many(db: AsyncSession, tickets: List[schemas.TicketCreate], db_flight: models.Flight, user_id: int,
+                        hard: bool = False, soft: bool = False, hold_id: Optional[int] = None) -> List[dict]:
+        """
+        Sell tickets of one agent for one flight: fare is read once, agent is charged for all tickets and seats are
+        taken by one UPDATE each, tickets, agent debts and history are inserted in bulk and committed once.
+        Either all tickets are sold or none. Returns result of each passenger in order of tickets
+        """
+        agent_id = tickets[0].agent_id
+        try:
+            fare, luggage, booking_id = await TicketSale.get_fare(db, agent_id, db_flight, hard, soft)
+            prices = [fare + luggage if ticket.luggage else fare for ticket in tickets]
+            balance = await TicketSale.take_balance(db, agent_id, sum(prices))
+            await TicketSale.take_seat(db, db_flight, booking_id, hard, soft, seats=len(tickets), hold_id=hold_id,
+                                       agent_id=agent_id)
+
+            numbers = set()
+            rows = [{**ticket.dict(), "price": price, "is_booked": hard or soft,
+                     "ticket_number": TicketSale.new_ticket_number(numbers)}
+                    for ticket, price in zip(tickets, prices)]
+            inserted = await db.execute(
+                insert(models.Ticket).values(rows).returning(models.Ticket.id, models.Ticket.ticket_number))
+            ticket_ids = {row.ticket_number: row.id for row in inserted}
+
+            results = [{"first_name": row["first_name"], "surname": row["surname"], "passport": row["passport"],
+                        "ticket_id": ticket_ids[row["ticket_number"]], "ticket_number": row["ticket_number"],
+                        "price": row["price"]} for row in rows]
+            await db.execute(insert(models.AgentDebt), [
+                {"agent_id": agent_id, "flight_id": db_flight.id, "ticket_id": result["ticket_id"],
+                 "amount": result["price"], "type": "purchase"} for result in results])
+            await db.execute(Ledger.insert(), Ledger.entries(
+                agent_id, balance, [-result["price"] for result in results], "sales", "ticket_sale",
+                [result["ticket_id"] for result in results]))
+            await db.execute(insert(models.UserHistory), [
+                {"user_id": user_id, "action": "create ticket", "extra_info": f'Ticket {result["ticket_id"]} created'}
+                for result in results])
+            await db.execute(FlightOccupancy.change(db_flight.id, booked_seats=-len(tickets) if hard or soft else 0,
+                                                    tickets_count=len(tickets), revenue=sum(prices)))
+            await db.commit()
+            response_cache.invalidate("tickets")
+        except Exception:
+            await db.rollback()
+            raise
+        return results
@@ -1,40 +1,44 @@
 import logging
-import random
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import models
 from crud_models.schemas import tickets as schemas
+from crud_models.views.occupancy import FlightOccupancy
+from crud_models.views.sale_queue import FlightSaleQueue, sale_queues
+from crud_models.views.ticket_sale import TicketSale
+from pages.views.response_cache import response_cache
 from datetime import datetime
 
+from users.views.ledger import Ledger
 from users.views.user_history import History
 
 
 class Ticket:
     @staticmethod
-    def get_list(db: Session, page: Optional[int], limit: Optional[int]):
+    async def get_list(db: AsyncSession, page: Optional[int], limit: Optional[int]):
 
-        query = db.query(models.Ticket). \
+        query = select(models.Ticket). \
             filter(
             models.Ticket.deleted_at == None,
             models.Flight.id == models.Ticket.flight_id,
             models.Flight.deleted_at == None,
             models.Flight.departure_date >= datetime.now())
         if page and limit:
-            return query.offset(limit * (page - 1)).limit(limit).all()
-        return query.all()
+            query = query.offset(limit * (page - 1)).limit(limit)
+        return (await db.execute(query)).scalars().all()
 
     @staticmethod
-    def get_by_id(db: Session, ticket_id: int):
-        return db.query(models.Ticket).filter(models.Ticket.id == ticket_id).first()
+    async def get_by_id(db: AsyncSession, ticket_id: int):
+        return (await db.execute(select(models.Ticket).filter(models.Ticket.id == ticket_id))).scalars().first()
 
     @staticmethod
-    def get_details_by_id(db: Session, ticket_id: int):
-        query = db.execute(
-            f"SELECT \
+    async def get_details_by_id(db: AsyncSession, ticket_id: int):
+        query = await db.execute(text(
+            "SELECT \
                         t.id, t.ticket_number, t.first_name, t.surname, t.middle_name, \
                         t.passport, t.passport_expires, t.dob, t.price, t.is_booked, t.comment, \
                         t.agent_id, t.luggage, \
@@ -87,97 +91,17 @@ class Ticket:
                     LEFT JOIN airports a2 on fg.to_airport_id = a2.id \
                     LEFT JOIN cities c1 on a1.city_id = c1.id \
                     LEFT JOIN cities c2 on a2.city_id = c2.id \
-                    WHERE t.id = {ticket_id} "
-        )
+                    WHERE t.id = :ticket_id "
+        ), {"ticket_id": ticket_id})
 
         return query.first()
 
     @staticmethod
-    def create(db: Session, ticket: schemas.TicketCreate, db_flight: models.Flight, user_id: int, hard: bool = False,
-               soft: bool = False):
+    async def create(db: AsyncSession, ticket: schemas.TicketCreate, db_flight: models.Flight, user_id: int,
+                     hard: bool = False, soft: bool = False, hold_id: Optional[int] = None):
         """ get from flight agent and him discount calculate price and create ticket than create agent debt history"""
         try:
-            if hard or soft:
-                query = db.query(models.Agent, models.Discount, models.Booking, models.FlightGuide). \
-                    join(models.Discount, models.Agent.discount_id == models.Discount.id). \
-                    join(models.Booking, models.Agent.id == models.Booking.agent_id). \
-                    join(models.FlightGuide, models.FlightGuide.id == db_flight.flight_guide_id). \
-                    filter(models.Agent.id == ticket.agent_id,
-                           models.Discount.id == models.Agent.discount_id,
-                           models.FlightGuide.id == db_flight.flight_guide_id,
-                           and_(models.Booking.agent_id == ticket.agent_id,
-                                models.Booking.flight_id == db_flight.id)).first()
-            else:
-                query = db.query(models.Agent, models.Discount, models.FlightGuide). \
-                    join(models.Discount, models.Agent.discount_id == models.Discount.id). \
-                    join(models.FlightGuide, models.FlightGuide.id == db_flight.flight_guide_id). \
-                    filter(models.Agent.id == ticket.agent_id,
-                           models.Discount.id == models.Agent.discount_id).first()
-
-            agent, discount, booking, flight_guide = models.Agent(), models.Discount(), models.Booking(), \
-                models.FlightGuide()
-
-            if hard or soft:
-                agent, discount, booking, flight_guide = query
-            else:
-                agent, discount, flight_guide = query["Agent"], query["Discount"], query["FlightGuide"]
-
-            if agent is None:
-                raise ValueError('Agent not found')
-
-            if discount.amount is not None:
-                price = db_flight.price - discount.amount
-            else:
-                price = db_flight.price
-
-            if hard:
-                price -= db_flight.price - booking.price
-
-            if ticket.luggage:
-                price += flight_guide.luggage
-
-            if not agent.is_on_credit:
-                if agent.balance - price < 0:
-                    raise ValueError('Agent has not enough balance')
-                else:
-                    agent.balance -= price
-            else:
-                agent.balance -= price
-
-            if hard or soft:
-                if hard:
-                    if booking.hard_block - 1 < 0:
-                        raise ValueError('Agent has not enough hard block')
-                    booking.hard_block -= 1
-                if soft:
-                    if booking.soft_block - 1 < 0:
-                        raise ValueError('Agent has not enough soft block')
-                    booking.soft_block -= 1
-            else:
-                if db_flight.left_seats - 1 < 0:
-                    raise ValueError('Flight has not enough seats')
-                db_flight.left_seats -= 1
-
-            db_ticket = models.Ticket(**ticket.dict())
-            if hard or soft:
-                db_ticket.is_booked = True
-            db_ticket.price = price
-            db_ticket.ticket_number = "WZ " + str(random.randint(10000000, 99999999))
-            db_ticket.actor_id = user_id
-            db.add(db_ticket)
-            db.commit()
-            db.refresh(db_ticket)
-
-            db_agent_debt = models.AgentDebt(agent_id=db_ticket.agent_id, flight_id=db_flight.id,
-                                             ticket_id=db_ticket.id,
-                                             amount=db_ticket.price, type='purchase')
-            db.add(db_agent_debt)
-            db.commit()
-            db.refresh(db_agent_debt)
-
-            # add to history this ticket
-            History.create(db, user_id=user_id, action="create ticket", extra_info=f'Ticket {db_ticket.id} created')
-
+            await TicketSale.sell(db, ticket, db_flight, user_id, hard, soft, hold_id)
             return {"message": "Ticket created successfully"}
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
@@ -186,47 +110,76 @@ class Ticket:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket has trouble creating")
 
     @staticmethod
-    def cancel(db: Session, ticket_cancel: schemas.TicketCancel, user_id: int):
-        db_ticket = db.query(
-            models.Ticket, models.Agent, models.Flight). \
-            filter(
-            models.Ticket.id == ticket_cancel.ticket_id,
-            models.Agent.id == models.Ticket.agent_id,
-            models.Flight.id == models.Ticket.flight_id).first()
-
-        ticket = db_ticket['Ticket']
-        agent = db_ticket['Agent']
-        flight = db_ticket['Flight']
-
-        ticket.deleted_at = datetime.now()
-        ticket.status_id = 3
-        agent.balance -= ticket_cancel.fine
-        agent.balance += ticket.price
-        flight.left_seats += 1
-
-        db.commit()
+    async def create_queued(queue: FlightSaleQueue, ticket: schemas.TicketCreate, user_id: int):
+        """ create ticket through sale queue of flight which sale has just started """
+        try:
+            await queue.sell(ticket, user_id)
+            return {"message": "Ticket created successfully"}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print(logging.error(e))
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket has trouble creating")
 
-        db_agent_debt = models.AgentDebt(agent_id=agent.id, flight_id=flight.id, ticket_id=ticket.id,
-                                         amount=ticket_cancel.fine, type='fine', comment=ticket_cancel.comment)
-        db.add(db_agent_debt)
-        db.commit()
-        db.refresh(db_agent_debt)
+    @staticmethod
+    async def create_bulk(db: AsyncSession, tickets: List[schemas.TicketCreate], db_flight: models.Flight, user_id: int,
+                          hard: bool = False, soft: bool = False, hold_id: Optional[int] = None):
+        """ create tickets of group in one transaction, all of them or none """
+        try:
+            return await TicketSale.sell_many(db, tickets, db_flight, user_id, hard, soft, hold_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print(logging.error(e))
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tickets have trouble creating")
 
-        # add to history this ticket
-        History.create(db, user_id=user_id, action="cancel ticket", extra_info=f'Ticket {ticket.id} canceled')
+    @staticmethod
+    async def cancel(db: AsyncSession, ticket_cancel: schemas.TicketCancel, user_id: int):
+        """
+        Cancel ticket, refund its price and charge fine in one transaction. Ticket is claimed by conditional UPDATE,
+        so concurrent cancels of the same ticket refund it once and the other one gets 'Ticket not found'
+        """
+        try:
+            claimed = (await db.execute(
+                update(models.Ticket).
+                where(models.Ticket.id == ticket_cancel.ticket_id, models.Ticket.deleted_at.is_(None)).
+                values(deleted_at=datetime.now(), status_id=3).
+                returning(models.Ticket.price, models.Ticket.agent_id, models.Ticket.flight_id).
+                execution_options(synchronize_session=False))).first()
+            if claimed is None:
+                raise ValueError('Ticket not found')
+
+            ticket_id = ticket_cancel.ticket_id
+            await db.execute(Ledger.post(claimed.agent_id, claimed.price, 'sales', 'ticket_refund', ticket_id))
+            if ticket_cancel.fine:
+                await db.execute(Ledger.post(claimed.agent_id, -ticket_cancel.fine, 'fines', 'fine', ticket_id))
+            await db.execute(FlightOccupancy.change_left_seats(claimed.flight_id, 1))
+            await db.execute(FlightOccupancy.change(claimed.flight_id, tickets_count=-1, revenue=-claimed.price))
+
+            db.add(models.AgentDebt(agent_id=claimed.agent_id, flight_id=claimed.flight_id, ticket_id=ticket_id,
+                                    amount=ticket_cancel.fine, type='fine', comment=ticket_cancel.comment))
+            # history is in the same transaction as refund and fine
+            History.add(db, user_id=user_id, action="cancel ticket", extra_info=f'Ticket {ticket_id} canceled')
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        response_cache.invalidate("tickets")
+        sale_queues.reopen(claimed.flight_id)
 
         return {"message": "Ticket deleted successfully and fine added to agent balance"}
 
     @staticmethod
-    def update(db: Session,
-               db_ticket: models.Ticket,
-               ticket: schemas.TicketUpdate,
-               db_flight: models.Flight,
-               user_id: int,
-               db_booking: models.Booking,
-               hard: bool = False,
-               soft: bool = False):
+    async def update(db: AsyncSession,
+                     db_ticket: models.Ticket,
+                     ticket: schemas.TicketUpdate,
+                     db_flight: models.Flight,
+                     user_id: int,
+                     db_booking: models.Booking,
+                     hard: bool = False,
+                     soft: bool = False):
         try:
+            old_price = db_ticket.price
             if db_ticket.agent_id != ticket.agent_id:
                 new_ticket = models.Ticket()
 
@@ -239,16 +192,16 @@ class Ticket:
                         setattr(new_ticket, key, value)
 
                 # create a new ticket and cancel old ticket
-                Ticket.create(db, schemas.TicketCreate(**new_ticket.__dict__), db_flight, user_id, hard, soft)
-                Ticket.cancel(db, schemas.TicketCancel(ticket_id=db_ticket.id, fine=0, currency=db_ticket.currency,
-                                                       comment='Ticket was created wrong'), user_id)
+                await Ticket.create(db, schemas.TicketCreate(**new_ticket.__dict__), db_flight, user_id, hard, soft)
+                await Ticket.cancel(db, schemas.TicketCancel(ticket_id=db_ticket.id, fine=0, currency=db_ticket.currency,
+                                                             comment='Ticket was created wrong'), user_id)
                 models.AgentDebt(agent_id=db_ticket.agent_id, flight_id=db_ticket.flight_id, ticket_id=db_ticket.id,
                                  amount=0, type='fine', comment='Ticket was created wrong')
 
             if db_ticket.luggage != ticket.luggage:
-                query = db.query(models.FlightGuide.luggage, models.Agent.balance). \
-                    join(models.Agent, models.Agent.id == db_ticket.agent_id). \
-                    filter(models.FlightGuide.id == db_flight.flight_guide_id).first()
+                query = (await db.execute(select(models.FlightGuide.luggage, models.Agent.balance).
+                                          join(models.Agent, models.Agent.id == db_ticket.agent_id).
+                                          filter(models.FlightGuide.id == db_flight.flight_guide_id))).first()
 
                 luggage, balance = query
 
@@ -267,18 +220,21 @@ class Ticket:
                     db_booking.hard_block -= 1
                 if soft:
                     db_booking.soft_block -= 1
-                db_flight.left_seats += 1
+                await db.execute(FlightOccupancy.change_left_seats(db_flight.id, 1))
+                await db.execute(FlightOccupancy.change(db_flight.id, booked_seats=-1))
                 db_ticket.is_booked = True
             else:
                 db_ticket.is_booked = False
 
             if db_ticket.price != ticket.price or hard or soft:
                 # get agent debt from db
-                db_agent_debt = db.query(models.AgentDebt). \
-                    filter(models.AgentDebt.ticket_id == db_ticket.id,
-                           models.AgentDebt.flight_id == db_ticket.flight_id,
-                           models.AgentDebt.agent_id == db_ticket.agent_id,
-                           models.AgentDebt.type == 'purchase').first()
+                db_agent_debt = (await db.execute(select(models.AgentDebt).
+                                                  filter(models.AgentDebt.ticket_id == db_ticket.id,
+                                                         # debts are not older than ticket, prunes older partitions
+                                                         models.AgentDebt.created_at >= db_ticket.created_at,
+                                                         models.AgentDebt.flight_id == db_ticket.flight_id,
+                                                         models.AgentDebt.agent_id == db_ticket.agent_id,
+                                                         models.AgentDebt.type == 'purchase'))).scalars().first()
 
                 if db_agent_debt is None:
                     db_agent_debt = models.AgentDebt(agent_id=db_ticket.agent_id, flight_id=db_ticket.flight_id,
@@ -287,28 +243,25 @@ class Ticket:
                     db_agent_debt.amount = db_ticket.price
 
                 db.add(db_agent_debt)
-                db.commit()
-                db.refresh(db_agent_debt)
+                await db.commit()
+                await db.refresh(db_agent_debt)
 
             # update ticket
-            extra_info = ""
-            for key, value in ticket.dict().items():
-                if value is not None:
-                    # add to extra_info data which is changed
-                    if value != getattr(db_ticket, key):
-                        extra_info += f"{key}: {getattr(db_ticket, key)} -> {value}\n"
-                    if db_ticket.agent_id is ticket.agent_id:
-                        setattr(db_ticket, key, value)
+            changes = History.diff("ticket", db_ticket, ticket.dict(), apply=db_ticket.agent_id is ticket.agent_id)
 
             db.add(db_ticket)
+            if db_ticket.deleted_at is None and db_ticket.price != old_price:
+                await db.execute(FlightOccupancy.change(db_flight.id, revenue=db_ticket.price - old_price))
 
             db.add(db_flight)
-            db.commit()
-            db.refresh(db_flight)
+            await db.commit()
+            await db.refresh(db_flight)
+            response_cache.invalidate("tickets")
 
             # add to history this ticket
-            History.create(db, user_id=user_id, action="update ticket",
-                           extra_info=f'Ticket {db_ticket.id} updated:\n{extra_info}')
+            await db.run_sync(History.create, user_id=user_id, action="update ticket",
+                              extra_info=f'Ticket {db_ticket.id} updated:\n{History.describe(changes)}',
+                              changes=changes)
 
             return {"message": "Ticket updated successfully"}
         except ValueError as e:
@@ -316,19 +269,3 @@ class Ticket:
         except Exception as e:
             print(logging.error(e))
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket has trouble updating")
-
-
-    # create flight reservation set to redis for 5 minutes and return flight_id: True|False
-    @staticmethod
-    def create_reservation(db: Session, flight_id: int):
-        flight = db.query(models.Flight).filter(models.Flight.id == flight_id).first()
-
-        if flight is None:
-            raise HTTPException(status_code=404, detail="Flight not found")
-
-        if flight.left_seats == 0:
-            raise HTTPException(status_code=400, detail="No seats left")
-
-        redis = Redis()
-        redis.set(flight_id, True, ex=300)
-        return {flight_id: True}
\ No newline at end of file
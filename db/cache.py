@@ -0,0 +1,201 @@
+# Shared cache used by all workers of application: Redis if redis_host is set, in-memory stand-in otherwise
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+redis_host = os.getenv('redis_host')
+redis_port = int(os.getenv('redis_port') or 6379)
+redis_db = int(os.getenv('redis_db') or 0)
+cache_backend = os.getenv('cache_backend') or ('redis' if redis_host else 'memory')
+
+
+class Cache(ABC):
+    """
+    Interface of cache backends, values are strings. Same semantics as Redis commands:
+    ttl is -2 for missing key and -1 for key without expiry, incr starts from 0
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        ...
+
+    @abstractmethod
+    async def ttl(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1) -> int:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> int:
+        ...
+
+    @abstractmethod
+    def pipeline(self):
+        """ Commands are queued and run by await pipeline.execute(), which returns their results in order """
+        ...
+
+    async def close(self):
+        pass
+
+
+class MemoryCache(Cache):
+    """ Cache of one process for tests and single node runs, commands run without awaiting so they are atomic """
+
+    def __init__(self):
+        self.data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _get(self, key: str) -> Optional[str]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        if nx and self._get(key) is not None:
+            return False
+        self.data[key] = (str(value), time.monotonic() + ex if ex else None)
+        return True
+
+    def _ttl(self, key: str) -> int:
+        if self._get(key) is None:
+            return -2
+        expires_at = self.data[key][1]
+        return -1 if expires_at is None else max(round(expires_at - time.monotonic()), 0)
+
+    def _incr(self, key: str, amount: int = 1) -> int:
+        value = int(self._get(key) or 0) + amount
+        expires_at = self.data[key][1] if key in self.data else None
+        self.data[key] = (str(value), expires_at)
+        return value
+
+    def _delete(self, *keys: str) -> int:
+        deleted = [key for key in keys if self._get(key) is not None]
+        for key in deleted:
+            del self.data[key]
+        return len(deleted)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        return self._set(key, value, ex, nx)
+
+    async def ttl(self, key: str) -> int:
+        return self._ttl(key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return self._incr(key, amount)
+
+    async def delete(self, *keys: str) -> int:
+        return self._delete(*keys)
+
+    def pipeline(self):
+        return MemoryPipeline(self)
+
+
+class MemoryPipeline:
+    def __init__(self, cache: MemoryCache):
+        self.cache = cache
+        self.commands = []
+
+    def _queue(self, command, *args):
+        self.commands.append((command, args))
+        return self
+
+    def get(self, key: str):
+        return self._queue(self.cache._get, key)
+
+    def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False):
+        return self._queue(self.cache._set, key, value, ex, nx)
+
+    def ttl(self, key: str):
+        return self._queue(self.cache._ttl, key)
+
+    def incr(self, key: str, amount: int = 1):
+        return self._queue(self.cache._incr, key, amount)
+
+    def delete(self, *keys: str):
+        return self._queue(self.cache._delete, *keys)
+
+    async def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return [command(*args) for command, args in commands]
+
+
+class RedisCache(Cache):
+    """ Cache shared by all workers and pods through Redis """
+
+    def __init__(self, host: str = redis_host, port: int = redis_port, db: int = redis_db):
+        import redis.asyncio as redis
+
+        self.client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        return bool(await self.client.set(key, value, ex=ex, nx=nx))
+
+    async def ttl(self, key: str) -> int:
+        return await self.client.ttl(key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.client.incr(key, amount)
+
+    async def delete(self, *keys: str) -> int:
+        return await self.client.delete(*keys)
+
+    def pipeline(self):
+        # redis pipeline has the same queueing methods and runs them in MULTI/EXEC
+        return self.client.pipeline(transaction=True)
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_cache(backend: str = cache_backend) -> Cache:
+    if backend == 'redis':
+        return RedisCache()
+    if backend == 'memory':
+        return MemoryCache()
+    raise ValueError(f'Unknown cache backend {backend}')
+
+
+cache = create_cache()
+
+_background = set()
+
+
+def run_in_background(coroutine):
+    """ Run cache command from sync code: as task on running event loop, or to completion without one """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    task = loop.create_task(coroutine)
+    _background.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def _done(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(logging.error(task.exception()))
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -9,16 +11,41 @@ from dotenv import load_dotenv
 load_dotenv()
 
 db_uri = os.getenv('db_uri')
+# same database through asyncpg driver if async_db_uri is not set
+async_db_uri = os.getenv('async_db_uri') or make_url(db_uri).set(drivername='postgresql+asyncpg')
 
-engine = create_engine(db_uri)
+# pool settings are per engine, sync and async engine each hold up to pool_size + max_overflow connections
+pool_options = {
+    'pool_size': int(os.getenv('db_pool_size', 10)),
+    'max_overflow': int(os.getenv('db_max_overflow', 20)),
+    'pool_timeout': int(os.getenv('db_pool_timeout', 30)),
+    'pool_recycle': int(os.getenv('db_pool_recycle', 1800)),
+    'pool_pre_ping': os.getenv('db_pool_pre_ping', 'true').lower() in ('1', 'true', 'yes'),
+}
+
+engine = create_engine(db_uri, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(async_db_uri, **pool_options)
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autocommit=False, autoflush=False,
+                                 expire_on_commit=False)
+
 Base = declarative_base()
 
 
 def get_db():
+    """
+    Request scoped session, FastAPI resolves dependency once per request so all Depends(get_db) of one request
+    share it. Session takes connection from pool on first statement only and returns it on close
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """ Request scoped async session, lazy like get_db """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,7 +1,9 @@
 from datetime import datetime
 
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Date, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Date, Float, UniqueConstraint, \
+    Index, text, BigInteger
+from sqlalchemy.dialects.postgresql import JSONB
 
 from db.database import Base
 
@@ -56,6 +58,14 @@ class UserNotification(Base):
     message = Column(String(255), nullable=False)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    flight_id = Column(Integer, ForeignKey("flights.id"), nullable=True)
+
+    __table_args__ = (
+        Index('ix_user_notifications_unread', 'user_id', 'created_at', postgresql_where=text('is_read = false')),
+        # one start sale notification of flight per user, workers which detect the same flight insert it once
+        Index('ux_user_notifications_start_sale', 'flight_id', 'user_id', unique=True,
+              postgresql_where=text("action = 'start_sale'")),
+    )
 
     user = relationship("User", backref="notifications")
 
@@ -66,7 +76,8 @@ class UserNotification(Base):
 class UserHistory(Base):
     __tablename__ = "user_history"
 
-    id = Column(Integer, primary_key=True, index=True, unique=True)
+    # partitioned by month of created_at (db/partitions.py), so it is part of primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     action = Column(
         Enum(
@@ -113,7 +124,17 @@ class UserHistory(Base):
         ), nullable=False
     )
     extra_info = Column(String(800), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # {"entity": "flight", "id": 1, "changed": ["price"], "fields": {"price": [old, new]}}, see History.diff
+    changes = Column(JSONB(none_as_null=True), nullable=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_user_history_user_id', 'user_id', 'created_at', 'id'),
+        Index('ix_user_history_created_at', 'created_at', 'id'),
+        Index('ix_user_history_changes', 'changes', postgresql_using='gin',
+              postgresql_ops={'changes': 'jsonb_path_ops'}),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
     user = relationship("User", backref="user_history")
 
@@ -147,6 +168,10 @@ class Agent(Base):
     deleted_at = Column(DateTime, nullable=True)
     discount_id = Column(Integer, ForeignKey("discounts.id"), nullable=True)
 
+    __table_args__ = (
+        Index('ix_agents_user_id', 'user_id'),
+    )
+
     user = relationship("User", backref="agents")
     discount = relationship("Discount", backref="agents")
 
@@ -302,6 +327,12 @@ class Flight(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_flights_departure_date', 'departure_date', postgresql_where=text('deleted_at IS NULL')),
+        Index('ix_flights_on_sale', 'on_sale', 'departure_date', postgresql_where=text('deleted_at IS NULL')),
+        Index('ix_flights_flight_guide_id', 'flight_guide_id'),
+    )
+
     flight_guide = relationship("FlightGuide", backref="flights")
 
     def __repr__(self):
@@ -310,6 +341,42 @@ class Flight(Base):
                f"total_seats={self.total_seats}, left_seats={self.left_seats}, on_sale={self.on_sale})"
 
 
+class FlightOccupancy(Base):
+    """ Counters of flight maintained by ticket and booking code, rebuilt by crud_models.views.occupancy """
+    __tablename__ = 'flight_occupancy'
+
+    flight_id = Column(Integer, ForeignKey("flights.id"), primary_key=True)
+    booked_seats = Column(Integer, nullable=False, default=0)
+    tickets_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"FlightOccupancy(flight_id={self.flight_id}, booked_seats={self.booked_seats}, " \
+               f"tickets_count={self.tickets_count}, revenue={self.revenue})"
+
+
+class SeatHold(Base):
+    """ Seats of flight taken from left_seats for agent until expires_at, see crud_models.views.seat_holds """
+    __tablename__ = 'seat_holds'
+
+    id = Column(Integer, primary_key=True, index=True, unique=True)
+    flight_id = Column(Integer, ForeignKey("flights.id"), nullable=False)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    seats = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_seat_holds_expires_at', 'expires_at'),
+        Index('ix_seat_holds_flight_id', 'flight_id'),
+    )
+
+    def __repr__(self):
+        return f"SeatHold(id={self.id}, flight_id={self.flight_id}, agent_id={self.agent_id}, " \
+               f"seats={self.seats}, expires_at={self.expires_at})"
+
+
 class FlightPriceHistory(Base):
     __tablename__ = "flight_price_history"
 
@@ -359,6 +426,11 @@ class Booking(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_bookings_flight_id', 'flight_id'),
+        Index('ix_bookings_agent_id_flight_id', 'agent_id', 'flight_id'),
+    )
+
     __tablde_args__ = (UniqueConstraint('flight_id', 'agent_id', name='unique_booking'),)
 
     flight = relationship("Flight", backref="bookings")
@@ -463,6 +535,11 @@ class Ticket(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_tickets_flight_id', 'flight_id', 'created_at', 'id'),
+        Index('ix_tickets_agent_id', 'agent_id', 'created_at', 'id'),
+    )
+
     flight = relationship("Flight", backref="tickets")
     agent = relationship("Agent", backref="tickets")
     passenger = relationship("Passenger", backref="tickets")
@@ -561,6 +638,11 @@ class Refill(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_refills_agent_id', 'agent_id', 'created_at', 'id', postgresql_where=text('deleted_at IS NULL')),
+        Index('ix_refills_created_at', 'created_at', 'id', postgresql_where=text('deleted_at IS NULL')),
+    )
+
     receiver = relationship("User", backref="refills")
     agent = relationship("Agent", backref="refills")
     payment_type = relationship("PaymentType", backref="refills")
@@ -572,20 +654,55 @@ class Refill(Base):
 class AgentDebt(Base):
     __tablename__ = 'agent_debts'
 
-    id = Column(Integer, primary_key=True, index=True, unique=True)
+    # partitioned by month of created_at (db/partitions.py), so it is part of primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
     flight_id = Column(Integer, ForeignKey("flights.id"), nullable=False)
     ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
     type = Column(Enum('fine', 'purchase', name='DebtType'), default='fine')
     amount = Column(Integer, default=0)
     comment = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index('ix_agent_debts_ticket_id', 'ticket_id', 'id'),
+        Index('ix_agent_debts_agent_id', 'agent_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
     agent = relationship("Agent", backref="debts")
     flight = relationship("Flight", backref="debts")
     ticket = relationship("Ticket", backref="debts")
 
     def __repr__(self):
         return f"AgentDebt(id={self.id}, agent={self.agent})"
+
+
+class LedgerEntry(Base):
+    """
+    Append-only posting of agent ledger: amount moves between agent account and contra account (account),
+    balance is agent balance right after posting. Written by users/views/ledger.py only
+    """
+    __tablename__ = 'ledger_entries'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    account = Column(Enum('cash', 'sales', 'fines', 'bookings', 'adjustment', name='LedgerAccount'), nullable=False)
+    kind = Column(Enum('opening', 'refill', 'refill_update', 'refill_delete', 'ticket_sale', 'ticket_refund', 'fine',
+                       'booking_refund', 'adjustment', name='LedgerKind'), nullable=False)
+    amount = Column(Integer, nullable=False)
+    balance = Column(Integer, nullable=False)
+    # ticket, refill or booking by kind
+    reference_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_ledger_entries_agent_id', 'agent_id', 'created_at', 'id'),
+    )
+
+    agent = relationship("Agent", backref="ledger_entries")
+
+    def __repr__(self):
+        return f"LedgerEntry(id={self.id}, agent_id={self.agent_id}, amount={self.amount}, balance={self.balance})"
@@ -0,0 +1,186 @@
+# Monthly range partitions on created_at of append-only tables. Partitions are created some months ahead daily,
+# rows of months without partition land in default partition and are moved out when their partition is created,
+# partitions older than retention are detached, dumped to gzip CSV files and dropped.
+# usage: python -m db.partitions ensure [months_ahead]
+#        python -m db.partitions archive keep_months [directory]
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sys
+from contextlib import suppress
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import AsyncSessionLocal
+
+# partition names are table_YYYY_MM and table_default, migration 9c7d1e3f5a20 creates them the same way
+PARTITIONED_TABLES = ("user_history", "agent_debts")
+MONTHS_AHEAD = 3
+# workers run maintenance at the same time, advisory lock lets one of them create partitions at a time
+PARTITION_LOCK = 7301
+
+PARTITIONS = """
+    SELECT c.relname FROM pg_inherits AS i
+    JOIN pg_class AS c ON c.oid = i.inhrelid
+    JOIN pg_class AS p ON p.oid = i.inhparent
+    WHERE p.relname = :table ORDER BY c.relname
+"""
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def partition_month(table: str, name: str) -> Optional[date]:
+    """ First day of month of partition, None if name is not table_YYYY_MM """
+    try:
+        year, month = name[len(table) + 1:].split("_")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def default_partition_sql(table: str) -> str:
+    """ Rows of months without partition go to default partition instead of failing inserts """
+    return f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    """
+    Create partition of month if it is missing. Rows of that month which already fell into default partition
+    are moved to new partition, default partition is detached meanwhile because it must not overlap with it
+    """
+    name, start, end = partition_name(table, month), month, add_months(month, 1)
+    in_month = f"created_at >= '{start}' AND created_at < '{end}'"
+    return f"""
+DO $$
+BEGIN
+    IF to_regclass('{name}') IS NOT NULL THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM {table}_default WHERE {in_month}) THEN
+        ALTER TABLE {table} DETACH PARTITION {table}_default;
+        CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}');
+        INSERT INTO {name} SELECT * FROM {table}_default WHERE {in_month};
+        DELETE FROM {table}_default WHERE {in_month};
+        ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT;
+    ELSE
+        CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}');
+    END IF;
+END $$"""
+
+
+def ensure_partitions_sql(months_ahead: int = MONTHS_AHEAD, months_back: int = 0,
+                          today: Optional[date] = None) -> List[str]:
+    """
+    Statements which create default partitions and missing partitions from months_back months ago
+    to months_ahead months ahead
+    """
+    current = (today or date.today()).replace(day=1)
+    return [default_partition_sql(table) for table in PARTITIONED_TABLES] + \
+        [create_partition_sql(table, add_months(current, months))
+         for table in PARTITIONED_TABLES for months in range(-months_back, months_ahead + 1)]
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = MONTHS_AHEAD):
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK})
+    for statement in ensure_partitions_sql(months_ahead):
+        await db.execute(text(statement))
+    await db.commit()
+
+
+class PartitionMaintainer:
+    """ Background task which creates partitions of next months at startup and then daily, so they never run out """
+
+    def __init__(self, interval: int = 24 * 60 * 60, months_ahead: int = MONTHS_AHEAD):
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await ensure_partitions(db, self.months_ahead)
+            except Exception as e:
+                print(logging.error(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+def archive_partitions(engine: Engine, keep_months: int, directory: str, today: Optional[date] = None) -> List[str]:
+    """
+    Write partitions of months older than keep_months to directory/partition.csv.gz, then detach and drop them.
+    Each partition is copied, detached and dropped in one transaction which commits only after its file is complete,
+    so failed copy leaves partition attached and it is archived again by next run. Returns written files
+    """
+    cutoff = add_months((today or date.today()).replace(day=1), -keep_months)
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for table in PARTITIONED_TABLES:
+        with engine.connect() as conn:
+            names = conn.execute(text(PARTITIONS), {"table": table}).scalars().all()
+        for name in names:
+            month = partition_month(table, name)
+            if month is None or month >= cutoff:
+                continue
+
+            path = os.path.join(directory, f"{name}.csv.gz")
+            connection = engine.raw_connection()
+            try:
+                with connection.cursor() as cursor:
+                    # old months get no writes, lock only makes sure nothing is written after copy
+                    cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+                    with gzip.open(path + ".part", "wt", encoding="utf-8") as file:
+                        cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", file)
+                    shutil.move(path + ".part", path)
+                    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    cursor.execute(f"DROP TABLE {name}")
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.close()
+            files.append(path)
+    return files
+
+
+if __name__ == "__main__":
+    from db.database import engine as db_engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+    if command == "ensure":
+        with db_engine.begin() as connection:
+            for statement in ensure_partitions_sql(int(sys.argv[2]) if len(sys.argv) > 2 else MONTHS_AHEAD):
+                connection.execute(text(statement))
+        print("partitions created")
+    elif command == "archive" and len(sys.argv) > 2:
+        directory = sys.argv[3] if len(sys.argv) > 3 else "archive"
+        for archived in archive_partitions(db_engine, int(sys.argv[2]), directory):
+            print(f"archived {archived}")
+    else:
+        raise SystemExit("usage: python -m db.partitions ensure [months_ahead] | archive keep_months [directory]")
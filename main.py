@@ -1,8 +1,6 @@
-import asyncio
+import logging
 
 from fastapi import FastAPI
-from starlette.requests import Request
-from starlette.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from crud_models.routers.countries import routers as countries
@@ -18,7 +16,6 @@ from crud_models.routers.genders import routers as genders
 from crud_models.routers.refills import routers as refills
 from crud_models.routers.payments_type import routers as payments_type
 from crud_models.routers.ticket_classes import routers as ticket_classes
-# from db.db_redis import redis_client
 
 from users.routers.auth_token import routers as auth_token
 from users.routers.roles import routers as roles
@@ -30,6 +27,7 @@ from users.routers.agents import routers as agents
 from users.routers.discounts import routers as discounts
 
 from notifications.routers import routers as notifications
+from notifications.services import start_sale_notifier
 
 from pages.routers.currency import routers as currency
 from pages.routers.main import routers as main_page
@@ -39,8 +37,15 @@ from pages.routers.users import routers as users_page
 from pages.routers.payments import routers as payments_page
 from pages.routers.agents import routers as agents_page
 from pages.routers.guides import routers as guides_page
-
-from db.database import SessionLocal
+from pages.routers.metrics import routers as metrics_page
+from pages.views.currency import currency_rate_cache
+from pages.views.reference import reference_cache
+from pages.views.response_cache import response_cache
+from crud_models.views.seat_holds import seat_hold_sweeper
+from users.views.audit_log import audit_log, audit_log_mode
+from db.cache import cache
+from db.partitions import partition_maintainer
+from db.database import AsyncSessionLocal
 
 app = FastAPI()
 
@@ -52,6 +57,9 @@ origins = ["*"]
 #     "http://localhost:3000",
 # ]
 
+# cached GET responses of page endpoints, see pages/views/response_cache.py
+app.middleware("http")(response_cache)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -61,33 +69,71 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
-    response = Response("Internet server error", status_code=500)
+@app.on_event("startup")
+async def start_currency_rate_refresher():
+    currency_rate_cache.start()
+
+
+@app.on_event("startup")
+async def start_seat_hold_sweeper():
+    seat_hold_sweeper.start()
+
+
+@app.on_event("startup")
+async def start_start_sale_notifier():
+    start_sale_notifier.start()
+
+
+@app.on_event("startup")
+async def start_audit_log():
+    if audit_log_mode == 'write_behind':
+        audit_log.start()
+
+
+@app.on_event("startup")
+async def start_partition_maintainer():
+    """ Create partitions of next months now and daily, the same as `python -m db.partitions ensure` """
+    partition_maintainer.start()
+
+
+@app.on_event("startup")
+async def load_reference_data():
+    """ Warm reference data cache, tables which failed to load are loaded by first request """
     try:
-        request.state.db = SessionLocal()
-        response = await call_next(request)
-    finally:
-        request.state.db.close()
-    return response
-
-
-# @app.post("/set_key_value")
-# async def set_key_value(key: str, value: str):
-#     # Set the key-value pair in Redis with an expiry time of 5 minutes
-#     foo = redis_client.set(key, value, ex=300)
-#     return {"message": "Key-value pair set successfully for 5 mins"}
-#
-#
-# @app.get("/get_value")
-# async def get_value(key: str):
-#     # Get the value for the given key from Redis
-#     value = redis_client.get(key)
-#
-#     if value is not None:
-#         return {"value": value.decode()}
-#     else:
-#         return {"message": "Key not found"}
+        async with AsyncSessionLocal() as db:
+            await reference_cache.load(db)
+    except Exception as e:
+        print(logging.error(e))
+
+
+@app.on_event("shutdown")
+async def stop_currency_rate_refresher():
+    await currency_rate_cache.stop()
+
+
+@app.on_event("shutdown")
+async def stop_seat_hold_sweeper():
+    await seat_hold_sweeper.stop()
+
+
+@app.on_event("shutdown")
+async def stop_start_sale_notifier():
+    await start_sale_notifier.stop()
+
+
+@app.on_event("shutdown")
+async def stop_partition_maintainer():
+    await partition_maintainer.stop()
+
+
+@app.on_event("shutdown")
+async def stop_audit_log():
+    await audit_log.stop()
+
+
+@app.on_event("shutdown")
+async def close_cache():
+    await cache.close()
 
 
 # users
@@ -127,6 +173,7 @@ app.include_router(users_page, tags=["pages"])
 app.include_router(payments_page, tags=["pages"])
 app.include_router(agents_page, tags=["pages"])
 app.include_router(guides_page, tags=["pages"])
+app.include_router(metrics_page, tags=["pages"])
 
 if __name__ == "__main__":
     import uvicorn
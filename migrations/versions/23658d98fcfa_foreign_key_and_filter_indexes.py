@@ -0,0 +1,44 @@
+"""foreign key and filter indexes
+
+Revision ID: 23658d98fcfa
+Revises: 3f9a6c21d7e4
+Create Date: 2026-10-18 14:05:27.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '23658d98fcfa'
+down_revision = '3f9a6c21d7e4'
+branch_labels = None
+depends_on = None
+
+# name, table, columns, partial index condition; declared in db/models.py as well
+INDEXES = [
+    ('ix_tickets_flight_id', 'tickets', ['flight_id', 'created_at', 'id'], None),
+    ('ix_tickets_agent_id', 'tickets', ['agent_id', 'created_at', 'id'], None),
+    ('ix_bookings_flight_id', 'bookings', ['flight_id'], None),
+    ('ix_bookings_agent_id_flight_id', 'bookings', ['agent_id', 'flight_id'], None),
+    ('ix_agent_debts_ticket_id', 'agent_debts', ['ticket_id', 'id'], None),
+    ('ix_agent_debts_agent_id', 'agent_debts', ['agent_id', 'created_at'], None),
+    ('ix_flights_departure_date', 'flights', ['departure_date'], 'deleted_at IS NULL'),
+    ('ix_flights_on_sale', 'flights', ['on_sale', 'departure_date'], 'deleted_at IS NULL'),
+    ('ix_flights_flight_guide_id', 'flights', ['flight_guide_id'], None),
+    ('ix_user_history_user_id', 'user_history', ['user_id', 'id'], None),
+    ('ix_user_history_created_at', 'user_history', ['created_at'], None),
+    ('ix_refills_agent_id', 'refills', ['agent_id', 'created_at', 'id'], 'deleted_at IS NULL'),
+    ('ix_refills_created_at', 'refills', ['created_at', 'id'], 'deleted_at IS NULL'),
+    ('ix_agents_user_id', 'agents', ['user_id'], None),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+
+
+def downgrade() -> None:
+    for name, table, columns, where in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
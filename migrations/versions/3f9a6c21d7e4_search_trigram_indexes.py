@@ -0,0 +1,40 @@
+"""search trigram indexes
+
+Revision ID: 3f9a6c21d7e4
+Revises: dc85c7ecbe8b
+Create Date: 2026-10-18 10:12:41.302518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c21d7e4'
+down_revision = 'dc85c7ecbe8b'
+branch_labels = None
+depends_on = None
+
+# expressions must be the same as in pages/views/search.py to be used by planner
+SEARCH_INDEXES = {
+    'ix_tickets_search': (
+        'tickets',
+        "lower(first_name || ' ' || surname || ' ' || passport || ' ' || ticket_number || ' ' || "
+        "coalesce(comment, ''))"),
+    'ix_flight_guides_search': ('flight_guides', "lower(flight_number)"),
+    'ix_airports_search': (
+        'airports',
+        "lower(airport_ru || ' ' || coalesce(airport_en, '') || ' ' || coalesce(airport_uz, ''))"),
+    'ix_users_search': ('users', "lower(username)"),
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, expression) in SEARCH_INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON {table} USING gin (({expression}) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    for name in SEARCH_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,40 @@
+"""seat holds
+
+Revision ID: 5b2e8f41c7a3
+Revises: e9cb97d00668
+Create Date: 2026-10-18 17:05:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f41c7a3'
+down_revision = 'e9cb97d00668'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('seat_holds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('flight_id', sa.Integer(), nullable=False),
+    sa.Column('agent_id', sa.Integer(), nullable=False),
+    sa.Column('seats', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['agent_id'], ['agents.id'], ),
+    sa.ForeignKeyConstraint(['flight_id'], ['flights.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_seat_holds_id'), 'seat_holds', ['id'], unique=True)
+    op.create_index('ix_seat_holds_expires_at', 'seat_holds', ['expires_at'], unique=False)
+    op.create_index('ix_seat_holds_flight_id', 'seat_holds', ['flight_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_seat_holds_flight_id', table_name='seat_holds')
+    op.drop_index('ix_seat_holds_expires_at', table_name='seat_holds')
+    op.drop_index(op.f('ix_seat_holds_id'), table_name='seat_holds')
+    op.drop_table('seat_holds')
@@ -0,0 +1,32 @@
+"""start sale notifications
+
+Revision ID: 8d41c0f7a2b9
+Revises: 5b2e8f41c7a3
+Create Date: 2026-10-18 18:12:09.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c0f7a2b9'
+down_revision = '5b2e8f41c7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_notifications', sa.Column('flight_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('user_notifications_flight_id_fkey', 'user_notifications', 'flights', ['flight_id'], ['id'])
+    op.create_index('ix_user_notifications_unread', 'user_notifications', ['user_id', 'created_at'], unique=False,
+                    postgresql_where=sa.text('is_read = false'))
+    op.create_index('ux_user_notifications_start_sale', 'user_notifications', ['flight_id', 'user_id'], unique=True,
+                    postgresql_where=sa.text("action = 'start_sale'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ux_user_notifications_start_sale', table_name='user_notifications')
+    op.drop_index('ix_user_notifications_unread', table_name='user_notifications')
+    op.drop_constraint('user_notifications_flight_id_fkey', 'user_notifications', type_='foreignkey')
+    op.drop_column('user_notifications', 'flight_id')
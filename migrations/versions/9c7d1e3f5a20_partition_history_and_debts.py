@@ -0,0 +1,99 @@
+"""partition user history and agent debts by month
+
+Revision ID: 9c7d1e3f5a20
+Revises: 8d41c0f7a2b9
+Create Date: 2026-10-18 19:02:47.118235
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9c7d1e3f5a20'
+down_revision = '8d41c0f7a2b9'
+branch_labels = None
+depends_on = None
+
+# table: (created_at of old rows without it, foreign keys, indexes); declared in db/models.py as well
+TABLES = {
+    'user_history': (
+        "COALESCE(created_at, now())",
+        {'user_id': 'users'},
+        {'ix_user_history_user_id': ['user_id', 'created_at', 'id'],
+         'ix_user_history_created_at': ['created_at', 'id']},
+    ),
+    'agent_debts': (
+        "COALESCE(created_at, updated_at, now())",
+        {'agent_id': 'agents', 'flight_id': 'flights', 'ticket_id': 'tickets'},
+        {'ix_agent_debts_ticket_id': ['ticket_id', 'id'],
+         'ix_agent_debts_agent_id': ['agent_id', 'created_at']},
+    ),
+}
+OLD_INDEXES = {
+    'user_history': {'ix_user_history_id': ['id'], 'ix_user_history_user_id': ['user_id', 'id'],
+                     'ix_user_history_created_at': ['created_at']},
+    'agent_debts': {'ix_agent_debts_id': ['id'], 'ix_agent_debts_ticket_id': ['ticket_id', 'id'],
+                    'ix_agent_debts_agent_id': ['agent_id', 'created_at']},
+}
+MONTHS_AHEAD = 3
+
+# monthly partitions from first row to MONTHS_AHEAD months ahead and default partition for rows of months
+# without partition, named as in db/partitions.py
+CREATE_PARTITIONS = """
+DO $$
+DECLARE month date;
+BEGIN
+    FOR month IN SELECT generate_series(date_trunc('month', COALESCE(min({created_at}), now())),
+                                        date_trunc('month', now()) + interval '{months_ahead} months',
+                                        interval '1 month')::date FROM {source}
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+                       '{table}_' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date);
+    END LOOP;
+    EXECUTE 'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT';
+END $$
+"""
+
+
+def rebuild(table: str, partitioned: bool, created_at: str, foreign_keys: dict, indexes: dict, old_indexes: dict):
+    """ Move table aside, create new one with the same columns and copy rows into it """
+    old = f"{table}_old"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for name in old_indexes:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    if partitioned:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+        op.execute(CREATE_PARTITIONS.format(table=table, source=old, created_at=created_at,
+                                            months_ahead=MONTHS_AHEAD))
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+    for column, reference in foreign_keys.items():
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey "
+                   f"FOREIGN KEY ({column}) REFERENCES {reference} (id)")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    columns = op.get_bind().exec_driver_sql(
+        f"SELECT attname FROM pg_attribute WHERE attrelid = '{old}'::regclass AND attnum > 0 AND NOT attisdropped "
+        f"ORDER BY attnum").scalars().all()
+    values = [created_at if partitioned and column == 'created_at' else column for column in columns]
+    op.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+
+    for name, index_columns in indexes.items():
+        op.execute(f"CREATE {'UNIQUE ' if index_columns == ['id'] else ''}INDEX {name} "
+                   f"ON {table} ({', '.join(index_columns)})")
+
+
+def upgrade() -> None:
+    for table, (created_at, foreign_keys, indexes) in TABLES.items():
+        rebuild(table, True, created_at, foreign_keys, indexes, OLD_INDEXES[table])
+
+
+def downgrade() -> None:
+    for table, (created_at, foreign_keys, indexes) in TABLES.items():
+        rebuild(table, False, created_at, foreign_keys, OLD_INDEXES[table], indexes)
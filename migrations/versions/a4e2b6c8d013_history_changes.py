@@ -0,0 +1,29 @@
+"""history changes
+
+Revision ID: a4e2b6c8d013
+Revises: 9c7d1e3f5a20
+Create Date: 2026-10-18 19:48:15.662904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e2b6c8d013'
+down_revision = '9c7d1e3f5a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_history', sa.Column('changes', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    # jsonb_path_ops serves containment (@>) filters of entity, id and changed fields
+    op.create_index('ix_user_history_changes', 'user_history', ['changes'], unique=False, postgresql_using='gin',
+                    postgresql_ops={'changes': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_history_changes', table_name='user_history')
+    op.drop_column('user_history', 'changes')
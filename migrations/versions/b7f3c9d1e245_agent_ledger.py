@@ -0,0 +1,46 @@
+"""agent ledger
+
+Revision ID: b7f3c9d1e245
+Revises: a4e2b6c8d013
+Create Date: 2026-10-18 20:31:09.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3c9d1e245'
+down_revision = 'a4e2b6c8d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ledger_entries',
+                    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+                    sa.Column('agent_id', sa.Integer(), nullable=False),
+                    sa.Column('account', sa.Enum('cash', 'sales', 'fines', 'bookings', 'adjustment',
+                                                 name='LedgerAccount'), nullable=False),
+                    sa.Column('kind', sa.Enum('opening', 'refill', 'refill_update', 'refill_delete', 'ticket_sale',
+                                              'ticket_refund', 'fine', 'booking_refund', 'adjustment',
+                                              name='LedgerKind'), nullable=False),
+                    sa.Column('amount', sa.Integer(), nullable=False),
+                    sa.Column('balance', sa.Integer(), nullable=False),
+                    sa.Column('reference_id', sa.Integer(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['agent_id'], ['agents.id'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_ledger_entries_agent_id', 'ledger_entries', ['agent_id', 'created_at', 'id'], unique=False)
+    # current balances become opening entries, statements before them start from zero
+    op.execute("INSERT INTO ledger_entries (agent_id, account, kind, amount, balance, created_at) "
+               "SELECT id, 'adjustment', 'opening', COALESCE(balance, 0), COALESCE(balance, 0), now() at time zone 'utc' "
+               "FROM agents")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ledger_entries_agent_id', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
+    op.execute('DROP TYPE "LedgerKind"')
+    op.execute('DROP TYPE "LedgerAccount"')
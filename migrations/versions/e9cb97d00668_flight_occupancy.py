@@ -0,0 +1,45 @@
+"""flight occupancy
+
+Revision ID: e9cb97d00668
+Revises: 23658d98fcfa
+Create Date: 2026-10-18 15:22:09.614027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9cb97d00668'
+down_revision = '23658d98fcfa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('flight_occupancy',
+    sa.Column('flight_id', sa.Integer(), nullable=False),
+    sa.Column('booked_seats', sa.Integer(), nullable=False),
+    sa.Column('tickets_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['flight_id'], ['flights.id'], ),
+    sa.PrimaryKeyConstraint('flight_id')
+    )
+    op.execute("""
+        INSERT INTO flight_occupancy (flight_id, booked_seats, tickets_count, revenue, updated_at)
+        SELECT f.id, COALESCE(b.booked_seats, 0), COALESCE(t.tickets_count, 0), COALESCE(t.revenue, 0), now()
+        FROM flights AS f
+        LEFT JOIN (
+            SELECT flight_id, SUM(hard_block + soft_block) AS booked_seats
+            FROM bookings WHERE deleted_at IS NULL GROUP BY flight_id
+        ) AS b ON b.flight_id = f.id
+        LEFT JOIN (
+            SELECT flight_id, COUNT(*) AS tickets_count, SUM(price) AS revenue
+            FROM tickets WHERE deleted_at IS NULL GROUP BY flight_id
+        ) AS t ON t.flight_id = f.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('flight_occupancy')
@@ -1,62 +1,75 @@
-from datetime import datetime
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Optional
 
+from sqlalchemy import exists, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+
 from db import models
+from db.database import AsyncSessionLocal
 from notifications import schemas
 
+# flights which went on sale earlier than this are not notified, e.g. after long downtime
+START_SALE_LOOKBACK = timedelta(days=1)
 
-class NotificationService:
-    @staticmethod
-    def get_all_flight_on_sale(db: Session):
-        return db.query(models.Flight, models.FlightGuide).filter(
-            models.Flight.on_sale <= datetime.utcnow(),
-        ).join(
-            models.FlightGuide, models.FlightGuide.id == models.Flight.flight_guide_id
-        ).order_by(models.Flight.on_sale.desc()).first()
-
-    @staticmethod
-    def get_all_admins_user_ids(db: Session):
-        return db.query(models.User.id).filter(
-            models.User.role_id == 2).all()
 
+class NotificationService:
     @staticmethod
     def set_notification(db: Session, user_id: int, message: str, action: str):
         db.add(models.UserNotification(user_id=user_id, message=message, is_read=False, action=action))
         db.commit()
 
     @staticmethod
-    def get_start_sale_flights(db: Session):
+    def start_sale_message(flight_number: str, departure_date: datetime) -> str:
+        notification = {
+            "message": {
+                "show": f"Flight start sale {flight_number} departure time is"
+                        f" {departure_date.strftime('%d-%m-%Y %H:%M')}",
+                "flight_number": flight_number,
+                "departure_date": f"{departure_date}",
+            }
+        }
+        return str(notification)
+
+    @staticmethod
+    async def notify_start_sale(db: AsyncSession) -> int:
         """
-        Get flight that are on sale and add notification to admins
+        Notify admins about flights which went on sale and were not notified yet, all notifications are added
+        by one INSERT. Returns number of notified flights
         """
-        flights = NotificationService.get_all_flight_on_sale(db)
-        admins = NotificationService.get_all_admins_user_ids(db)
-        last_notification = db.query(models.UserNotification). \
-            filter(models.UserNotification.action == "start_sale").order_by(models.UserNotification.id.desc()).first()
-
-        if flights is not None and admins is not None:
-            notification = {
-                "message": {
-                    "show": f"Flight start sale {flights[1].flight_number} departure time is"
-                            f" {flights[0].departure_date.strftime('%d-%m-%Y %H:%M')}",
-                    "flight_number": flights[1].flight_number,
-                    "departure_date": f"{flights[0].departure_date}",
-                }
-            }
+        now = datetime.now()
+        flights = (await db.execute(
+            select(models.Flight.id, models.FlightGuide.flight_number, models.Flight.departure_date).
+            join(models.FlightGuide, models.FlightGuide.id == models.Flight.flight_guide_id).
+            filter(models.Flight.on_sale > now - START_SALE_LOOKBACK,
+                   models.Flight.on_sale <= now,
+                   models.Flight.deleted_at.is_(None),
+                   models.Flight.departure_date > now,
+                   ~exists().where(models.UserNotification.flight_id == models.Flight.id,
+                                   models.UserNotification.action == "start_sale")))).all()
+        if not flights:
+            return 0
+        admins = (await db.execute(select(models.User.id).filter(models.User.role_id == 2))).scalars().all()
+        if not admins:
+            return 0
 
-            if last_notification is None:
-                for admin in admins:
-                    NotificationService.set_notification(db, admin[0], str(notification), "start_sale")
-            elif last_notification is not None:
-                msg = eval(last_notification.message)
-                if msg['message']['flight_number'] != notification['message']['flight_number'] and \
-                        msg['message']['departure_date'] != notification['message']['departure_date']:
-                    for admin in admins:
-                        NotificationService.set_notification(db, admin[0], str(notification), "start_sale")
+        created_at = datetime.utcnow()
+        rows = [{"user_id": admin_id, "flight_id": flight.id, "action": "start_sale", "is_read": False,
+                 "message": NotificationService.start_sale_message(flight.flight_number, flight.departure_date),
+                 "created_at": created_at}
+                for flight in flights for admin_id in admins]
+        # other worker may notify the same flight at the same time
+        await db.execute(insert(models.UserNotification).values(rows).on_conflict_do_nothing(
+            index_elements=["flight_id", "user_id"], index_where=text("action = 'start_sale'")))
+        await db.commit()
+        return len(flights)
 
     @staticmethod
     def get_notifications(db: Session, user_id: int):
-        NotificationService.get_start_sale_flights(db)
         return db.query(models.UserNotification).filter(models.UserNotification.is_read == False,
                                                         models.UserNotification.user_id == user_id).order_by(
             models.UserNotification.created_at).all()
@@ -67,3 +80,33 @@ class NotificationService:
             update({"is_read": notification.is_read})
         db.commit()
         return db.query(models.UserNotification).filter(models.UserNotification.id == notification.id).first()
+
+
+class StartSaleNotifier:
+    """ Background task which looks for flights gone on sale, each worker runs one, unique index keeps them apart """
+
+    def __init__(self, interval: int = 30):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await NotificationService.notify_start_sale(db)
+            except Exception as e:
+                print(logging.error(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+start_sale_notifier = StartSaleNotifier()
@@ -1,32 +1,29 @@
 from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
-from db.database import get_db
+from auth.auth_token.auth_context import AuthContext, require_permission
+from db.database import get_async_db
 from pages.views import agents
-from pages.views.currency import get_currency_last_item
+from pages.views.currency import currency_rate_cache
 
 routers = APIRouter()
 
 
 # agents
 @routers.get("/agents/main")
-async def get_agents(db: Session = Depends(get_db),
+async def get_agents(db: AsyncSession = Depends(get_async_db),
                      searching_text: Optional[str] = None,
                      agent_id: Optional[int] = None,
                      page: Optional[int] = None,
                      limit: Optional[int] = None,
-                     jwt: dict = Depends(JWTBearer())):
+                     auth: AuthContext = Depends(require_permission("get_agents"))):
     """ Get all agents and their discounts """
-    if not check_permissions('get_agents', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     try:
-        db_agents, counter = agents.get_agents_discounts(db, agent_id, page, limit, searching_text)
+        db_agents, counter = await agents.get_agents_discounts(db, agent_id, page, limit, searching_text)
         return {
-            "currency": get_currency_last_item(db),
+            "currency": await currency_rate_cache.get(db),
             'agents_count': counter,
             'agents': db_agents
         }
@@ -39,15 +36,13 @@ async def get_agents(db: Session = Depends(get_db),
 async def get_discounts(searching_text: Optional[str] = None,
                         page: Optional[int] = None,
                         limit: Optional[int] = None,
-                        jwt: dict = Depends(JWTBearer()),
-                        db: Session = Depends(get_db)):
+                        auth: AuthContext = Depends(require_permission("get_discounts")),
+                        db: AsyncSession = Depends(get_async_db)):
     """ get all discounts that can be assigned to agents """
-    if not check_permissions('get_discounts', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     try:
-        agent_discount, counter = agents.get_discounts(db, searching_text, page, limit)
+        agent_discount, counter = await agents.get_discounts(db, searching_text, page, limit)
         return {
-            "currency": get_currency_last_item(db),
+            "currency": await currency_rate_cache.get(db),
             'agent_count': counter,
             'agent': agent_discount
         }
@@ -1,10 +1,10 @@
 import logging
 
 from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.database import get_db
-from pages.views.currency import get_currency_last_item
+from db.database import get_async_db
+from pages.views.currency import currency_rate_cache
 
 routers = APIRouter()
 
@@ -21,10 +21,10 @@ def sort_currency_rate(currency_rate):
 
 
 @routers.get("/currency_rate", tags=["pages"])
-async def get_currency_rate(db: Session = Depends(get_db)):
+async def get_currency_rate(db: AsyncSession = Depends(get_async_db)):
     """ Get currency rate from api and update currency rate """
     try:
-        return get_currency_last_item(db)
+        return await currency_rate_cache.get(db)
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
@@ -1,33 +1,35 @@
-from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import date
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
-from db.database import get_db
+from auth.auth_token.auth_context import AuthContext, require_permission
+from db.database import get_async_db
 from crud_models.views.countries import Country
 from crud_models.views.cities import City
 from crud_models.views.airports import Airport
 from crud_models.views.company import Company
 from crud_models.views.flight_guide import FlightGuide
-from pages.views.currency import get_currency_last_item
+from pages.views.currency import currency_rate_cache
+from pages.views.reference import etag_matches, reference_cache
 
 routers = APIRouter()
 
 
 @routers.get("/guide/countries")
-async def get_countries(db: Session = Depends(get_db),
+async def get_countries(request: Request, response: Response,
+                        db: AsyncSession = Depends(get_async_db),
                         searching_text: Optional[str] = None,
                         page: Optional[int] = None,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("get_countries")),
                         limit: Optional[int] = None):
-    if not check_permissions("get_countries", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_countries, counter = Country.get_countries(db, page, limit, searching_text)
+        etag = await reference_cache.etag(db, ["countries"], searching_text, page, limit)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        db_countries, counter = await Country.get_countries(db, page, limit, searching_text)
         return {
             'countries_count': counter,
             'countries': db_countries
@@ -38,16 +40,18 @@ async def get_countries(db: Session = Depends(get_db),
 
 
 @routers.get("/guide/cities")
-async def get_cities(db: Session = Depends(get_db),
+async def get_cities(request: Request, response: Response,
+                     db: AsyncSession = Depends(get_async_db),
                      searching_text: Optional[str] = None,
                      page: Optional[int] = None,
-                     jwt: dict = Depends(JWTBearer()),
+                     auth: AuthContext = Depends(require_permission("get_cities")),
                      limit: Optional[int] = None):
-    if not check_permissions("get_cities", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_cities, counter = City.get_with_countries(db, page, limit, searching_text)
+        etag = await reference_cache.etag(db, ["cities", "countries"], searching_text, page, limit)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        db_cities, counter = await City.get_with_countries(db, page, limit, searching_text)
         return {
             'cities_count': counter,
             'cities': db_cities
@@ -58,16 +62,18 @@ async def get_cities(db: Session = Depends(get_db),
 
 
 @routers.get("/guide/airports")
-async def get_airports(db: Session = Depends(get_db),
+async def get_airports(request: Request, response: Response,
+                       db: AsyncSession = Depends(get_async_db),
                        searching_text: Optional[str] = None,
                        page: Optional[int] = None,
-                       jwt: dict = Depends(JWTBearer()),
+                       auth: AuthContext = Depends(require_permission("get_airports")),
                        limit: Optional[int] = None):
-    if not check_permissions("get_airports", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_airports, counter = Airport.get_with_cities(db, page, limit, searching_text)
+        etag = await reference_cache.etag(db, ["airports", "cities"], searching_text, page, limit)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        db_airports, counter = await Airport.get_with_cities(db, page, limit, searching_text)
         return {
             'airports_count': counter,
             'airports': db_airports
@@ -78,16 +84,18 @@ async def get_airports(db: Session = Depends(get_db),
 
 
 @routers.get("/guide/companies")
-async def get_companies(db: Session = Depends(get_db),
+async def get_companies(request: Request, response: Response,
+                        db: AsyncSession = Depends(get_async_db),
                         searching_text: Optional[str] = None,
                         page: Optional[int] = None,
-                        jwt: dict = Depends(JWTBearer()),
+                        auth: AuthContext = Depends(require_permission("get_airlines")),
                         limit: Optional[int] = None):
-    if not check_permissions("get_airlines", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_companies, counter = Company.get_list(db, page, limit, searching_text)
+        etag = await reference_cache.etag(db, ["companies"], searching_text, page, limit)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        db_companies, counter = await Company.get_companies(db, page, limit, searching_text)
         return {
             'companies_count': counter,
             'companies': db_companies
@@ -98,18 +106,15 @@ async def get_companies(db: Session = Depends(get_db),
 
 
 @routers.get("/guide/flight_guide")
-async def get_flight_guide(db: Session = Depends(get_db),
+async def get_flight_guide(db: AsyncSession = Depends(get_async_db),
                            searching_text: Optional[str] = None,
                            page: Optional[int] = None,
-                           jwt: dict = Depends(JWTBearer()),
+                           auth: AuthContext = Depends(require_permission("get_flight_guides")),
                            limit: Optional[int] = None):
-    if not check_permissions("get_flight_guides", jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
     try:
-        db_companies, counter = FlightGuide.get_detail_flight_guide(db, page, limit, searching_text)
+        db_companies, counter = await FlightGuide.get_detail_flight_guide(db, page, limit, searching_text)
         return {
-            'currency': get_currency_last_item(db),
+            'currency': await currency_rate_cache.get(db),
             'flights_count': counter,
             'flights': db_companies
         }
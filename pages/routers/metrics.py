@@ -0,0 +1,19 @@
+from fastapi import Depends, APIRouter
+
+from auth.auth_token.auth_context import AuthContext, require_permission
+from pages.views.response_cache import response_cache
+from users.views.audit_log import audit_log
+
+routers = APIRouter()
+
+
+@routers.get("/metrics/response_cache", tags=["pages"])
+async def get_response_cache_metrics(auth: AuthContext = Depends(require_permission("get_users"))):
+    """ Hits, misses, 304 answers and hit ratio of response cache of this process """
+    return response_cache.stats()
+
+
+@routers.get("/metrics/audit_log", tags=["pages"])
+async def get_audit_log_metrics(auth: AuthContext = Depends(require_permission("get_users"))):
+    """ Recorded, written, buffered and overflowed user history events of audit log of this process """
+    return audit_log.stats()
@@ -1,56 +1,100 @@
-from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import date
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
-from db.database import get_db
+from auth.auth_token.auth_context import AuthContext, require_permission
+from db.database import get_async_db
 from pages.views import payments
-from pages.views.currency import get_currency_last_item
+from pages.views.export import FORMATS, export_statement, statement_filename
+from pages.views.currency import currency_rate_cache
 
 routers = APIRouter()
 
 
 # payment
 @routers.get("/payments/main")
-async def get_tickets(db: Session = Depends(get_db),
+async def get_tickets(db: AsyncSession = Depends(get_async_db),
                       searching_text: Optional[str] = None,
                       agent_id: Optional[int] = None,
                       from_date: Optional[date] = None,
                       to_date: Optional[date] = None,
                       page: Optional[int] = None,
                       limit: Optional[int] = None,
-                      jwt: dict = Depends(JWTBearer())
+                      cursor: Optional[str] = None,
+                      auth: AuthContext = Depends(require_permission("get_refills"))
                       ):
-    """ get all payments who paid amount of agents for fill the balance """
-    if not check_permissions('get_refills', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    """
+    get all payments who paid amount of agents for fill the balance\n
+    *if page and limit are given payments are paginated by page*\n
+    *if limit and cursor are given payments are paginated by cursor, pass empty cursor for the first page and next_cursor of response for the next one*
+    """
     try:
-        db_payments, counter = payments.get_refill_by_agent_id(db, from_date, to_date, agent_id, page, limit, searching_text)
+        db_payments, counter, next_cursor = await payments.get_refill_by_agent_id(db, from_date, to_date, agent_id, page,
+                                                                                  limit, searching_text, cursor)
         return {
-            'currency': get_currency_last_item(db),
+            'currency': await currency_rate_cache.get(db),
             'payments_count': counter,
-            'payments': db_payments
+            'payments': db_payments,
+            'next_cursor': next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
 
 
 @routers.get("/payments/agents/balance")
-async def get_agent_balances(db: Session = Depends(get_db),
+async def get_agent_balances(db: AsyncSession = Depends(get_async_db),
                              agent_id: Optional[int] = None,
                              page: Optional[int] = None,
                              limit: Optional[int] = None,
-                             jwt: dict = Depends(JWTBearer())):
+                             auth: AuthContext = Depends(require_permission("get_agents_balance"))):
     """ Get all agent balances or by agent id """
-    if not check_permissions('get_agents_balance', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-    db_agent_balances, counter = payments.get_agents_balance(db, agent_id, page, limit)
+    db_agent_balances, counter = await payments.get_agents_balance(db, agent_id, page, limit)
     return {
-        'currency': get_currency_last_item(db),
+        'currency': await currency_rate_cache.get(db),
         'agent_balances_count': counter,
         'agent_balances': db_agent_balances
     }
+
+
+@routers.get("/payments/agents/{agent_id}/statement")
+async def get_agent_statement(agent_id: int,
+                              db: AsyncSession = Depends(get_async_db),
+                              from_date: Optional[date] = None,
+                              to_date: Optional[date] = None,
+                              limit: Optional[int] = None,
+                              cursor: Optional[str] = None,
+                              auth: AuthContext = Depends(require_permission("get_agents_balance"))):
+    """
+    Statement of agent balance: balance at from_date, balance at end of to_date and movements between them\n
+    *movements are paginated by cursor, pass next_cursor of response to get next page*
+    """
+    try:
+        statement = await payments.get_agent_statement(db, agent_id, from_date, to_date, limit, cursor)
+        return {'currency': await currency_rate_cache.get(db), **statement}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(logging.error(e))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+
+@routers.get("/payments/agents/{agent_id}/statement/export")
+async def export_agent_statement(agent_id: int,
+                                 from_date: Optional[date] = None,
+                                 to_date: Optional[date] = None,
+                                 file_format: str = Query("csv", alias="format", regex="^(csv|xlsx)$"),
+                                 auth: AuthContext = Depends(require_permission("get_agents_balance"))):
+    """
+    Download tickets, fines and refills of agent for period as csv or xlsx file\n
+    *file is streamed while it is read from database, period of any length takes the same memory*
+    """
+    filename = statement_filename(agent_id, from_date, to_date, file_format)
+    return StreamingResponse(export_statement(agent_id, from_date, to_date, file_format),
+                             media_type=FORMATS[file_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
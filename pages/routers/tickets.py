@@ -1,41 +1,46 @@
 from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import date
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
-from db.database import get_db
-from pages.views.currency import get_currency_last_item
+from auth.auth_token.auth_context import AuthContext, require_permission
+from db.database import get_async_db
+from pages.views.currency import currency_rate_cache
 from pages.views.tickets import get_tickets_by_flight
 
 routers = APIRouter()
 
 
 @routers.get("/tickets/main")
-async def get_tickets(db: Session = Depends(get_db),
+async def get_tickets(db: AsyncSession = Depends(get_async_db),
                       searching_text: Optional[str] = None,
                       from_date: Optional[date] = None,
                       to_date: Optional[date] = None,
                       agent_id: Optional[int] = None,
                       page: Optional[int] = None,
                       limit: Optional[int] = None,
-                      jwt: dict = Depends(JWTBearer())
+                      cursor: Optional[str] = None,
+                      auth: AuthContext = Depends(require_permission("get_tickets"))
                       ):
-    """ Get tickets by flights where departure date is not past now """
-    if not check_permissions('get_tickets', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    """
+    Get tickets by flights where departure date is not past now\n
+    *if page and limit are given tickets are paginated by page*\n
+    *if limit and cursor are given tickets are paginated by cursor, pass empty cursor for the first page and next_cursor of response for the next one*
+    """
     try:
-        db_tickets, counter = get_tickets_by_flight(db, from_date=from_date, to_date=to_date,
-                                                    page=page, limit=limit,
-                                                    search_text=searching_text, agent_id=agent_id)
+        db_tickets, counter, next_cursor = await get_tickets_by_flight(db, from_date=from_date, to_date=to_date,
+                                                                       page=page, limit=limit, cursor=cursor,
+                                                                       search_text=searching_text, agent_id=agent_id)
         result = {
-            'currency': get_currency_last_item(db),
+            'currency': await currency_rate_cache.get(db),
             'tickets_count': counter,
             'tickets': db_tickets,
+            'next_cursor': next_cursor,
         }
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
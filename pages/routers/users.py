@@ -1,29 +1,26 @@
 from datetime import date
 
 from fastapi import Depends, APIRouter, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
-from db.database import get_db
+from auth.auth_token.auth_context import AuthContext, require_permission
+from db.database import get_async_db
 from pages.views import users
 
 routers = APIRouter()
 
 
 @routers.get("/users/main")
-async def get_users(db: Session = Depends(get_db),
+async def get_users(db: AsyncSession = Depends(get_async_db),
                     searching_text: Optional[str] = None,
                     page: Optional[int] = None,
                     limit: Optional[int] = None,
-                    jwt: dict = Depends(JWTBearer())):
+                    auth: AuthContext = Depends(require_permission("get_users"))):
     """ get all users with then roles """
-    if not check_permissions('get_users', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     try:
-        db_users, counter = users.get_all_users_with_role(db, page, limit, searching_text)
+        db_users, counter = await users.get_all_users_with_role(db, page, limit, searching_text)
 
         return {
             'users_count': counter,
@@ -35,17 +32,15 @@ async def get_users(db: Session = Depends(get_db),
 
 
 @routers.get("/users/roles")
-async def get_roles(db: Session = Depends(get_db),
+async def get_roles(db: AsyncSession = Depends(get_async_db),
                     searching_text: Optional[str] = None,
                     page: Optional[int] = None,
                     limit: Optional[int] = None,
-                    jwt: dict = Depends(JWTBearer())
+                    auth: AuthContext = Depends(require_permission("get_roles"))
                     ):
     """ get all roles that can be assigned to users """
-    if not check_permissions('get_roles', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     try:
-        db_roles, counter = users.get_all_roles(db, page=page, limit=limit, search_text=searching_text)
+        db_roles, counter = await users.get_all_roles(db, page=page, limit=limit, search_text=searching_text)
         return {
             'roles_count': counter,
             'roles': db_roles
@@ -56,24 +51,37 @@ async def get_roles(db: Session = Depends(get_db),
 
 
 @routers.get("/users/history")
-async def get_history(db: Session = Depends(get_db),
+async def get_history(db: AsyncSession = Depends(get_async_db),
                       searching_text: Optional[str] = None,
                       user_id: Optional[int] = None,
                       from_date: Optional[date] = None,
                       to_date: Optional[date] = None,
                       page: Optional[int] = None,
                       limit: Optional[int] = None,
-                      jwt: dict = Depends(JWTBearer())
+                      cursor: Optional[str] = None,
+                      entity: Optional[str] = None,
+                      entity_id: Optional[int] = None,
+                      field: Optional[str] = None,
+                      auth: AuthContext = Depends(require_permission("get_user_history"))
                       ):
-    """ get all history of users """
-    if not check_permissions('get_user_history', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    """
+    get all history of users\n
+    *if page and limit are given history is paginated by page*\n
+    *if limit and cursor are given history is paginated by cursor, pass empty cursor for the first page and next_cursor of response for the next one*\n
+    *entity (flight, ticket, booking), entity_id and field leave updates of that entity or field only,
+     changes of update are in changes: {"entity", "id", "changed", "fields": {"field": [old, new]}}*
+    """
     try:
-        db_history, counter = users.get_all_history(db, page, limit, searching_text, user_id, from_date, to_date)
+        db_history, counter, next_cursor = await users.get_all_history(db, page, limit, searching_text, user_id,
+                                                                       from_date, to_date, cursor, entity, entity_id,
+                                                                       field)
         return {
             'history_count': counter,
-            'history': db_history
+            'history': db_history,
+            'next_cursor': next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
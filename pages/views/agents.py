@@ -1,61 +1,49 @@
 from fastapi import APIRouter
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import traceback
 import logging
 
+from pages.views.pagination import paginate
+from pages.views.query import QueryBuilder
+
 routers = APIRouter()
 
 
-def get_agents_discounts(db: Session, agent_id, page: int, limit: int, searching_text: str = None):
+async def get_agents_discounts(db: AsyncSession, agent_id, page: int, limit: int, searching_text: str = None):
     """ get agents and discounts by agent_id """
     try:
-        query = f"SELECT a.id, a.company_name, u.email, \
+        query = QueryBuilder(
+            select="a.id, a.company_name, u.email, \
                 json_build_object('amount', d.amount, 'name', d.name) AS discount, \
-                a.balance, a.is_on_credit \
-                FROM agents AS a \
+                a.balance, a.is_on_credit",
+            from_="agents AS a \
                 JOIN users AS u ON a.user_id = u.id \
-                JOIN discounts AS d ON a.discount_id = d.id \
-                WHERE a.deleted_at IS NULL "
+                JOIN discounts AS d ON a.discount_id = d.id")
+
+        query.where("a.deleted_at IS NULL")
 
         if agent_id:
-            query += f"AND a.id = {agent_id} "
+            query.where("a.id = :agent_id", agent_id=agent_id)
 
         if searching_text and not searching_text.isdigit():
-            query += f"AND (LOWER(a.company_name) LIKE '%{searching_text}%' \
-                        OR LOWER(u.email) LIKE '%{searching_text}%' \
-                        OR d.name LIKE '%{searching_text}%') "
-
-        counter = db.execute(query).fetchall()
+            query.search(["LOWER(a.company_name)", "LOWER(u.email)", "LOWER(d.name)"], searching_text)
 
-        query += f"ORDER BY a.id "
-        if limit and page:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
+        query.order_by("a.id")
 
-        return db.execute(query).fetchall(), len(counter)
+        return await paginate(db, query.sql(), page, limit, query.params)
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
 
 
-def get_discounts(db: Session, searching_text, page: int, limit: int):
+async def get_discounts(db: AsyncSession, searching_text, page: int, limit: int):
     """ get discounts """
     try:
-        query = f"SELECT d.id, d.name, d.amount \
-                FROM discounts AS d "
-
-        if searching_text is not None:
-            searching_text = searching_text.lower()
-            query += f"WHERE (LOWER(d.name) LIKE '%{searching_text}%' \
-                            OR d.amount::text LIKE '%{searching_text}%') "
-
-        counter = db.execute(query).fetchall()
-
-        query += f"ORDER BY d.amount "
-        if page and limit:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
+        query = QueryBuilder(select="d.id, d.name, d.amount", from_="discounts AS d")
+        query.search(["LOWER(d.name)", "d.amount::text"], searching_text)
+        query.order_by("d.amount")
 
-        return db.execute(query).fetchall(), len(counter)
+        return await paginate(db, query.sql(), page, limit, query.params)
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
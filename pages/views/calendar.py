@@ -0,0 +1,95 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+
+
+class CalendarDay(NamedTuple):
+    """
+    Count of flights of day on sale at moment `at`. It stays right for later moments up to `until`: next on_sale of
+    flight of that day which is not on sale yet or next departure of counted flight, None if nothing changes
+    """
+    loaded: float
+    at: datetime
+    count: int
+    until: Optional[datetime]
+
+    def valid_at(self, moment: datetime) -> bool:
+        return self.at <= moment and (self.until is None or moment <= self.until)
+
+
+class FlightCalendarCache:
+    """
+    Flights on sale of each departure day counted in SQL by one GROUP BY query and kept in process per day.
+    Day expires after ttl, when one of its flights goes on sale or departs, and is dropped by flight views when
+    flight of that day is created, updated or deleted
+    """
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self.days: Dict[date, CalendarDay] = {}
+        self.version = 0
+
+    def invalidate(self, *days: date):
+        self.version += 1
+        for day in days:
+            if isinstance(day, datetime):
+                day = day.date()
+            self.days.pop(day, None)
+
+    def clear(self):
+        self.version += 1
+        self.days.clear()
+
+    def fresh_day(self, day: date, moment: datetime, now: float) -> Optional[CalendarDay]:
+        bucket = self.days.get(day)
+        if bucket is not None and now - bucket.loaded < self.ttl and bucket.valid_at(moment):
+            return bucket
+        return None
+
+    async def load(self, db: AsyncSession, first_day: date, last_day: date,
+                   moment: datetime) -> Dict[date, CalendarDay]:
+        """ Count flights on sale at moment for days from first_day to last_day, days without flights count 0 """
+        version = self.version
+        # literal keeps GROUP BY expression equal to selected one, bound parameter would not be
+        day = func.date_trunc(literal_column("'day'"), models.Flight.departure_date)
+        on_sale = (models.Flight.on_sale < moment) & (models.Flight.departure_date >= moment)
+        rows = (await db.execute(
+            select(day,
+                   func.count().filter(on_sale),
+                   func.min(models.Flight.on_sale).filter(models.Flight.on_sale >= moment),
+                   func.min(models.Flight.departure_date).filter(on_sale)).
+            filter(models.Flight.deleted_at.is_(None),
+                   models.Flight.on_sale.isnot(None),
+                   models.Flight.departure_date.between(datetime.combine(first_day, datetime.min.time()),
+                                                        datetime.combine(last_day, datetime.max.time()))).
+            group_by(day))).all()
+
+        now = time.monotonic()
+        loaded = {first_day + timedelta(days=i): CalendarDay(now, moment, 0, None)
+                  for i in range((last_day - first_day).days + 1)}
+        for departure_day, count, next_on_sale, next_departure in rows:
+            changes = [value for value in (next_on_sale, next_departure) if value is not None]
+            loaded[departure_day.date()] = CalendarDay(now, moment, count, min(changes) if changes else None)
+        # flight changed while query ran, result is returned but not cached
+        if version == self.version:
+            self.days.update(loaded)
+        return loaded
+
+    async def count(self, db: AsyncSession, from_date: datetime, to_date: datetime) -> Dict[date, int]:
+        """ Flights which depart between from_date and to_date and are on sale before from_date, by day """
+        now = time.monotonic()
+        days = [from_date.date() + timedelta(days=i) for i in range((to_date.date() - from_date.date()).days + 1)]
+        buckets = {day: self.fresh_day(day, from_date, now) for day in days}
+        missing = [day for day, bucket in buckets.items() if bucket is None]
+        if missing:
+            loaded = await self.load(db, missing[0], missing[-1], from_date)
+            buckets.update((day, loaded[day]) for day in missing)
+        return {day: buckets[day].count for day in days if buckets[day].count}
+
+
+flight_calendar_cache = FlightCalendarCache()
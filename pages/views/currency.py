@@ -1,14 +1,27 @@
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+import time
+from contextlib import suppress
 from datetime import datetime, timedelta
+from typing import Optional
+
+import requests
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import models
+from db.cache import Cache, cache
+from db.database import AsyncSessionLocal
 from users.currency_rate import get_currency_rate
 
+RATE_MAX_AGE = timedelta(hours=24)
+SHARED_KEY = "currency_rate"
+
 
-def update_currency_rate(db: Session):
-    """ get currency rate from api and update currency rate """
-    currency_rate = get_currency_rate()
-    print(currency_rate)
+async def update_currency_rate(db: AsyncSession, http=requests):
+    """ get currency rate from api and update currency rate, api is called in worker thread """
+    currency_rate = await asyncio.to_thread(get_currency_rate, http)
     db_currency_rate = models.CurrencyRate(
         rub_to_usd=currency_rate['RUBUSD'],
         rub_to_eur=currency_rate['RUBEUR'],
@@ -16,18 +29,100 @@ def update_currency_rate(db: Session):
         updated_at=currency_rate['updated_at']
     )
     db.add(db_currency_rate)
-    db.commit()
-    db.refresh(db_currency_rate)
+    await db.commit()
+    await db.refresh(db_currency_rate)
     return db_currency_rate
 
 
-def get_currency_last_item(db: Session):
+async def get_currency_last_item(db: AsyncSession, http=requests):
     """ Get last currency rate if updated_at <= 24 hours, update currency rate """
-    db_currency_rate = db.query(models.CurrencyRate).order_by(models.CurrencyRate.updated_at.desc()).first()
-    if not db_currency_rate:
-        update_currency_rate(db)
-        get_currency_last_item(db)
-    if db_currency_rate.updated_at <= datetime.now() - timedelta(hours=24):
-        db_currency_rate = update_currency_rate(db)
-
+    db_currency_rate = (await db.execute(
+        select(models.CurrencyRate).order_by(models.CurrencyRate.updated_at.desc()).limit(1))).scalars().first()
+    if db_currency_rate is None or db_currency_rate.updated_at <= datetime.now() - RATE_MAX_AGE:
+        db_currency_rate = await update_currency_rate(db, http)
     return db_currency_rate
+
+
+def dump_rate(rate: models.CurrencyRate) -> str:
+    return json.dumps({"id": rate.id, "rub_to_usd": rate.rub_to_usd, "rub_to_eur": rate.rub_to_eur,
+                       "rub_to_uzs": rate.rub_to_uzs, "updated_at": rate.updated_at.isoformat()})
+
+
+def load_rate(value: str) -> models.CurrencyRate:
+    data = json.loads(value)
+    data["updated_at"] = datetime.fromisoformat(data["updated_at"])
+    return models.CurrencyRate(**data)
+
+
+class CurrencyRateCache:
+    """
+    Last currency rate kept in process, requests are served from memory and background task refreshes it.
+    Refreshed rate is shared with other workers through shared cache, process with stale rate takes it from there
+    before going to database. Only one refresh runs at a time, callers which waited for it get its result
+    """
+
+    def __init__(self, ttl: int = 3600, refresh_interval: int = 600, http=requests, shared: Cache = cache):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.http = http
+        self.shared = shared
+        self.rate: Optional[models.CurrencyRate] = None
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.rate is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    async def get(self, db: AsyncSession):
+        """ Cached rate, it is loaded in request only if refresher has not done it within ttl """
+        if self.is_fresh():
+            return self.rate
+        return await self.refresh(db, shared_first=True)
+
+    async def get_shared(self) -> Optional[models.CurrencyRate]:
+        try:
+            value = await self.shared.get(SHARED_KEY)
+        except Exception as e:
+            print(logging.error(e))
+            return None
+        return load_rate(value) if value else None
+
+    async def refresh(self, db: AsyncSession, shared_first: bool = False):
+        loaded_at = self.loaded_at
+        async with self._lock:
+            if self.rate is not None and self.loaded_at != loaded_at:
+                # other caller refreshed while this one waited for lock
+                return self.rate
+            rate = await self.get_shared() if shared_first else None
+            if rate is None:
+                rate = await get_currency_last_item(db, self.http)
+                try:
+                    await self.shared.set(SHARED_KEY, dump_rate(rate), ex=self.ttl)
+                except Exception as e:
+                    print(logging.error(e))
+            self.rate = rate
+            self.loaded_at = time.monotonic()
+            return self.rate
+
+    async def run_refresher(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                print(logging.error(e))
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run_refresher())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+currency_rate_cache = CurrencyRateCache()
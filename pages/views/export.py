@@ -0,0 +1,202 @@
+# Agent statement export: tickets, fines and refills of agent for period streamed as CSV or XLSX.
+# Rows are read by server-side cursor batch by batch and every batch is written out before the next one is read,
+# so memory does not depend on size of period. XLSX is written by hand with zipfile to avoid extra dependency
+import csv
+import io
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+from sqlalchemy import text
+
+from db.database import AsyncSessionLocal
+
+EXPORT_BATCH = 1000
+COLUMNS = ["type", "created_at", "id", "ticket_number", "flight_number", "passenger", "amount", "currency",
+           "comment"]
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# every branch is read by (agent_id, created_at) index of its table, UNION ALL is merged in order of created_at
+# cancelled tickets are refunded and left out, fines are charged for cancelled tickets so their tickets are not filtered
+STATEMENT = """
+    SELECT 'ticket' AS type, t.created_at, t.id, t.ticket_number, fg.flight_number,
+        concat_ws(' ', t.surname, t.first_name) AS passenger, t.price AS amount, t.currency::text AS currency,
+        t.comment
+    FROM tickets AS t
+    JOIN flights AS f ON f.id = t.flight_id
+    JOIN flight_guides AS fg ON fg.id = f.flight_guide_id
+    WHERE t.agent_id = :agent_id AND t.deleted_at IS NULL AND t.created_at >= :from_date AND t.created_at < :to_date
+    UNION ALL
+    SELECT 'fine', d.created_at, d.id, t.ticket_number, fg.flight_number,
+        concat_ws(' ', t.surname, t.first_name), d.amount, t.currency::text, d.comment
+    FROM agent_debts AS d
+    JOIN tickets AS t ON t.id = d.ticket_id
+    JOIN flights AS f ON f.id = d.flight_id
+    JOIN flight_guides AS fg ON fg.id = f.flight_guide_id
+    WHERE d.agent_id = :agent_id AND d.type = 'fine' AND d.deleted_at IS NULL
+        AND d.created_at >= :from_date AND d.created_at < :to_date
+    UNION ALL
+    SELECT 'refill', r.created_at, r.id, NULL, NULL, NULL, r.amount, NULL, r.comment
+    FROM refills AS r
+    WHERE r.agent_id = :agent_id AND r.deleted_at IS NULL AND r.created_at >= :from_date AND r.created_at < :to_date
+    ORDER BY created_at, type, id
+"""
+
+SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+SHEET_TAIL = '</sheetData></worksheet>'
+XLSX_PARTS = {
+    "[Content_Types].xml":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    "_rels/.rels":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    "xl/workbook.xml":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Statement" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    "xl/_rels/workbook.xml.rels":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+def period(from_date: Optional[date], to_date: Optional[date]):
+    """ Half-open datetime range of days from from_date to to_date inclusive, whole history if not given """
+    start = datetime.combine(from_date, datetime.min.time()) if from_date else datetime.min
+    end = datetime.combine(to_date + timedelta(days=1), datetime.min.time()) if to_date else datetime.max
+    return start, end
+
+
+def cell_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+
+class Chunks:
+    """ Write-only file which keeps written bytes until they are taken, zipfile writes to it without seeking """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class CsvWriter:
+    def __init__(self):
+        self.output = io.StringIO()
+        self.writer = csv.writer(self.output)
+
+    def start(self) -> bytes:
+        # BOM lets Excel open UTF-8 file with cyrillic names
+        self.writer.writerow(COLUMNS)
+        return "\ufeff".encode() + self.take()
+
+    def rows(self, rows: Iterable) -> bytes:
+        self.writer.writerows([cell_value(value) for value in row] for row in rows)
+        return self.take()
+
+    def finish(self) -> bytes:
+        return b""
+
+    def take(self) -> bytes:
+        data = self.output.getvalue().encode()
+        self.output.seek(0)
+        self.output.truncate()
+        return data
+
+
+class XlsxWriter:
+    """ One sheet workbook with inline strings, sheet is deflated into zip as rows come """
+
+    def __init__(self):
+        self.chunks = Chunks()
+        self.zip = zipfile.ZipFile(self.chunks, "w", zipfile.ZIP_DEFLATED)
+        self.sheet = None
+
+    @staticmethod
+    def row_xml(values: list) -> str:
+        cells = []
+        for value in values:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                cells.append(f'<c t="n"><v>{value}</v></c>')
+            else:
+                cells.append(f'<c t="inlineStr"><is><t>{escape(cell_value(value))}</t></is></c>')
+        return f'<row>{"".join(cells)}</row>'
+
+    def start(self) -> bytes:
+        for name, content in XLSX_PARTS.items():
+            self.zip.writestr(name, content)
+        self.sheet = self.zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self.sheet.write((SHEET_HEAD + self.row_xml(COLUMNS)).encode())
+        return self.chunks.take()
+
+    def rows(self, rows: Iterable) -> bytes:
+        self.sheet.write("".join(self.row_xml(list(row)) for row in rows).encode())
+        return self.chunks.take()
+
+    def finish(self) -> bytes:
+        self.sheet.write(SHEET_TAIL.encode())
+        self.sheet.close()
+        self.zip.close()
+        return self.chunks.take()
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter}
+
+
+async def export_statement(agent_id: int, from_date: Optional[date], to_date: Optional[date], file_format: str,
+                           session_factory=AsyncSessionLocal) -> AsyncIterator[bytes]:
+    """
+    Body of statement file chunk by chunk. Uses own session because response is streamed after endpoint returned,
+    server-side cursor reads EXPORT_BATCH rows at a time
+    """
+    writer = WRITERS[file_format]()
+    start, end = period(from_date, to_date)
+    yield writer.start()
+    async with session_factory() as db:
+        result = await db.stream(text(STATEMENT).execution_options(yield_per=EXPORT_BATCH),
+                                 {"agent_id": agent_id, "from_date": start, "to_date": end})
+        async for rows in result.partitions(EXPORT_BATCH):
+            chunk = writer.rows(rows)
+            # deflate keeps small batches of xlsx until it has enough to compress
+            if chunk:
+                yield chunk
+    yield writer.finish()
+
+
+def statement_filename(agent_id: int, from_date: Optional[date], to_date: Optional[date], file_format: str) -> str:
+    dates: List[str] = [str(value) for value in (from_date, to_date) if value]
+    return f"statement_{agent_id}{''.join('_' + value for value in dates)}.{file_format}"
@@ -2,9 +2,13 @@ import logging
 from datetime import date, datetime
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import models
+from pages.views.calendar import flight_calendar_cache
+from pages.views.pagination import paginate
+from pages.views.query import QueryBuilder
+from pages.views.reference import as_dict, reference_cache
+from pages.views.search import search_flights
 
 
 def add_time(from_date, to_date):
@@ -17,126 +21,78 @@ def add_time(from_date, to_date):
     return from_date, to_date
 
 
-def get_dates_range(db: Session, from_date: date, to_date: date):
-    """ Get dates range """
+async def get_dates_range(db: AsyncSession, from_date: date, to_date: date):
+    """ Count flights on sale by departure day, days are served from calendar cache """
     from_date, to_date = add_time(from_date, to_date)
-    return db.query(models.Flight.departure_date).filter(
-        models.Flight.deleted_at.is_(None),
-        models.Flight.on_sale < from_date,
-        models.Flight.departure_date.between(from_date, to_date)).all()
+    return await flight_calendar_cache.count(db, from_date, to_date)
 
 
-def get_flights_and_search(db: Session, searching_text: str, from_date: date, to_date: date, page: int, limit: int):
+def on_sale_in_range(query: QueryBuilder, from_date: date, to_date: date):
+    """ Filter flights which are on sale and depart in range or in future if range is not set """
+    query.where("f.on_sale < :now", now=datetime.now())
+    if from_date and to_date:
+        from_date, to_date = add_time(from_date, to_date)
+        query.where("f.departure_date BETWEEN :from_date AND :to_date", from_date=from_date, to_date=to_date)
+    else:
+        query.where("f.departure_date > :now")
+    return query
+
+
+async def get_flights_and_search(db: AsyncSession, searching_text: str, from_date: date, to_date: date, page: int, limit: int):
     """ Get flights where departure date is between from_date and to_date and search by text """
     try:
-        query = f"SELECT f.id, fg.flight_number, f.departure_date, f.price, f.currency, \
-                    json_build_object( \
-                        'id', a1.id, \
-                        'airport_ru', a1.airport_ru, \
-                        'airport_en', a1.airport_en, \
-                        'airport_uz', a1.airport_uz, \
-                        'code', a1.code \
-                        ) AS from_airport, \
-                    json_build_object( \
-                        'id', a2.id, \
-                        'airport_ru', a2.airport_ru, \
-                        'airport_en', a2.airport_en, \
-                        'airport_uz', a2.airport_uz, \
-                        'code', a2.code \
-                    ) AS to_airport, \
-                f.total_seats, f.left_seats \
-                FROM flights AS f \
-                JOIN flight_guides AS fg ON f.flight_guide_id = fg.id \
-                JOIN airports AS a1 ON fg.from_airport_id = a1.id \
-                JOIN airports AS a2 ON fg.to_airport_id = a2.id \
-                WHERE f.deleted_at IS NULL "
-
-        if from_date and to_date:
-            from_date, to_date = add_time(from_date, to_date)
-            query += f"AND f.on_sale < '{datetime.now()}' \
-                    AND f.departure_date BETWEEN '{from_date}' AND '{to_date}' "
-        else:
-            query += f"AND f.on_sale < '{datetime.now()}' \
-                    AND f.departure_date > '{datetime.now()}' "
-
-        if searching_text:
-            searching_text = searching_text.lower()
-            query += f"AND (LOWER(fg.flight_number) LIKE '%{searching_text}%' \
-                    OR LOWER(a1.airport_ru) LIKE '%{searching_text}%' \
-                    OR LOWER(a1.airport_en) LIKE '%{searching_text}%' \
-                    OR LOWER(a1.airport_uz) LIKE '%{searching_text}%' \
-                    OR LOWER(a2.airport_ru) LIKE '%{searching_text}%' \
-                    OR LOWER(a2.airport_en) LIKE '%{searching_text}%' \
-                    OR LOWER(a2.airport_uz) LIKE '%{searching_text}%' \
-                    OR f.price::text LIKE '%{searching_text}%' \
-                    OR fg.flight_number::text LIKE '%{searching_text}%') "
-
-        query += f"ORDER BY f.departure_date "
-
-        length = len(db.execute(query).fetchall())
-
-        if page and limit:
-            query += f"LIMIT {limit} OFFSET {(page - 1) * limit}"
-
-        return db.execute(query).fetchall(), length
+        query = QueryBuilder(
+            select="f.id, fg.flight_number, f.departure_date, f.price, f.currency, \
+                    fg.from_airport_id AS from_airport, \
+                    fg.to_airport_id AS to_airport, \
+                f.total_seats, f.left_seats",
+            from_="flights AS f \
+                JOIN flight_guides AS fg ON f.flight_guide_id = fg.id")
+
+        query.where("f.deleted_at IS NULL")
+        on_sale_in_range(query, from_date, to_date)
+        search_flights(query, searching_text, numbers=["f.price"])
+        query.order_by("f.departure_date")
+
+        db_flights, counter = await paginate(db, query.sql(), page, limit, query.params)
+        return await reference_cache.with_airports(db, db_flights, "from_airport", "to_airport"), counter
     except Exception as e:
         print(logging.error(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
 
 
-def get_grouped_flight(db: Session,
-                       from_date: date,
-                       to_date: date,
-                       page: int,
-                       limit: int):
+async def get_grouped_flight(db: AsyncSession,
+                             from_date: date,
+                             to_date: date,
+                             page: int,
+                             limit: int):
     """ Get grouped flight by flight_number """
     try:
-        query = f"SELECT fg.flight_number, \
+        query = QueryBuilder(
+            select="fg.flight_number, \
                     json_agg(json_build_object( \
                         'id', f.id, \
                         'flight_number', fg.flight_number, \
                         'departure_date', f.departure_date, \
                         'price', f.price, \
                         'currency', f.currency, \
-                        'from_airport', json_build_object( \
-                            'id', a1.id, \
-                            'airport_ru', a1.airport_ru, \
-                            'airport_en', a1.airport_en, \
-                            'airport_uz', a1.airport_uz, \
-                            'code', a1.code \
-                        ), \
-                        'to_airport', json_build_object( \
-                            'id', a2.id, \
-                            'airport_ru', a2.airport_ru, \
-                            'airport_en', a2.airport_en, \
-                            'airport_uz', a2.airport_uz, \
-                            'code', a2.code \
-                        ), \
+                        'from_airport', fg.from_airport_id, \
+                        'to_airport', fg.to_airport_id, \
                         'total_seats', f.total_seats, \
                         'left_seats', f.left_seats \
-                    )) AS flights \
-                FROM flights AS f \
-                JOIN flight_guides AS fg ON f.flight_guide_id = fg.id \
-                JOIN airports AS a1 ON fg.from_airport_id = a1.id \
-                JOIN airports AS a2 ON fg.to_airport_id = a2.id \
-                WHERE f.deleted_at IS NULL "
-
-        if from_date and to_date:
-            from_date, to_date = add_time(from_date, to_date)
-            query += f"AND f.on_sale < '{datetime.now()}' \
-                    AND f.departure_date BETWEEN '{from_date}' AND '{to_date}' "
-        else:
-            query += f"AND f.on_sale < '{datetime.now()}' \
-                    AND f.departure_date > '{datetime.now()}' "
-
-        query += f"GROUP BY fg.flight_number "
-
-        length = len(db.execute(query).fetchall())
-
-        if page and limit:
-            query += f"LIMIT {limit} OFFSET {(page - 1) * limit}"
-
-        return db.execute(query).fetchall(), length
+                    )) AS flights",
+            from_="flights AS f \
+                JOIN flight_guides AS fg ON f.flight_guide_id = fg.id")
+
+        query.where("f.deleted_at IS NULL")
+        on_sale_in_range(query, from_date, to_date)
+        query.group_by("fg.flight_number")
+
+        groups, counter = await paginate(db, query.sql(), page, limit, query.params)
+        groups = [as_dict(group) for group in groups]
+        for group in groups:
+            group["flights"] = await reference_cache.with_airports(db, group["flights"], "from_airport", "to_airport")
+        return groups, counter
     except Exception as e:
         print(logging.error(e))
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+TOTAL_COUNT = "total_count"
+CURSOR_COLUMN = "cursor_key_{}"
+CURSOR_PARAM = "cursor_{}"
+
+
+def with_total_count(query: str) -> str:
+    """ Add window count of all matched rows to select list of query """
+    return query.replace("SELECT", f"SELECT COUNT(*) OVER() AS {TOTAL_COUNT},", 1)
+
+
+async def paginate(db: AsyncSession, query: str, page: Optional[int] = None, limit: Optional[int] = None,
+                   params: Optional[dict] = None):
+    """
+    Execute query and return page rows with total count of rows in one round trip.
+    Total count is calculated by COUNT(*) OVER() before LIMIT/OFFSET is applied,
+    for grouped queries it is count of groups
+    """
+    params = params or {}
+
+    if not (page and limit):
+        rows = (await db.execute(text(query), params)).fetchall()
+        return rows, len(rows)
+
+    paged_query = with_total_count(query) + " LIMIT :page_limit OFFSET :page_offset"
+    rows = (await db.execute(text(paged_query),
+                             {**params, "page_limit": limit, "page_offset": limit * (page - 1)})).fetchall()
+
+    if rows:
+        total = rows[0]._mapping[TOTAL_COUNT]
+    elif page > 1:
+        # page is out of range so window count has no row to be attached to
+        total = (await db.execute(text(f"SELECT COUNT(*) FROM ({query}) AS q"), params)).scalar()
+    else:
+        total = 0
+
+    return [{key: value for key, value in row._mapping.items() if key != TOTAL_COUNT} for row in rows], total
+
+
+def encode_cursor(values: list) -> str:
+    """ Pack sort key values of last row into opaque cursor """
+    packed = [["dt", value.isoformat()] if isinstance(value, datetime) else ["v", value] for value in values]
+    return base64.urlsafe_b64encode(json.dumps(packed).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """ Unpack cursor created by encode_cursor """
+    try:
+        packed = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [datetime.fromisoformat(value) if kind == "dt" else value for kind, value in packed]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def keyset_filter(keys: list, cursor: Optional[str]):
+    """ Get condition which leaves only rows after cursor in keys order and params for it """
+    if not cursor:
+        return "", {}
+
+    values = decode_cursor(cursor)
+    if len(values) != len(keys):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    names = [CURSOR_PARAM.format(i) for i in range(len(keys))]
+    condition = f"({', '.join(keys)}) > ({', '.join(':' + name for name in names)})"
+    return condition, dict(zip(names, values))
+
+
+async def paginate_by_cursor(db: AsyncSession, query: str, keys: list, limit: int, params: Optional[dict] = None):
+    """
+    Execute query filtered by keyset_filter and ordered by keys, return page rows and cursor of next page.
+    Only limit + 1 rows are read whatever page is, next cursor is None on the last page
+    """
+    columns = [CURSOR_COLUMN.format(i) for i in range(len(keys))]
+    key_select = ", ".join(f"{key} AS {column}" for key, column in zip(keys, columns))
+    paged_query = query.replace("SELECT", f"SELECT {key_select},", 1) + " LIMIT :page_limit"
+    rows = (await db.execute(text(paged_query), {**(params or {}), "page_limit": limit + 1})).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]._mapping[column] for column in columns])
+
+    return [{key: value for key, value in row._mapping.items() if key not in columns} for row in rows], next_cursor
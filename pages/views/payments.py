@@ -1,20 +1,39 @@
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
 import traceback
 import logging
 
 from pages.views.main import add_time
+from pages.views.pagination import paginate, paginate_by_cursor, keyset_filter
+from pages.views.query import QueryBuilder
+
+REFILLS_ORDER = ["r.created_at", "r.id"]
+LEDGER_ORDER = ["l.created_at", "l.id"]
+STATEMENT_LIMIT = 500
+
+# balance of agent at moment is balance of his last ledger entry before it, one index lookup whatever history is
+BALANCE_AT = """
+    SELECT balance FROM ledger_entries
+    WHERE agent_id = :agent_id AND created_at < :at
+    ORDER BY created_at DESC, id DESC LIMIT 1
+"""
 
 
 # get tickets by agent_id
-def get_refill_by_agent_id(db: Session, from_date, to_date, agent_id=None, page=None, limit=None, search_text=None):
-    """ get tickets by departure_date is >= now and on_sale <= now """
+async def get_refill_by_agent_id(db: AsyncSession, from_date, to_date, agent_id=None, page=None, limit=None, search_text=None,
+                                 cursor: str = None):
+    """
+    get tickets by departure_date is >= now and on_sale <= now
+    if cursor (empty for first page) and limit are given without page refills are paginated by cursor
+    and next cursor is returned instead of count
+    """
+    # cursor mode is asked for by cursor parameter (empty for first page), limit alone pages as before
+    by_cursor = cursor is not None and limit is not None and page is None
+    cursor_filter, cursor_params = keyset_filter(REFILLS_ORDER, cursor if by_cursor else None)
     try:
-        if from_date and to_date:
-            from_date, to_date = add_time(from_date, to_date)
-
-        query = f"SELECT r.id, r.created_at, r.amount, r.comment, \
+        query = QueryBuilder(
+            select="r.id, r.created_at, r.amount, r.comment, \
                     json_build_object( \
                         'id', a.id, \
                         'username', a.company_name \
@@ -28,61 +47,92 @@ def get_refill_by_agent_id(db: Session, from_date, to_date, agent_id=None, page=
                         'name_ru', pt.name_ru, \
                         'name_en', pt.name_en, \
                         'name_uz', pt.name_uz \
-                    ) AS payment_type \
-                FROM refills AS r \
+                    ) AS payment_type",
+            from_="refills AS r \
                 JOIN agents AS a ON r.agent_id = a.id \
                 JOIN users AS u ON r.receiver_id = u.id \
-                JOIN payment_types AS pt ON r.payment_type_id = pt.id \
-                WHERE r.deleted_at IS NULL "
+                JOIN payment_types AS pt ON r.payment_type_id = pt.id")
+
+        query.where("r.deleted_at IS NULL")
 
         if from_date and to_date:
-            query += f"AND r.created_at BETWEEN '{from_date}' AND '{to_date}' "
+            from_date, to_date = add_time(from_date, to_date)
+            query.where("r.created_at BETWEEN :from_date AND :to_date", from_date=from_date, to_date=to_date)
         else:
-            query += f"AND r.created_at <= '{datetime.now()}' "
+            query.where("r.created_at <= :now", now=datetime.now())
 
         if agent_id:
-            query += f"AND r.agent_id = {agent_id} "
+            query.where("r.agent_id = :agent_id", agent_id=agent_id)
 
         if search_text and not search_text.isdigit():
-            search_text = search_text.lower()
-            query += f"AND (LOWER(r.comment) LIKE '%{search_text}%' \
-                            OR LOWER(u.username) LIKE '%{search_text}%' \
-                            OR LOWER(a.company_name) LIKE '%{search_text}%') "
+            query.search(["LOWER(r.comment)", "LOWER(u.username)", "LOWER(a.company_name)"], search_text)
 
         if search_text and search_text.isdigit():
-            query += f"AND (r.amount = {search_text}) "
-
-        query += f"ORDER BY r.created_at "
+            query.where("r.amount = :amount", amount=int(search_text))
 
-        payments = db.execute(query).fetchall()
+        query.where(cursor_filter, **cursor_params)
+        query.order_by(", ".join(REFILLS_ORDER))
 
-        if limit and page:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
+        if by_cursor:
+            db_refills, next_cursor = await paginate_by_cursor(db, query.sql(), REFILLS_ORDER, limit, query.params)
+            return db_refills, None, next_cursor
 
-        return db.execute(query).fetchall(), len(payments)
+        db_refills, counter = await paginate(db, query.sql(), page, limit, query.params)
+        return db_refills, counter, None
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
 
 
-def get_agents_balance(db: Session, agent_id: int = None, page: int = None, limit: int = None):
+async def get_agents_balance(db: AsyncSession, agent_id: int = None, page: int = None, limit: int = None):
     """ get agents by agent_id if agent_id is None then get all agents """
     try:
-        query = f"SELECT agents.id, agents.company_name, agents.balance \
-                FROM agents \
-                WHERE agents.deleted_at IS NULL "
+        query = QueryBuilder(select="agents.id, agents.company_name, agents.balance", from_="agents")
+        query.where("agents.deleted_at IS NULL")
 
         if agent_id:
-            query += f"AND  agents.id = {agent_id} "
-
-        query += f"ORDER BY agents.balance "
+            query.where("agents.id = :agent_id", agent_id=agent_id)
 
-        counter = db.execute(query).fetchall()
+        query.order_by("agents.balance")
 
-        if limit and page:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
-
-        return db.execute(text(query)).fetchall(), len(counter)
+        return await paginate(db, query.sql(), page, limit, query.params)
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
+
+
+async def balance_at(db: AsyncSession, agent_id: int, at: datetime) -> int:
+    balance = (await db.execute(text(BALANCE_AT), {"agent_id": agent_id, "at": at})).scalar()
+    return balance or 0
+
+
+async def get_agent_statement(db: AsyncSession, agent_id: int, from_date=None, to_date=None, limit: int = None,
+                              cursor: str = None):
+    """
+    Statement of agent from ledger: balance at start and end of period and movements of period paginated by cursor.
+    Balances come from entries themselves, so only one page of movements is read
+    """
+    limit = min(limit or STATEMENT_LIMIT, STATEMENT_LIMIT)
+    cursor_filter, cursor_params = keyset_filter(LEDGER_ORDER, cursor)
+    start = datetime.combine(from_date, datetime.min.time()) if from_date else None
+    end = datetime.combine(to_date + timedelta(days=1), datetime.min.time()) if to_date else None
+
+    query = QueryBuilder(select="l.id, l.created_at, l.account, l.kind, l.amount, l.balance, l.reference_id",
+                         from_="ledger_entries AS l")
+    query.where("l.agent_id = :agent_id", agent_id=agent_id)
+    if start:
+        query.where("l.created_at >= :from_date", from_date=start)
+    if end:
+        query.where("l.created_at < :to_date", to_date=end)
+    query.where(cursor_filter, **cursor_params)
+    query.order_by(", ".join(LEDGER_ORDER))
+
+    movements, next_cursor = await paginate_by_cursor(db, query.sql(), LEDGER_ORDER, limit, query.params)
+    opening_balance = await balance_at(db, agent_id, start) if start else 0
+    if end:
+        closing_balance = await balance_at(db, agent_id, end)
+    else:
+        closing_balance = (await db.execute(text("SELECT balance FROM agents WHERE id = :agent_id"),
+                                            {"agent_id": agent_id})).scalar() or 0
+    return {"opening_balance": opening_balance, "closing_balance": closing_balance, "movements": movements,
+            "next_cursor": next_cursor}
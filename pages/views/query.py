@@ -0,0 +1,49 @@
+from typing import Optional
+
+
+class QueryBuilder:
+    """
+    Compose raw SELECT statement from parts, all values are passed as bound params.
+    Statement text depends only on which filters are used, not on their values, so it is
+    cached by SQLAlchemy compiled cache and by database plan cache
+    """
+
+    def __init__(self, select: str, from_: str):
+        self.select = select
+        self.from_ = from_
+        self.conditions = []
+        self.group = None
+        self.order = None
+        self.params = {}
+
+    def where(self, condition: str, **params):
+        """ Add condition joined with AND and values of its params """
+        if condition:
+            self.conditions.append(condition)
+        self.params.update(params)
+        return self
+
+    def search(self, columns: list, search_text: Optional[str], param: str = "search_text"):
+        """ Add condition that at least one of columns contains search_text """
+        if search_text:
+            self.where("(" + " OR ".join(f"{column} LIKE :{param}" for column in columns) + ")",
+                       **{param: f"%{search_text.lower()}%"})
+        return self
+
+    def group_by(self, clause: str):
+        self.group = clause
+        return self
+
+    def order_by(self, clause: str):
+        self.order = clause
+        return self
+
+    def sql(self) -> str:
+        query = f"SELECT {self.select} FROM {self.from_} "
+        if self.conditions:
+            query += "WHERE " + " AND ".join(self.conditions) + " "
+        if self.group:
+            query += f"GROUP BY {self.group} "
+        if self.order:
+            query += f"ORDER BY {self.order} "
+        return query
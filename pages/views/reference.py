@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+from db.cache import Cache, cache, run_in_background
+from pages.views.response_cache import response_cache
+
+REFERENCE_TABLES = {
+    "countries": models.Country,
+    "cities": models.City,
+    "airports": models.Airport,
+    "companies": models.Company,
+    "genders": models.Gender,
+    "ticket_classes": models.TicketClass,
+    "ticket_statuses": models.TicketStatus,
+    "payment_types": models.PaymentType,
+    "discounts": models.Discount,
+}
+
+AIRPORT_FIELDS = ["id", "airport_ru", "airport_en", "airport_uz", "code"]
+CITY_FIELDS = ["id", "city_ru", "city_en", "city_uz", "code"]
+COUNTRY_FIELDS = ["id", "country_ru", "country_en", "country_uz", "code"]
+STATUS_FIELDS = ["id", "name_ru", "name_en", "name_uz"]
+VERSION_KEY = "reference:version:{}"
+
+
+def fragment(row: Optional[dict], fields: list) -> dict:
+    """ Same object as json_build_object of fields, all values are null if row is missing """
+    return {field: row[field] if row else None for field in fields}
+
+
+def search_rows(rows: List[dict], search_text: Optional[str], values) -> List[dict]:
+    """ Rows where at least one of values(row) contains search_text, like QueryBuilder.search """
+    if not search_text:
+        return rows
+    search_text = search_text.lower()
+    return [row for row in rows if any(value and search_text in value.lower() for value in values(row))]
+
+
+def page_rows(rows: List[dict], page: Optional[int] = None, limit: Optional[int] = None):
+    """ Page of rows and count of all rows, like paginate """
+    if not (page and limit):
+        return rows, len(rows)
+    return rows[limit * (page - 1):limit * page], len(rows)
+
+
+def as_dict(row) -> dict:
+    return row if isinstance(row, dict) else dict(row._mapping)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """ True if client sent If-None-Match with etag, so response can be 304 """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+class ReferenceDataCache:
+    """
+    Small lookup tables kept in process as rows by id. Table is loaded on first use (or at startup) and dropped by
+    its CRUD views, version of table is digest of its rows, so ETags are equal in all processes with the same data.
+    Views also bump shared version of table, other processes compare it at most once per check_interval and reload
+    changed table. Tables expire after ttl in case shared cache is not reachable
+    """
+
+    def __init__(self, ttl: int = 300, check_interval: float = 1.0, shared: Cache = cache):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.shared = shared
+        self.tables: Dict[str, Dict[int, dict]] = {}
+        self.versions: Dict[str, str] = {}
+        self.shared_versions: Dict[str, Optional[str]] = {}
+        self.loaded_at: Dict[str, float] = {}
+        self.checked_at: Dict[str, float] = {}
+        self.generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, *names: str):
+        self.generation += 1
+        for name in names:
+            self.tables.pop(name, None)
+        response_cache.invalidate("reference")
+        run_in_background(self.publish(names))
+
+    async def publish(self, names):
+        pipeline = self.shared.pipeline()
+        for name in names:
+            pipeline.incr(VERSION_KEY.format(name))
+        await pipeline.execute()
+
+    async def read_shared_versions(self, names) -> Dict[str, Optional[str]]:
+        """ Shared versions of tables, None if shared cache is not reachable """
+        try:
+            pipeline = self.shared.pipeline()
+            for name in names:
+                pipeline.get(VERSION_KEY.format(name))
+            return {name: version or "0" for name, version in zip(names, await pipeline.execute())}
+        except Exception as e:
+            print(logging.error(e))
+            return {name: None for name in names}
+
+    def is_fresh(self, name: str) -> bool:
+        return name in self.tables and time.monotonic() - self.loaded_at[name] < self.ttl
+
+    async def is_current(self, name: str) -> bool:
+        """ False if other process changed table since it was loaded """
+        now = time.monotonic()
+        if now - self.checked_at.get(name, 0.0) < self.check_interval:
+            return True
+        self.checked_at[name] = now
+        version = (await self.read_shared_versions([name]))[name]
+        return version is None or version == self.shared_versions.get(name)
+
+    async def load(self, db: AsyncSession, *names: str):
+        """ Load tables (all if names are not given) with one query per table """
+        generation = self.generation
+        names = list(names or REFERENCE_TABLES)
+        shared_versions = await self.read_shared_versions(names)
+        loaded = {}
+        for name in names:
+            model = REFERENCE_TABLES[name]
+            columns = [column.key for column in model.__table__.columns]
+            result = await db.execute(select(*model.__table__.columns).order_by(model.__table__.c.id))
+            loaded[name] = {row.id: {column: getattr(row, column) for column in columns} for row in result}
+
+        # table changed while query ran, rows are returned but not cached
+        if generation == self.generation:
+            now = time.monotonic()
+            for name, rows in loaded.items():
+                self.tables[name] = rows
+                self.versions[name] = hashlib.md5(
+                    json.dumps(list(rows.values()), default=str).encode()).hexdigest()[:16]
+                self.shared_versions[name] = shared_versions[name]
+                self.loaded_at[name] = now
+                self.checked_at[name] = now
+        return loaded
+
+    async def get(self, db: AsyncSession, name: str) -> Dict[int, dict]:
+        if self.is_fresh(name) and await self.is_current(name):
+            return self.tables[name]
+        loaded_at = self.loaded_at.get(name)
+        async with self._lock:
+            if self.is_fresh(name) and self.loaded_at[name] != loaded_at:
+                # other caller loaded table while this one waited for lock
+                return self.tables[name]
+            return (await self.load(db, name))[name]
+
+    async def rows(self, db: AsyncSession, name: str) -> List[dict]:
+        return list((await self.get(db, name)).values())
+
+    async def etag(self, db: AsyncSession, names: list, *params) -> str:
+        """ ETag of list built from tables and request params """
+        for name in names:
+            await self.get(db, name)
+        key = "|".join([self.versions.get(name, "") for name in names] + [str(param) for param in params])
+        return '"' + hashlib.md5(key.encode()).hexdigest() + '"'
+
+    async def with_airports(self, db: AsyncSession, rows, *columns: str) -> List[dict]:
+        """ Replace airport ids in columns of rows with airport objects """
+        airports = await self.get(db, "airports")
+        return [{**row, **{column: fragment(airports.get(row[column]), AIRPORT_FIELDS) for column in columns}}
+                for row in map(as_dict, rows)]
+
+    async def with_ticket_status(self, db: AsyncSession, rows, column: str = "ticket_status") -> List[dict]:
+        """ Replace ticket status ids in column of rows with localized status objects """
+        statuses = await self.get(db, "ticket_statuses")
+        return [{**row, column: fragment(statuses.get(row[column]), STATUS_FIELDS)} for row in map(as_dict, rows)]
+
+
+reference_cache = ReferenceDataCache()
@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from auth.auth_token.auth_bearer import JWTBearer
+from db.cache import Cache, cache, run_in_background
+
+# path: (ttl in seconds, tags of data which response is built from)
+CACHED_PATHS: Dict[str, Tuple[int, tuple]] = {
+    "/main/flights": (10, ("flights", "tickets", "bookings", "reference")),
+    "/main/flights/grouped": (10, ("flights", "tickets", "bookings", "reference")),
+    "/flights/main": (10, ("flights", "tickets", "bookings", "reference")),
+    "/guide/countries": (60, ("reference",)),
+    "/guide/cities": (60, ("reference",)),
+    "/guide/airports": (60, ("reference",)),
+    "/guide/companies": (60, ("reference",)),
+    "/guide/flight_guide": (60, ("reference", "flights")),
+    "/currency_rate": (60, ()),
+}
+GENERATION_KEY = "response:generation:{}"
+
+bearer = JWTBearer(auto_error=False)
+
+
+class CachedResponse:
+    __slots__ = ("expires_at", "generations", "body", "headers", "media_type", "etag")
+
+    def __init__(self, expires_at: float, generations: tuple, body: bytes, headers: dict, media_type: str,
+                 etag: str):
+        self.expires_at = expires_at
+        self.generations = generations
+        self.body = body
+        self.headers = headers
+        self.media_type = media_type
+        self.etag = etag
+
+
+class ResponseCache:
+    """
+    HTTP middleware which keeps successful GET responses of CACHED_PATHS for their ttl.
+    Key is path, sorted query and permission set of token, so users with the same permissions share responses.
+    Mutations invalidate tags, entry built before its tag was invalidated is a miss. Generation of tag is bumped
+    in process and in shared cache, other processes read shared generations at most once per check_interval, so
+    their entries are dropped by the next request after that. Responses get ETag and If-None-Match is answered with 304
+    """
+
+    def __init__(self, paths: Dict[str, Tuple[int, tuple]] = None, max_entries: int = 2000,
+                 check_interval: float = 1.0, shared: Cache = cache):
+        self.paths = CACHED_PATHS if paths is None else paths
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.shared = shared
+        self.entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self.generations: Dict[str, int] = defaultdict(int)
+        self.shared_generations: Dict[str, str] = {}
+        self.checked_at = 0.0
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "not_modified": 0})
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self.generations[tag] += 1
+        if tags:
+            run_in_background(self.publish(tags))
+
+    async def publish(self, tags):
+        """ Bump shared generations of tags, entries of other processes expire after ttl if it fails """
+        try:
+            pipeline = self.shared.pipeline()
+            for tag in tags:
+                pipeline.incr(GENERATION_KEY.format(tag))
+            await pipeline.execute()
+        except Exception as e:
+            print(logging.error(e))
+
+    async def refresh(self):
+        """ Read shared generations of all tags once per check_interval, last read ones stay if it fails """
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        tags = sorted({tag for _, tags in self.paths.values() for tag in tags})
+        try:
+            pipeline = self.shared.pipeline()
+            for tag in tags:
+                pipeline.get(GENERATION_KEY.format(tag))
+            generations = await pipeline.execute()
+            self.shared_generations = {tag: generation or "0" for tag, generation in zip(tags, generations)}
+        except Exception as e:
+            print(logging.error(e))
+
+    def clear(self):
+        self.entries.clear()
+
+    def snapshot(self, tags: tuple) -> tuple:
+        return tuple((self.generations[tag], self.shared_generations.get(tag, "0")) for tag in tags)
+
+    @staticmethod
+    def permissions_key(request: Request) -> tuple:
+        """ Sorted permissions of valid bearer token, empty for anonymous or invalid token """
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme != "Bearer" or not token:
+            return ()
+        payload = bearer.verify_jwt(token)
+        return tuple(sorted(set(payload.get("permissions") or ()))) if payload else ()
+
+    def key(self, request: Request) -> tuple:
+        query = tuple(sorted((name, value) for name, value in request.query_params.multi_items() if value != ""))
+        return request.url.path, query, self.permissions_key(request)
+
+    def get(self, key: tuple, tags: tuple) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic() or entry.generations != self.snapshot(tags):
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, entry: CachedResponse):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def not_modified(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        return bool(if_none_match) and (if_none_match.strip() == "*" or
+                                        etag in [tag.strip() for tag in if_none_match.split(",")])
+
+    def respond(self, request: Request, entry: CachedResponse, cache_status: str) -> Response:
+        counters = self.counters[request.url.path]
+        if self.not_modified(request, entry.etag):
+            counters["not_modified"] += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers={"ETag": entry.etag, "Cache-Control": entry.headers["cache-control"],
+                                     "X-Cache": cache_status})
+        return Response(content=entry.body, headers={**entry.headers, "X-Cache": cache_status},
+                        media_type=entry.media_type)
+
+    async def __call__(self, request: Request, call_next):
+        rule = self.paths.get(request.url.path)
+        if request.method != "GET" or rule is None:
+            return await call_next(request)
+
+        ttl, tags = rule
+        await self.refresh()
+        key = self.key(request)
+        entry = self.get(key, tags)
+        if entry is not None:
+            self.counters[request.url.path]["hits"] += 1
+            return self.respond(request, entry, "HIT")
+
+        self.counters[request.url.path]["misses"] += 1
+        generations = self.snapshot(tags)
+        response = await call_next(request)
+        if response.status_code != status.HTTP_200_OK:
+            if response.status_code == status.HTTP_304_NOT_MODIFIED:
+                self.counters[request.url.path]["not_modified"] += 1
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = response.headers.get("etag") or '"' + hashlib.md5(body).hexdigest() + '"'
+        headers = {name: value for name, value in response.headers.items()
+                   if name not in ("content-length", "etag", "cache-control")}
+        headers.update({"etag": etag, "cache-control": f"private, max-age={ttl}"})
+        entry = CachedResponse(time.monotonic() + ttl, generations, body, headers, response.media_type, etag)
+        # data changed while response was built, it is served once but not kept
+        if generations == self.snapshot(tags):
+            self.put(key, entry)
+        return self.respond(request, entry, "MISS")
+
+    def stats(self) -> dict:
+        """ Hits, misses, 304 answers and hit ratio by path and in total """
+        paths = {}
+        for path, counters in self.counters.items():
+            requests = counters["hits"] + counters["misses"]
+            paths[path] = {**counters, "hit_ratio": round(counters["hits"] / requests, 4) if requests else 0.0}
+        hits = sum(counters["hits"] for counters in self.counters.values())
+        requests = hits + sum(counters["misses"] for counters in self.counters.values())
+        return {"entries": len(self.entries), "hits": hits, "misses": requests - hits,
+                "hit_ratio": round(hits / requests, 4) if requests else 0.0, "paths": paths}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,55 @@
+from typing import Optional
+
+from pages.views.query import QueryBuilder
+
+# search documents are indexed by pg_trgm GIN indexes (migration 3f9a6c21d7e4),
+# expressions must stay the same as in migration to be used by planner
+TICKET_DOCUMENT = "lower(first_name || ' ' || surname || ' ' || passport || ' ' || ticket_number || ' ' || " \
+                  "coalesce(comment, ''))"
+FLIGHT_GUIDE_DOCUMENT = "lower(flight_number)"
+AIRPORT_DOCUMENT = "lower(airport_ru || ' ' || coalesce(airport_en, '') || ' ' || coalesce(airport_uz, ''))"
+USER_DOCUMENT = "lower(username)"
+TICKET_STATUS_DOCUMENT = "lower(name_ru || ' ' || coalesce(name_en, '') || ' ' || coalesce(name_uz, ''))"
+
+
+def search_param(search_text: str) -> str:
+    """ Pattern for LIKE which matches search_text in any place of document """
+    return f"%{search_text.lower()}%"
+
+
+def flight_guides_matching(param: str) -> str:
+    """ Subquery with ids of flight guides where flight number or one of airports matches """
+    airports = f"SELECT id FROM airports WHERE {AIRPORT_DOCUMENT} LIKE :{param}"
+    return f"SELECT id FROM flight_guides WHERE {FLIGHT_GUIDE_DOCUMENT} LIKE :{param} \
+        OR from_airport_id IN ({airports}) OR to_airport_id IN ({airports})"
+
+
+def search_flights(query: QueryBuilder, search_text: Optional[str], numbers: list, param: str = "search_text"):
+    """
+    Filter flights (alias f) by flight number, airport names or numeric columns.
+    Text is matched by indexed subqueries which run once per query instead of LIKE per joined row
+    """
+    if not search_text:
+        return query
+    conditions = [f"f.flight_guide_id IN ({flight_guides_matching(param)})"]
+    conditions += [f"{column}::text LIKE :{param}" for column in numbers]
+    return query.where("(" + " OR ".join(conditions) + ")", **{param: search_param(search_text)})
+
+
+def search_tickets(query: QueryBuilder, search_text: Optional[str], param: str = "search_text"):
+    """
+    Filter tickets (alias t) by passenger, passport, ticket number, comment, flight number,
+    agent username, status name or flight price
+    """
+    if not search_text:
+        return query
+    conditions = [
+        f"t.id IN (SELECT id FROM tickets WHERE {TICKET_DOCUMENT} LIKE :{param})",
+        f"t.flight_id IN (SELECT f_s.id FROM flights AS f_s \
+            WHERE f_s.flight_guide_id IN (SELECT id FROM flight_guides WHERE {FLIGHT_GUIDE_DOCUMENT} LIKE :{param}) \
+            OR f_s.price::text LIKE :{param})",
+        f"t.agent_id IN (SELECT a_s.id FROM agents AS a_s \
+            WHERE a_s.user_id IN (SELECT id FROM users WHERE {USER_DOCUMENT} LIKE :{param}))",
+        f"t.status_id IN (SELECT id FROM ticket_statuses WHERE {TICKET_STATUS_DOCUMENT} LIKE :{param})",
+    ]
+    return query.where("(" + " OR ".join(conditions) + ")", **{param: search_param(search_text)})
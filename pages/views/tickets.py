@@ -1,24 +1,39 @@
 from fastapi import APIRouter
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import traceback
 import logging
 
 from pages.views.main import add_time
+from pages.views.pagination import paginate, paginate_by_cursor, keyset_filter
+from pages.views.query import QueryBuilder
+from pages.views.reference import reference_cache
+from pages.views.search import search_tickets
 
 routers = APIRouter()
 
+TICKETS_ORDER = ["f.departure_date", "t.created_at", "t.id"]
 
-def get_tickets_by_flight(db: Session, from_date=None, to_date=None,
-                          page=None, limit=None, agent_id: int = None,
-                          flight_id: int = None, search_text=None):
-    """ get tickets by departure_date is >= now and on_sale <= now """
-    try:
-        if from_date and to_date:
-            from_date, to_date = add_time(from_date, to_date)
 
-        query = f"SELECT t.id, t.created_at, t.ticket_number, \
+async def get_tickets_by_flight(db: AsyncSession, from_date=None, to_date=None,
+                                page=None, limit=None, agent_id: int = None,
+                                flight_id: int = None, search_text=None, cursor: str = None):
+    """
+    get tickets by departure_date is >= now and on_sale <= now
+    if cursor (empty for first page) and limit are given without page tickets are paginated by cursor
+    and next cursor is returned instead of count
+    latest agent debt of ticket is one backward scan of ix_agent_debts_ticket_id per ticket row, tickets without
+    debt (or whose debts are archived) are kept with empty debt by LEFT JOIN,
+    debts are not older than ticket, so created_at >= t.created_at lets executor prune partitions of agent_debts
+    before ticket month at run time, otherwise every monthly partition would be probed for every ticket,
+    tickets without created_at probe all partitions
+    """
+    # cursor mode is asked for by cursor parameter (empty for first page), limit alone pages as before
+    by_cursor = cursor is not None and limit is not None and page is None
+    cursor_filter, cursor_params = keyset_filter(TICKETS_ORDER, cursor if by_cursor else None)
+    try:
+        query = QueryBuilder(
+            select="t.id, t.created_at, t.ticket_number, \
                         t.passport, t.price, t.currency, \
                         json_build_object( \
                             'id', f.id, \
@@ -30,63 +45,49 @@ def get_tickets_by_flight(db: Session, from_date=None, to_date=None,
                         CONCAT(t.first_name, ' ', t.surname) AS passenger, \
                         u.username AS agent, \
                         t.comment, t.is_booked, \
-                        json_build_object( \
-                            'id', ts.id, \
-                            'name_ru', ts.name_ru, \
-                            'name_en', ts.name_en, \
-                            'name_uz', ts.name_uz \
-                        ) AS ticket_status, \
+                        t.status_id AS ticket_status, \
                         json_build_object( \
                             'id', ad.id, \
                             'amount', ad.amount, \
-                            'comment', ad.comment) AS agent_debt \
-                    FROM tickets AS t \
+                            'comment', ad.comment) AS agent_debt",
+            from_="tickets AS t \
                     JOIN flights AS f ON t.flight_id = f.id \
                     JOIN flight_guides AS fg ON f.flight_guide_id = fg.id \
                     JOIN agents AS a ON t.agent_id = a.id \
                     JOIN users AS u ON a.user_id = u.id \
-                    JOIN ticket_statuses AS ts ON t.status_id = ts.id \
-                    JOIN agent_debts AS ad ON t.id = ad.ticket_id AND ad.id = ( \
-                        SELECT id FROM agent_debts WHERE ticket_id = t.id ORDER BY id DESC LIMIT 1 \
-                    ) \
-                    WHERE f.deleted_at IS NULL "
+                    LEFT JOIN LATERAL ( \
+                        SELECT id, amount, comment FROM agent_debts \
+                        WHERE ticket_id = t.id AND (t.created_at IS NULL OR created_at >= t.created_at) \
+                        ORDER BY id DESC LIMIT 1 \
+                    ) AS ad ON true")
+
+        query.where("f.deleted_at IS NULL")
 
         if from_date and to_date:
-            query += f"AND f.departure_date BETWEEN '{from_date}' AND '{to_date}' "
-            if from_date and from_date.timestamp() >= datetime.now().timestamp():
-                query += f"AND f.on_sale <= '{from_date}' "
+            from_date, to_date = add_time(from_date, to_date)
+            query.where("f.departure_date BETWEEN :from_date AND :to_date", from_date=from_date, to_date=to_date)
+            if from_date.timestamp() >= datetime.now().timestamp():
+                query.where("f.on_sale <= :from_date")
         else:
-            query += f"AND f.departure_date >= '{datetime.now()}' \
-                     AND f.on_sale <= '{datetime.now()}' "
+            query.where("f.departure_date >= :now AND f.on_sale <= :now", now=datetime.now())
 
         if agent_id:
-            query += f"AND t.agent_id = {agent_id} "
+            query.where("t.agent_id = :agent_id", agent_id=agent_id)
 
         if flight_id:
-            query += f"AND t.flight_id = {flight_id} "
+            query.where("t.flight_id = :flight_id", flight_id=flight_id)
 
-        if search_text:
-            search_text = search_text.lower()
-            query += f"AND (fg.flight_number::text LIKE '%{search_text}%' \
-                            OR LOWER(fg.flight_number) LIKE '%{search_text}%' \
-                            OR LOWER(t.first_name) LIKE '%{search_text}%' \
-                            OR LOWER(t.surname) LIKE '%{search_text}%' \
-                            OR LOWER(t.passport) LIKE '%{search_text}%' \
-                            OR t.ticket_number::text LIKE '%{search_text}%' \
-                            OR LOWER(u.username) LIKE '%{search_text}%' \
-                            OR LOWER(t.comment) LIKE '%{search_text}%' \
-                            OR LOWER(ts.name_ru) LIKE '%{search_text}%' \
-                            OR LOWER(ts.name_en) LIKE '%{search_text}%' \
-                            OR LOWER(ts.name_uz) LIKE '%{search_text}%' \
-                            OR f.price::text LIKE '%{search_text}%' ) "
+        search_tickets(query, search_text)
 
-        query += f"ORDER BY f.departure_date, t.created_at "
+        query.where(cursor_filter, **cursor_params)
+        query.order_by(", ".join(TICKETS_ORDER))
 
-        counter = db.execute(text(query)).fetchall()
+        if by_cursor:
+            db_tickets, next_cursor = await paginate_by_cursor(db, query.sql(), TICKETS_ORDER, limit, query.params)
+            return await reference_cache.with_ticket_status(db, db_tickets), None, next_cursor
 
-        if limit is not None and page is not None:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
-        return db.execute(text(query)).fetchall(), len(counter)
+        db_tickets, counter = await paginate(db, query.sql(), page, limit, query.params)
+        return await reference_cache.with_ticket_status(db, db_tickets), counter, None
 
     except Exception as e:
         print(logging.error(traceback.format_exc()))
@@ -1,50 +1,48 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
 
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import traceback
 import logging
 
 from pages.views.main import add_time
+from pages.views.pagination import paginate, paginate_by_cursor, keyset_filter
+from pages.views.query import QueryBuilder
 
+# user_history is partitioned by month of created_at, pages are read partition by partition in this order
+HISTORY_ORDER = ["h.created_at", "h.id"]
 
-def get_all_users_with_role(db: Session, page: int, limit: int, search_text=None):
+
+async def get_all_users_with_role(db: AsyncSession, page: int, limit: int, search_text=None):
     """ get all passengers with role """
     try:
-        query = f"SELECT u.id, u.username, u.email, \
+        query = QueryBuilder(
+            select="u.id, u.username, u.email, \
                     json_build_object( \
                         'id', r.id, \
                         'title_ru', r.title_ru, \
                         'title_en', r.title_en, \
                         'title_uz', r.title_uz \
-                    ) AS role \
-                FROM users AS u \
-                JOIN roles AS r ON u.role_id = r.id \
-                WHERE u.deleted_at IS NULL "
-
-        if search_text is not None:
-            query += f"AND (u.username LIKE '%{search_text}%' \
-                            OR u.email LIKE '%{search_text}%' \
-                            OR r.title_ru LIKE '%{search_text}%' \
-                            OR r.title_en LIKE '%{search_text}%' \
-                            OR r.title_uz LIKE '%{search_text}%') "
+                    ) AS role",
+            from_="users AS u \
+                JOIN roles AS r ON u.role_id = r.id")
 
-        counter = db.execute(query).fetchall()
+        query.where("u.deleted_at IS NULL")
+        query.search(["LOWER(u.username)", "LOWER(u.email)", "LOWER(r.title_ru)", "LOWER(r.title_en)",
+                      "LOWER(r.title_uz)"], search_text)
+        query.order_by("u.id")
 
-        query += f"ORDER BY u.id "
-        if limit and page:
-            query += f"LIMIT {limit} OFFSET {limit * (page - 1)}"
-
-        return db.execute(text(query)).fetchall(), len(counter)
+        return await paginate(db, query.sql(), page, limit, query.params)
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
 
 
-def get_all_roles(db: Session, page: int, limit: int, search_text=None):
+async def get_all_roles(db: AsyncSession, page: int, limit: int, search_text=None):
     """ get all roles """
     try:
-        query = f"SELECT r.*, COUNT(rp.id) AS permissions_count,\
+        query = QueryBuilder(
+            select="r.*, COUNT(rp.id) AS permissions_count,\
                 COALESCE(json_agg(\
                     jsonb_build_object(\
                         'id', p.id,\
@@ -52,68 +50,71 @@ def get_all_roles(db: Session, page: int, limit: int, search_text=None):
                         'title_ru', p.title_ru, \
                         'title_en', p.title_en, \
                         'title_uz', p.title_uz, \
-                        'descriptions', p.description)) FILTER (WHERE p.id IS NOT NULL), '[]') AS permissions \
-                FROM roles AS r \
+                        'descriptions', p.description)) FILTER (WHERE p.id IS NOT NULL), '[]') AS permissions",
+            from_="roles AS r \
                 LEFT JOIN role_permissions rp ON r.id = rp.role_id \
-                LEFT JOIN permissions p ON rp.permission_id = p.id \
-                WHERE r.id IS NOT NULL \
-                GROUP BY r.id "
-
-        if search_text is not None:
-            search_text = search_text.lower()
-            query += f"WHERE (LOWER(r.title_ru) LIKE '%{search_text}%' \
-                            OR LOWER(r.title_en) LIKE '%{search_text}%' \
-                            OR LOWER(r.title_uz) LIKE '%{search_text}%' \
-                            OR LOWER(p.title_ru) LIKE '%{search_text}%' \
-                            OR LOWER(p.title_en) LIKE '%{search_text}%' \
-                            OR LOWER(p.title_uz) LIKE '%{search_text}%' \
-                            OR LOWER(p.alias) LIKE '%{search_text}%') "
+                LEFT JOIN permissions p ON rp.permission_id = p.id")
 
+        query.where("r.id IS NOT NULL")
+        query.search(["LOWER(r.title_ru)", "LOWER(r.title_en)", "LOWER(r.title_uz)", "LOWER(p.title_ru)",
+                      "LOWER(p.title_en)", "LOWER(p.title_uz)", "LOWER(p.alias)"], search_text)
+        query.group_by("r.id")
+        query.order_by("r.id")
 
-        counter = db.execute(query).fetchall()
-
-        if limit is not None and page is not None:
-            query += f"ORDER BY r.id \
-                    LIMIT {limit} OFFSET {limit * (page - 1)}"
-
-        return db.execute(text(query)).fetchall(), len(counter)
+        return await paginate(db, query.sql(), page, limit, query.params)
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
 
 
-def get_all_history(db: Session, page: int, limit: int, search_text=None, user_id=None, from_date=None, to_date=None):
-    """ get all history """
+async def get_all_history(db: AsyncSession, page: int, limit: int, search_text=None, user_id=None, from_date=None, to_date=None,
+                          cursor: str = None, entity: str = None, entity_id: int = None, field: str = None):
+    """
+    get all history
+    if cursor (empty for first page) and limit are given without page history is paginated by cursor
+    and next cursor is returned instead of count
+    entity, entity_id and field filter changes of updates by containment, which is served by GIN index
+    """
+    # cursor mode is asked for by cursor parameter (empty for first page), limit alone pages as before
+    by_cursor = cursor is not None and limit is not None and page is None
+    cursor_filter, cursor_params = keyset_filter(HISTORY_ORDER, cursor if by_cursor else None)
     try:
-        query = f"SELECT h.id, h.action, h.extra_info, h.created_at, \
+        query = QueryBuilder(
+            select="h.id, h.action, h.extra_info, h.changes, h.created_at, \
                     json_build_object( \
                         'id', u.id, \
                         'username', u.username, \
                         'email', u.email \
-                    ) AS user \
-                FROM user_history AS h \
-                JOIN users AS u ON h.user_id = u.id "
+                    ) AS user",
+            from_="user_history AS h \
+                JOIN users AS u ON h.user_id = u.id")
 
-        if search_text is not None:
-            search_text = search_text.lower()
-            query += f"WHERE (LOWER(h.extra_info) LIKE '%{search_text}%' \
-                            OR LOWER(u.username) LIKE '%{search_text}%' \
-                            OR LOWER(u.email) LIKE '%{search_text}%') "
+        query.search(["LOWER(h.extra_info)", "LOWER(u.username)", "LOWER(u.email)"], search_text)
 
         if user_id is not None:
-            query += f"AND h.user_id = {user_id} "
+            query.where("h.user_id = :user_id", user_id=user_id)
+
+        changes = {key: value for key, value in
+                   (("entity", entity), ("id", entity_id), ("changed", [field] if field else None)) if value is not None}
+        if changes:
+            query.where("h.changes @> CAST(:changes AS jsonb)", changes=json.dumps(changes))
 
-        if from_date and to_date:
-            query += f"AND h.created_at BETWEEN '{datetime.combine(from_date, datetime.min.time())}' \
-                        AND '{datetime.combine(to_date, datetime.max.time())}' "
+        # each bound prunes partitions outside of it
+        if from_date:
+            query.where("h.created_at >= :from_date", from_date=datetime.combine(from_date, datetime.min.time()))
+        if to_date:
+            query.where("h.created_at < :to_date",
+                        to_date=datetime.combine(to_date + timedelta(days=1), datetime.min.time()))
 
-        counter = db.execute(query).fetchall()
+        query.where(cursor_filter, **cursor_params)
+        query.order_by(", ".join(HISTORY_ORDER))
 
-        if limit is not None and page is not None:
-            query += f"ORDER BY h.id \
-                    LIMIT {limit} OFFSET {limit * (page - 1)}"
+        if by_cursor:
+            db_history, next_cursor = await paginate_by_cursor(db, query.sql(), HISTORY_ORDER, limit, query.params)
+            return db_history, None, next_cursor
 
-        return db.execute(text(query)).fetchall(), len(counter)
+        db_history, counter = await paginate(db, query.sql(), page, limit, query.params)
+        return db_history, counter, None
     except Exception as e:
         print(logging.error(traceback.format_exc()))
         print(logging.error(e))
@@ -4,12 +4,13 @@ from datetime import datetime
 from requests.structures import CaseInsensitiveDict
 
 
-def send_msg_to_telegram(limit):
+def send_msg_to_telegram(limit, http=requests):
     url = f"https://api.telegram.org/bot5261757413:AAGFf36Piy1Wqim32QJ8es09AltGXakbZ-4/sendMessage?chat_id=256841597&text={limit}"
-    requests.request("POST", url)
+    http.request("POST", url)
 
 
-def get_currency_rate():
+def get_currency_rate(http=requests):
+    """ http is requests module or any client with same request method, e.g. requests.Session or test stub """
     # url = "https://api.apilayer.com/currency_data/live?source=RUB&currencies=USD,EUR,UZS"
     url = "https://api.currencyapi.com/v3/latest?currencies=EUR%2CUSD%2CUZS&base_currency=RUB"
 
@@ -20,12 +21,12 @@ def get_currency_rate():
     headers = CaseInsensitiveDict()
     headers["apikey"] = "ojPAu3Qj3VAKHGFSBZQ7zz2jhJPqJriUzV2DiLgO"
 
-    response = requests.request("GET", url, headers=headers, data=payload)
+    response = http.request("GET", url, headers=headers, data=payload)
     result = response.json()
 
     # rate = result["quotes"]
     limit = response.headers["x-ratelimit-remaining-quota-month"]
-    send_msg_to_telegram(limit)
+    send_msg_to_telegram(limit, http)
 
     rate = {
         "RUBUSD": result["data"]["USD"]["value"],
@@ -3,8 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from db.database import get_db
 from users.schemas import agents as schemas
 from users.views.agents import Agent, AgentDebt
@@ -40,11 +39,8 @@ async def get_agent(agent_id: int,
 
 @routers.post("/agent", tags=["agents"])
 async def create_agent(agent: schemas.AgentCreate,
-                       jwt: dict = Depends(JWTBearer()),
+                       auth: AuthContext = Depends(require_permission("create_agent")),
                        db: Session = Depends(get_db)):
-    if not check_permissions('create_agent', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         if Agent.get_by_email(db, agent.email):
             raise ValueError("This user is already an agent")
@@ -59,11 +55,8 @@ async def create_agent(agent: schemas.AgentCreate,
 @routers.patch("/agent/{agent_id}", tags=["agents"])
 async def update_agent(agent_id: int,
                        agent: schemas.AgentUpdate,
-                       jwt: dict = Depends(JWTBearer()),
+                       auth: AuthContext = Depends(require_permission("update_agent")),
                        db: Session = Depends(get_db)):
-    if not check_permissions('update_agent', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_agent = Agent.get_by_id_without_join(db, agent_id)
         old_agent, old_user = db_agent
@@ -81,11 +74,8 @@ async def update_agent(agent_id: int,
 
 @routers.delete("/agent/{agent_id}", tags=["agents"])
 async def delete_agent(agent_id: int,
-                       jwt: dict = Depends(JWTBearer()),
+                       auth: AuthContext = Depends(require_permission("delete_agent")),
                        db: Session = Depends(get_db)):
-    if not check_permissions('delete_agent', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_agent = Agent.get_by_id_without_join(db, agent_id)
         if db_agent[0] is None:
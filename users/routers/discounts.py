@@ -3,8 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 import logging
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from db.database import get_db
 from users.schemas import discounts as schemas
 from users.views.discounts import Discount
@@ -39,11 +38,8 @@ async def get_discount(discount_id: int, db: Session = Depends(get_db)):
 
 @routers.post("/discount", tags=["discounts"])
 async def create_discount(discount: schemas.DiscountCreate,
-                          jwt: dict = Depends(JWTBearer()),
+                          auth: AuthContext = Depends(require_permission("create_discount")),
                           db: Session = Depends(get_db)):
-    if not check_permissions('create_discount', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         return schemas.Discount.from_orm(Discount.create(discount, db))
     except Exception as e:
@@ -54,11 +50,8 @@ async def create_discount(discount: schemas.DiscountCreate,
 @routers.patch("/discount/{discount_id}", tags=["discounts"])
 async def update_discount(discount_id: int,
                           discount: schemas.DiscountUpdate,
-                          jwt: dict = Depends(JWTBearer()),
+                          auth: AuthContext = Depends(require_permission("update_discount")),
                           db: Session = Depends(get_db)):
-    if not check_permissions('update_discount', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_discount = Discount.get_by_id(discount_id, db)
         if db_discount is None:
@@ -73,11 +66,8 @@ async def update_discount(discount_id: int,
 
 @routers.delete("/discount/{discount_id}", tags=["discounts"])
 async def delete_discount(discount_id: int,
-                          jwt: dict = Depends(JWTBearer()),
+                          auth: AuthContext = Depends(require_permission("delete_discount")),
                           db: Session = Depends(get_db)):
-    if not check_permissions('delete_discount', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_discount = Discount.get_by_id(discount_id, db)
         if db_discount is None:
@@ -2,8 +2,7 @@ from fastapi import Depends, APIRouter, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from db.database import get_db
 from users.schemas import roles as schemas
 from users.views.roles import Role
@@ -32,21 +31,16 @@ async def get_role(role_id: int,
 
 @routers.post("/role", tags=["roles"])
 async def create_role(role: schemas.RoleCreate,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("create_role")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('create_role', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     return Role.create(db, role)
 
 
 @routers.patch("/role/{role_id}", tags=["roles"])
 async def update_role(role_id: int,
                       role: schemas.RoleUpdate,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("update_role")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('update_role', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_role = Role.get_by_id(db, role_id)
         if db_role is not None:
@@ -59,11 +53,8 @@ async def update_role(role_id: int,
 
 @routers.delete("/role/{role_id}", tags=["roles"])
 async def delete_role(role_id: int,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("delete_role")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('delete_role', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_role = Role.get_role_by_id(db, role_id)
         if db_role is None:
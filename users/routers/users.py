@@ -4,8 +4,7 @@ from fastapi import Depends, APIRouter, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from auth.auth_token.auth_bearer import JWTBearer
-from auth.auth_token.auth_handler import check_permissions
+from auth.auth_token.auth_context import AuthContext, require_permission
 from db.database import get_db
 from users.schemas import users as schemas
 from users.views.users import User
@@ -38,11 +37,8 @@ async def get_user(
 
 @routers.post("/user", tags=["users"])
 async def create_user(user: schemas.UserCreate,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("create_user")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('create_user', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_user = User.get_by_email(db, user.email)
         if not db_user:
@@ -58,11 +54,8 @@ async def create_user(user: schemas.UserCreate,
 @routers.patch("/user/{user_id}", tags=["users"])
 async def update_user(user_id: int,
                       user: schemas.UserUpdate,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("update_user")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('update_user', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_user = User.get_by_id(db, user_id)
         if db_user is None:
@@ -83,11 +76,8 @@ async def update_user(user_id: int,
 
 @routers.delete("/user/{user_id}", tags=["users"])
 async def delete_user(user_id: int,
-                      jwt: dict = Depends(JWTBearer()),
+                      auth: AuthContext = Depends(require_permission("delete_user")),
                       db: Session = Depends(get_db)):
-    if not check_permissions('delete_user', jwt):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
     try:
         db_user = User.get_by_id(db, user_id)
         if db_user is not None:
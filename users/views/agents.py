@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from auth.hashing import decode_password, encode_password
 from db import models
 from users.schemas import agents as schemas
+from users.views.ledger import Ledger
 from users.views.users import User
 from users.schemas.users import UserCreate, UserUpdate
 
@@ -56,9 +57,13 @@ class Agent:
         agent.pop('email')
         agent.pop('password')
         agent['user_id'] = user.id
+        balance = int(agent.pop('balance') or 0)
 
-        db_agent = models.Agent(**agent)
+        db_agent = models.Agent(**agent, balance=0)
         db.add(db_agent)
+        db.flush()
+        # opening entry even for zero balance, statements start from it
+        db.execute(Ledger.post(db_agent.id, balance, 'adjustment', 'opening'))
         db.commit()
         db.refresh(db_agent)
         return db_agent
@@ -86,7 +91,12 @@ class Agent:
             )
             User.update(db, old_agent.user_id, user_update)
 
-        for key, value in agent.dict().items():
+        values = agent.dict()
+        balance = values.pop('balance')
+        if balance is not None and int(balance) != (old_agent.balance or 0):
+            db.execute(Ledger.post(old_agent.id, int(balance) - (old_agent.balance or 0), 'adjustment', 'adjustment'))
+
+        for key, value in values.items():
             if value is not None:
                 setattr(old_agent, key, value)
         db.commit()
@@ -0,0 +1,152 @@
+# Write-behind audit log: user history events are kept in process and written by background task in batches,
+# so write endpoints do not pay for second transaction. Events which do not fit in buffer are written by caller
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import suppress
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert
+
+from db import models
+from db.database import AsyncSessionLocal
+
+audit_log_mode = os.getenv('audit_log_mode') or 'write_behind'
+
+
+class AuditLog:
+    """
+    Bounded buffer of user history events and task which flushes it with one multi-row INSERT per batch.
+    record is safe to call from any thread, events of failed flush go back to buffer and are retried,
+    events which still fail after max_attempts are written one by one and dropped if they fail alone
+    """
+
+    def __init__(self, max_events: int = 10000, batch_size: int = 500, interval: float = 0.5, max_attempts: int = 3,
+                 session_factory=AsyncSessionLocal):
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.failures = 0
+        self.session_factory = session_factory
+        self.events: deque = deque()
+        self.lock = threading.Lock()
+        self.counters = {"recorded": 0, "written": 0, "overflow": 0, "failed_flushes": 0, "dropped": 0}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def record(self, user_id: int, action: str, extra_info: Optional[str], changes: Optional[dict] = None) -> bool:
+        """ Queue event, False if pipeline is not running or buffer is full and caller has to write it itself """
+        if not self.running:
+            return False
+        with self.lock:
+            if len(self.events) >= self.max_events:
+                self.counters["overflow"] += 1
+                return False
+            self.events.append({"user_id": user_id, "action": action, "extra_info": extra_info, "changes": changes,
+                                "created_at": datetime.utcnow()})
+            self.counters["recorded"] += 1
+            full = len(self.events) >= self.batch_size
+        if full:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def take(self) -> list:
+        with self.lock:
+            return [self.events.popleft() for _ in range(min(self.batch_size, len(self.events)))]
+
+    def put_back(self, batch: list):
+        with self.lock:
+            self.events.extendleft(reversed(batch))
+
+    async def write(self, rows: list):
+        async with self.session_factory() as db:
+            await db.execute(insert(models.UserHistory).values(rows))
+            await db.commit()
+
+    async def write_one_by_one(self, batch: list) -> int:
+        """ Write rows of batch which keeps failing one by one, drop rows which still fail. Returns written rows """
+        written = 0
+        for row in batch:
+            try:
+                await self.write([row])
+                written += 1
+            except Exception as e:
+                self.counters["dropped"] += 1
+                print(logging.error(f"audit log event dropped {row}: {e}"))
+        return written
+
+    async def flush(self, max_attempts: Optional[int] = None) -> int:
+        """
+        Write buffered events batch by batch, returns number of written events. Failed batch goes back to buffer,
+        after max_attempts failures in a row it is written row by row, so one bad row does not block the rest
+        """
+        max_attempts = max_attempts or self.max_attempts
+        written = 0
+        while True:
+            batch = self.take()
+            if not batch:
+                return written
+            try:
+                await self.write(batch)
+                self.failures = 0
+                count = len(batch)
+            except Exception:
+                self.failures += 1
+                self.counters["failed_flushes"] += 1
+                if self.failures < max_attempts:
+                    self.put_back(batch)
+                    raise
+                self.failures = 0
+                count = await self.write_one_by_one(batch)
+            written += count
+            self.counters["written"] += count
+
+    async def run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(logging.error(e))
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop background task and write what is left in buffer. There is no later flush to retry in,
+        so failed batch is written row by row at once and number of lost events is logged
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        dropped = self.counters["dropped"]
+        try:
+            await self.flush(max_attempts=1)
+        except Exception as e:
+            print(logging.error(e))
+        lost = self.counters["dropped"] - dropped + len(self.events)
+        if lost:
+            print(logging.error(f"audit log lost {lost} events on shutdown"))
+
+    def stats(self) -> dict:
+        return {**self.counters, "buffered": len(self.events)}
+
+
+audit_log = AuditLog()
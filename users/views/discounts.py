@@ -3,6 +3,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from db import models
+from pages.views.reference import reference_cache
 from users.schemas import discounts as schemas
 
 
@@ -26,6 +27,7 @@ class Discount:
         db.add(db_discount)
         db.commit()
         db.refresh(db_discount)
+        reference_cache.invalidate("discounts")
         return db_discount
 
     @staticmethod
@@ -34,10 +36,12 @@ class Discount:
             if value is not None:
                 setattr(db_discount, key, value)
         db.commit()
+        reference_cache.invalidate("discounts")
         return db_discount
 
     @staticmethod
     def delete(db_discount: models.Discount, db: Session):
         db.delete(db_discount)
         db.commit()
+        reference_cache.invalidate("discounts")
         return db_discount
@@ -0,0 +1,77 @@
+# Agent ledger: every change of agent balance is an append-only entry which moves amount between agent account
+# and a contra account (cash, sales, fines, bookings, adjustment) and keeps agent balance right after it.
+# agents.balance stays the current balance for O(1) reads, it is changed only together with an entry.
+# Balance UPDATE locks agent row until commit, so entries of one agent are strictly ordered
+from typing import List, Optional
+
+from sqlalchemy import cast, func, insert, literal, or_, select, update
+
+from db import models
+
+
+class Ledger:
+    @staticmethod
+    def move(agent_id: int, amount: int, require_funds: bool = False):
+        """
+        UPDATE which adds amount to agent balance and returns balance after it. With require_funds agent which is
+        not on credit can not go below zero and nothing is returned
+        """
+        return Ledger.balance_update(agent_id, amount, require_funds).returning(models.Agent.balance). \
+            execution_options(synchronize_session=False)
+
+    @staticmethod
+    def balance_update(agent_id: int, amount: int, require_funds: bool = False):
+        query = update(models.Agent).where(models.Agent.id == agent_id)
+        if require_funds:
+            query = query.where(or_(models.Agent.is_on_credit.is_(True), models.Agent.balance + amount >= 0))
+        return query.values(balance=models.Agent.balance + amount)
+
+    @staticmethod
+    def now():
+        """
+        Time of entry taken by database when entry is written, that is after balance UPDATE locked agent row,
+        so entries of agent are in the same order by created_at as their balances. Time of Python would be taken
+        before waiting for lock and could be earlier than time of entry written meanwhile
+        """
+        return func.timezone('utc', func.clock_timestamp())
+
+    @staticmethod
+    def insert():
+        """ INSERT of entries made by entry and entries, execute with list of them """
+        return insert(models.LedgerEntry).values(created_at=Ledger.now())
+
+    @staticmethod
+    def entry(agent_id: int, amount: int, balance: int, account: str, kind: str,
+              reference_id: Optional[int] = None) -> dict:
+        """ Row of entry for balance already moved by move in the same transaction, written by insert """
+        return {"agent_id": agent_id, "amount": amount, "balance": balance, "account": account, "kind": kind,
+                "reference_id": reference_id}
+
+    @staticmethod
+    def post(agent_id: int, amount: int, account: str, kind: str, reference_id: Optional[int] = None,
+             require_funds: bool = False):
+        """
+        One statement which moves agent balance and appends entry with balance after it, for sync and async
+        sessions. Returns balance, no row if agent can not pay
+        """
+        moved = Ledger.balance_update(agent_id, amount, require_funds). \
+            returning(models.Agent.id, models.Agent.balance).cte("moved")
+        entries = models.LedgerEntry.__table__
+        # parameters in select list have no type for database, cast them to types of columns
+        values = [cast(literal(value), entries.c[name].type) for name, value in
+                  (("amount", amount), ("account", account), ("kind", kind), ("reference_id", reference_id))]
+        return insert(entries).from_select(
+            ["agent_id", "balance", "amount", "account", "kind", "reference_id", "created_at"],
+            select(moved.c.id, moved.c.balance, *values, Ledger.now())). \
+            returning(entries.c.balance)
+
+    @staticmethod
+    def entries(agent_id: int, balance: int, amounts: List[int], account: str, kind: str,
+                reference_ids: List[int]) -> List[dict]:
+        """ Rows of entries of one move split by amounts, balance is agent balance after all of them """
+        balance -= sum(amounts)
+        rows = []
+        for amount, reference_id in zip(amounts, reference_ids):
+            balance += amount
+            rows.append(Ledger.entry(agent_id, amount, balance, account, kind, reference_id))
+        return rows
@@ -1,10 +1,14 @@
 from datetime import datetime
 from typing import Optional
 
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 
 from db import models
 from users.schemas import user_history as schemas
+from users.views.audit_log import audit_log
+
+EXTRA_INFO_LENGTH = 800
 
 
 class History:
@@ -26,8 +30,40 @@ class History:
         return query.all()
 
     @staticmethod
-    def create(db: Session, user_id: int, action: str, extra_info: Optional[str]):
-        db_user = models.UserHistory(user_id=user_id, action=action, extra_info=extra_info)
+    def diff(entity: str, db_obj, values: dict, apply: bool = True) -> dict:
+        """
+        Compare not None values with attributes of db_obj and set them on it if apply.
+        Returns changes of history: entity, its id, names of changed fields and their old and new values
+        """
+        fields = {}
+        for key, value in values.items():
+            if value is None:
+                continue
+            old_value = getattr(db_obj, key)
+            if value != old_value:
+                fields[key] = jsonable_encoder([old_value, value])
+            if apply:
+                setattr(db_obj, key, value)
+        return {"entity": entity, "id": db_obj.id, "changed": sorted(fields), "fields": fields}
+
+    @staticmethod
+    def describe(changes: dict) -> str:
+        """ Changed fields as "key: old -> new" lines of extra_info """
+        return "".join(f"{key}: {old_value} -> {new_value}\n"
+                       for key, (old_value, new_value) in changes["fields"].items())
+
+    @staticmethod
+    def create(db: Session, user_id: int, action: str, extra_info: Optional[str], changes: Optional[dict] = None):
+        """ Queue event to audit log, write it in own transaction if audit log is stopped or full """
+        extra_info = extra_info[:EXTRA_INFO_LENGTH] if extra_info else extra_info
+        if audit_log.record(user_id, action, extra_info, changes):
+            return
+        db_user = models.UserHistory(user_id=user_id, action=action, extra_info=extra_info, changes=changes)
         db.add(db_user)
         db.commit()
-        db.refresh(db_user)
+
+    @staticmethod
+    def add(db, user_id: int, action: str, extra_info: Optional[str], changes: Optional[dict] = None):
+        """ Add event to transaction of db (sync or async session), it is written by caller commit """
+        extra_info = extra_info[:EXTRA_INFO_LENGTH] if extra_info else extra_info
+        db.add(models.UserHistory(user_id=user_id, action=action, extra_info=extra_info, changes=changes))